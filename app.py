@@ -1,12 +1,8 @@
-import numpy as np
-
-
 import flask
 import dash
-import plotly.graph_objs as go
 
-from instruments import Instrument
 import dash_components as dc
+import metrics
 import updates
 
 #########################################
@@ -23,12 +19,19 @@ app = dash.Dash(
 #########################################
 # 2. Define the Dash app layout
 #########################################
+# Only the tab bar; each tab's content is built when it is first opened (see dc.get_tab_layout)
 app.layout = dc.create_layout()
 
 #########################################
 # 3. Register callbacks
 #########################################
-updates.register_callbacks(app)
+# Heavy callbacks run as background jobs when the diskcache extra is installed
+background_manager = updates.create_background_manager()
+updates.register_callbacks(app, background_manager)
+
+# Latency, error and payload metrics on /metrics (Prometheus text format);
+# set OPTIONS_DASHBOARD_PROFILE_SLOW_MS to dump cProfile stats of slow requests
+metrics.install(app)
 
 #########################################
 # 4. Run the Server
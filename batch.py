@@ -0,0 +1,386 @@
+"""
+Headless batch pricing: value, Greeks, payoff summary and spot-shock P&L of
+every portfolio in a file, sharded across a process pool and streamed to a
+Parquet (or CSV) file.
+
+The source is a CSV or Parquet file with one row per leg and the columns
+portfolio, type ('call'/'put'/'stock'), strike and position (1/-1 or
+long/short), plus optionally quantity, expiry (time to maturity in years,
+defaults to --maturity) and american (0/1). The legs of a portfolio must be
+on consecutive rows.
+
+Run from the repository root:
+    python batch.py books.csv results.parquet --spot 100 --volatility 0.2 --rate 0.05 --maturity 1
+"""
+import argparse
+import csv
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from chains import import_pyarrow, iter_csv_chunks
+from instruments import INSTRUMENT_TYPE_CODES, STOCK
+from parallel import imap
+from payoff import PayoffProfile
+from portfolio import GREEK_NAMES, Portfolio
+
+# Books priced per task sent to a worker process
+DEFAULT_SHARD_BOOKS = 2000
+
+# Rows read from the source file at a time
+DEFAULT_CHUNK_ROWS = 1 << 18
+
+# Relative spot moves of the P&L columns (pnl_spot_-10% ...)
+DEFAULT_SPOT_SHOCKS = (-0.2, -0.1, -0.05, 0.05, 0.1, 0.2)
+
+LEG_COLUMNS = ['portfolio', 'type', 'strike', 'position']
+LEG_COLUMN_ALIASES = {
+    'book': 'portfolio',
+    'portfolio_id': 'portfolio',
+    'option_type': 'type',
+    'right': 'type',
+    'k': 'strike',
+    'side': 'position',
+    'qty': 'quantity',
+    'maturity': 'expiry',
+    'tau': 'expiry'
+}
+POSITION_NAMES = {'long': 1.0, 'buy': 1.0, 'short': -1.0, 'sell': -1.0}
+
+
+class BatchResult:
+    def __init__(self, books, legs, elapsed, output):
+        """
+        Summary of a batch pricing run.
+
+        Parameters:
+        - books: Number of portfolios priced.
+        - legs: Number of legs priced.
+        - elapsed: Wall time in seconds, reading and writing included.
+        - output: Path of the results file.
+        """
+        self.books = books
+        self.legs = legs
+        self.elapsed = elapsed
+        self.output = output
+
+    @property
+    def books_per_second(self):
+        """Batch throughput."""
+        return self.books / self.elapsed if self.elapsed > 0 else np.inf
+
+    def __repr__(self):
+        return (f"BatchResult(books={self.books}, legs={self.legs}, elapsed={self.elapsed:.2f}s, "
+                f"books_per_second={self.books_per_second:,.0f})")
+
+
+def _float_column(values, parse=None):
+    """Convert a raw source column to float64, with empty cells as NaN."""
+    values = np.asarray(values, dtype=object) if isinstance(values, list) else np.asarray(values)
+    if values.dtype.kind in 'biuf':
+        return values.astype(float)
+    parse = parse or float
+    return np.array([np.nan if value in ('', None) else parse(value) for value in values], dtype=float)
+
+
+def _parse_position(value):
+    text = str(value).strip().lower()
+    return POSITION_NAMES[text] if text in POSITION_NAMES else float(text)
+
+
+def _parse_flag(value):
+    return float(str(value).strip().lower() in ('1', '1.0', 'true', 'yes', 'y'))
+
+
+def _convert_legs(columns):
+    """Convert raw source columns into typed leg arrays."""
+    raw = {LEG_COLUMN_ALIASES.get(name.strip().lower(), name.strip().lower()): values
+           for name, values in columns.items()}
+    missing = [name for name in LEG_COLUMNS if name not in raw]
+    if missing:
+        raise ValueError(f"Portfolio file is missing required column(s): {', '.join(missing)}")
+
+    types = np.char.lower(np.char.strip(np.asarray(raw['type'], dtype=str)))
+    unknown = ~np.isin(types, list(INSTRUMENT_TYPE_CODES))
+    if unknown.any():
+        raise ValueError(f"Invalid instrument type in portfolio file: {types[unknown][0]}")
+    n_rows = types.size
+    return {
+        'portfolio': np.asarray(raw['portfolio'], dtype=str),
+        'type': np.array([INSTRUMENT_TYPE_CODES[kind] for kind in types], dtype=np.int8),
+        'strike': _float_column(raw['strike']),
+        'position': _float_column(raw['position'], _parse_position),
+        'quantity': _float_column(raw['quantity']) if 'quantity' in raw else np.ones(n_rows),
+        'expiry': _float_column(raw['expiry']) if 'expiry' in raw else np.full(n_rows, np.nan),
+        'american': (_float_column(raw['american'], _parse_flag) == 1) if 'american' in raw
+        else np.zeros(n_rows, dtype=bool)
+    }
+
+
+def _csv_header(path):
+    """Return the column names of a CSV file."""
+    with open(path, newline='') as f:
+        return next(csv.reader(f), [])
+
+
+def _batch_chunks(batches, chunk_rows):
+    """Yield pyarrow record batches as dictionaries of column arrays of at most chunk_rows rows."""
+    for batch in batches:
+        # pyarrow reads CSV in blocks of bytes, whatever chunk_rows; slices copy nothing
+        for start in range(0, batch.num_rows, chunk_rows):
+            piece = batch.slice(start, chunk_rows)
+            yield {name: piece.column(name).to_numpy(zero_copy_only=False) for name in piece.schema.names}
+
+
+def _iter_leg_chunks(path, chunk_rows):
+    """Yield the portfolio file as dictionaries of leg arrays, one chunk at a time."""
+    pa_csv, pa_parquet = import_pyarrow()
+    if path.lower().endswith(('.parquet', '.pq')):
+        if pa_parquet is None:
+            raise ImportError("Reading Parquet portfolio files requires pyarrow")
+        batches = pa_parquet.ParquetFile(path).iter_batches(batch_size=chunk_rows)
+    elif pa_csv is not None:
+        # Portfolio ids are read as text whatever the case of their header, so ids like 007 survive
+        convert = pa_csv.ConvertOptions(column_types={
+            name: 'string' for name in _csv_header(path)
+            if LEG_COLUMN_ALIASES.get(name.strip().lower(), name.strip().lower()) == 'portfolio'
+        })
+        batches = pa_csv.open_csv(path, convert_options=convert)
+    else:
+        batches = None
+    if batches is None:
+        raw_chunks = iter_csv_chunks(path, chunk_rows)
+    else:
+        raw_chunks = _batch_chunks(batches, chunk_rows)
+    for raw in raw_chunks:
+        yield _convert_legs(raw)
+
+
+def iter_book_shards(path, shard_books=DEFAULT_SHARD_BOOKS, chunk_rows=DEFAULT_CHUNK_ROWS):
+    """
+    Stream a portfolio file as shards of whole portfolios.
+
+    Parameters:
+    - path: CSV or Parquet file with one row per leg (see the module docstring).
+    - shard_books: Number of portfolios per shard.
+    - chunk_rows: Number of rows read at a time.
+
+    Returns:
+    - Iterator of dictionaries of leg arrays, each holding the consecutive
+      legs of up to shard_books portfolios.
+    """
+    pending = None
+    seen = set()
+
+    def split(legs, final):
+        ids = legs['portfolio']
+        starts = np.flatnonzero(np.concatenate([[True], ids[1:] != ids[:-1]]))
+        # A portfolio starting twice, in this chunk or in an earlier one, has non-consecutive legs
+        book_ids, counts = np.unique(ids[starts], return_counts=True)
+        repeated = seen.intersection(book_ids).union(book_ids[counts > 1])
+        if repeated:
+            raise ValueError(f"Legs of portfolio {sorted(repeated)[0]} are not on consecutive rows")
+        # The last portfolio may continue in the next chunk
+        complete = starts.size if final else starts.size - 1
+        for first in range(0, complete, shard_books):
+            last = min(first + shard_books, complete)
+            stop = starts[last] if last < starts.size else ids.size
+            yield {name: values[starts[first]:stop] for name, values in legs.items()}
+        seen.update(ids[starts[:complete]])
+        if not final:
+            return {name: values[starts[-1]:] for name, values in legs.items()}
+
+    for chunk in _iter_leg_chunks(path, chunk_rows):
+        if pending is not None:
+            chunk = {name: np.concatenate([pending[name], values]) for name, values in chunk.items()}
+        if chunk['portfolio'].size:
+            pending = yield from split(chunk, final=False)
+    if pending is not None and pending['portfolio'].size:
+        yield from split(pending, final=True)
+
+
+def price_shard(legs, S, t, sigma, r, T=np.nan, spot_shocks=DEFAULT_SPOT_SHOCKS):
+    """
+    Price every portfolio of a shard.
+
+    All legs of the shard are evaluated in one vectorized pass, and the
+    per-leg results are summed per portfolio.
+
+    Parameters:
+    - legs: Dictionary of leg arrays of consecutive portfolios, as yielded by iter_book_shards.
+    - S, t, sigma, r: Market parameters shared by all portfolios.
+    - T: Time to maturity of legs without an expiry.
+    - spot_shocks: Relative spot moves of the P&L columns.
+
+    Returns:
+    - Dictionary of result columns, one entry per portfolio: portfolio, legs,
+      value, payoff (at S), the Greeks, max_profit, max_loss, break-evens and
+      one pnl_spot_* column per shock.
+    """
+    ids = legs['portfolio']
+    starts = np.flatnonzero(np.concatenate([[True], ids[1:] != ids[:-1]]))
+    expiries = np.where(np.isnan(legs['expiry']), T, legs['expiry'])
+    if np.isnan(expiries[legs['type'] != STOCK]).any():
+        raise ValueError("Option legs need an expiry, from the file or the default maturity")
+    portfolio = Portfolio(legs['type'], legs['strike'], legs['position'], legs['quantity'],
+                          expiries, legs['american'])
+
+    def per_book(per_leg):
+        return np.add.reduceat(per_leg, starts, axis=0)
+
+    results = portfolio.evaluate(S, t, sigma, r, per_leg=True)
+    value = per_book(results['Value'])
+    columns = {
+        'portfolio': ids[starts],
+        'legs': np.diff(np.append(starts, ids.size)),
+        'value': value,
+        'payoff': per_book(portfolio.payoff(S, per_leg=True))
+    }
+    for name in GREEK_NAMES:
+        columns[name.lower()] = per_book(results[name])
+
+    # Profit and loss at expiry relative to the current value, per portfolio
+    summaries = np.empty((starts.size, 4))
+    bounds = np.append(starts, ids.size)
+    for book, (start, stop) in enumerate(zip(bounds[:-1], bounds[1:])):
+        profile = PayoffProfile.from_portfolio(portfolio.subset(np.arange(start, stop)), value[book])
+        break_evens = profile.break_evens
+        summaries[book] = (profile.max_profit, profile.max_loss,
+                           break_evens[0] if break_evens.size else np.nan,
+                           break_evens[-1] if break_evens.size else np.nan)
+    for index, name in enumerate(['max_profit', 'max_loss', 'break_even_low', 'break_even_high']):
+        columns[name] = summaries[:, index]
+
+    spot_shocks = np.asarray(spot_shocks, dtype=float)
+    if spot_shocks.size:
+        shocked = per_book(portfolio.value(S * (1 + spot_shocks), t, sigma, r, per_leg=True))
+        for index, shock in enumerate(spot_shocks):
+            columns[f'pnl_spot_{shock:+.0%}'] = shocked[:, index] - value
+    return columns
+
+
+class _ParquetWriter:
+    def __init__(self, path):
+        """Append result shards to a Parquet file, one row group per shard."""
+        _, pa_parquet = import_pyarrow()
+        if pa_parquet is None:
+            raise ImportError("Writing Parquet results requires pyarrow")
+        import pyarrow as pa
+
+        self._pa = pa
+        self._pa_parquet = pa_parquet
+        self._path = path
+        self._writer = None
+
+    def write(self, columns):
+        table = self._pa.table(columns)
+        if self._writer is None:
+            self._writer = self._pa_parquet.ParquetWriter(self._path, table.schema, compression='zstd')
+        self._writer.write_table(table)
+
+    def close(self):
+        if self._writer is not None:
+            self._writer.close()
+
+
+class _CsvWriter:
+    def __init__(self, path):
+        """Append result shards to a CSV file."""
+        self._file = open(path, 'w', newline='')
+        self._writer = csv.writer(self._file)
+        self._header = False
+
+    def write(self, columns):
+        if not self._header:
+            self._writer.writerow(list(columns))
+            self._header = True
+        self._writer.writerows(zip(*[values.tolist() for values in columns.values()]))
+
+    def close(self):
+        self._file.close()
+
+
+def price_portfolio_file(source, output, S, t, sigma, r, T=np.nan, spot_shocks=DEFAULT_SPOT_SHOCKS,
+                         processes=None, shard_books=DEFAULT_SHARD_BOOKS, chunk_rows=DEFAULT_CHUNK_ROWS,
+                         progress=None):
+    """
+    Price every portfolio of a file and stream the results to output.
+
+    Shards of shard_books portfolios are priced in a process pool of the
+    run's own, at most two per worker in flight, so memory stays bounded for
+    any number of portfolios; results are written in the order of the source
+    file.
+
+    Parameters:
+    - source: CSV or Parquet portfolio file (see the module docstring).
+    - output: Results file, Parquet (.parquet, requires pyarrow) or CSV.
+    - S, t, sigma, r, T, spot_shocks: See price_shard.
+    - processes: Number of worker processes started for this run (defaults
+      to the number of CPUs; 1 prices in-process).
+    - shard_books: Portfolios per task.
+    - chunk_rows: Rows read from the source at a time.
+    - progress: Optional progress(books) function called after every shard.
+
+    Returns:
+    - BatchResult
+    """
+    start = time.perf_counter()
+    processes = processes or os.cpu_count() or 1
+    args = (S, t, sigma, r, T, tuple(spot_shocks))
+    writer = _ParquetWriter(output) if output.lower().endswith(('.parquet', '.pq')) else _CsvWriter(output)
+    books = legs = 0
+
+    def write(columns):
+        nonlocal books, legs
+        writer.write(columns)
+        books += columns['legs'].size
+        legs += int(columns['legs'].sum())
+        if progress:
+            progress(books)
+
+    try:
+        shards = iter_book_shards(source, shard_books, chunk_rows)
+        if processes <= 1:
+            for shard in shards:
+                write(price_shard(shard, *args))
+        else:
+            # Twice as many shards in flight as workers keeps them busy while results are written
+            with ProcessPoolExecutor(max_workers=processes) as executor:
+                for columns in imap(price_shard, ((shard, *args) for shard in shards), 2 * processes, executor):
+                    write(columns)
+    finally:
+        writer.close()
+    return BatchResult(books, legs, time.perf_counter() - start, output)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('source', help="CSV or Parquet file with one row per leg")
+    parser.add_argument('output', help="Results file (.parquet or .csv)")
+    parser.add_argument('--spot', type=float, required=True, help="Underlying price S")
+    parser.add_argument('--volatility', type=float, required=True, help="Volatility sigma")
+    parser.add_argument('--rate', type=float, required=True, help="Risk-free rate r")
+    parser.add_argument('--time', type=float, default=0.0, help="Current time t (default %(default)s)")
+    parser.add_argument('--maturity', type=float, default=np.nan,
+                        help="Time to maturity of legs without an expiry column")
+    parser.add_argument('--spot-shocks', type=float, nargs='*', default=list(DEFAULT_SPOT_SHOCKS),
+                        help="Relative spot moves of the P&L columns (default %(default)s)")
+    parser.add_argument('--processes', type=int, default=None,
+                        help="Worker processes (default: one per CPU)")
+    parser.add_argument('--shard-books', type=int, default=DEFAULT_SHARD_BOOKS,
+                        help="Portfolios per task (default %(default)s)")
+    args = parser.parse_args(argv)
+
+    result = price_portfolio_file(
+        args.source, args.output, args.spot, args.time, args.volatility, args.rate, args.maturity,
+        args.spot_shocks, args.processes, args.shard_books,
+        progress=lambda books: print(f"\r{books:,} portfolios", end='', flush=True)
+    )
+    print(f"\r{result.books:,} portfolios ({result.legs:,} legs) in {result.elapsed:.2f} s, "
+          f"{result.books_per_second:,.0f} portfolios/s -> {result.output}")
+
+
+if __name__ == '__main__':
+    main()
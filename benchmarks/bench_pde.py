@@ -0,0 +1,94 @@
+"""
+Convergence and timing of the Crank-Nicolson PDE solver against the
+closed-form Black-Scholes path (European) and a 5000-step binomial tree
+(American put).
+
+Run from the repository root:
+    python benchmarks/bench_pde.py
+"""
+import os
+import sys
+import timeit
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from instruments import black_scholes_evaluate  # noqa: E402
+from lattice import lattice_value  # noqa: E402
+from pde import crank_nicolson  # noqa: E402
+
+K, TAU, SIGMA, R = 100.0, 1.0, 0.2, 0.05
+GRID_SIZES = [50, 100, 200, 400, 800]
+
+
+def best_time(func, repeat=5):
+    """
+    Return (result, best wall time per call in seconds) over a few runs, each
+    calling func often enough to last at least 0.2 s (see timeit.Timer.autorange),
+    so millisecond solves are not timed one call at a time.
+    """
+    result = func()
+    timer = timeit.Timer(func)
+    number, _ = timer.autorange()
+    return result, min(timer.repeat(repeat, number)) / number
+
+
+def run():
+    """
+    Solve European calls and an American put on grids of increasing size.
+
+    Returns:
+    - List of result dictionaries, one per case and grid size; throughput is
+      in grid nodes (space x time steps) per second.
+    """
+    S = np.linspace(0.5 * K, 1.5 * K, 201)
+    exact, bs_seconds = best_time(lambda: black_scholes_evaluate(S, K, TAU, SIGMA, R, True))
+    american_reference = lattice_value(S, K, TAU, SIGMA, R, False, american=True, steps=5000)
+
+    results = []
+    for n_space in GRID_SIZES:
+        solution, seconds = best_time(lambda: crank_nicolson(K, TAU, SIGMA, R, True, n_space=n_space, n_time=n_space // 2))
+        curve = solution.interpolate(S)
+        results.append({
+            'name': f'pde.european_call[{n_space}x{n_space // 2}]',
+            'case': 'european_call',
+            'n_space': n_space,
+            'n_time': n_space // 2,
+            'seconds': seconds,
+            'throughput': n_space * (n_space // 2) / seconds,
+            'black_scholes_seconds': bs_seconds,
+            'value_error': float(np.abs(curve['Value'] - exact['Value']).max()),
+            'delta_error': float(np.abs(curve['Delta'] - exact['Delta']).max()),
+            'gamma_error': float(np.abs(curve['Gamma'] - exact['Gamma']).max())
+        })
+
+        solution, seconds = best_time(lambda: crank_nicolson(K, TAU, SIGMA, R, False, american=True,
+                                                             n_space=n_space, n_time=n_space // 2))
+        results.append({
+            'name': f'pde.american_put[{n_space}x{n_space // 2}]',
+            'case': 'american_put',
+            'n_space': n_space,
+            'n_time': n_space // 2,
+            'seconds': seconds,
+            'throughput': n_space * (n_space // 2) / seconds,
+            'value_error': float(np.abs(solution.interpolate(S)['Value'] - american_reference).max())
+        })
+    return results
+
+
+def main():
+    results = run()
+    print(f"{'case':<15}{'grid':>10}{'time (ms)':>12}{'value err':>12}{'delta err':>12}{'gamma err':>12}")
+    for result in results:
+        grid = f"{result['n_space']}x{result['n_time']}"
+        errors = ''.join(
+            f"{result[name]:>12.2e}" if name in result else f"{'-':>12}"
+            for name in ('value_error', 'delta_error', 'gamma_error')
+        )
+        print(f"{result['case']:<15}{grid:>10}{result['seconds'] * 1000:>12.2f}{errors}")
+    print(f"Black-Scholes closed form on the same 201 points: {results[0]['black_scholes_seconds'] * 1000:.3f} ms")
+
+
+if __name__ == '__main__':
+    main()
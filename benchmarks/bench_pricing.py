@@ -0,0 +1,203 @@
+"""
+Throughput of the pricing kernels, figure construction and the
+update_strategy callback at several book and grid sizes.
+
+Every result has a unique 'name', the best time per call in 'seconds' and
+'throughput' in items (prices, grid points or requests) per second, so runs
+can be compared with benchmarks/run_benchmarks.py.
+
+Run from the repository root:
+    python benchmarks/bench_pricing.py
+"""
+import json
+import os
+import sys
+import timeit
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from cache import LegCurveCache  # noqa: E402
+from instruments import Instrument  # noqa: E402
+from portfolio import Portfolio  # noqa: E402
+from visualization import PortfolioPlotter  # noqa: E402
+
+S, T, t, SIGMA, R = 100.0, 1.0, 0.0, 0.2, 0.05
+BOOK_SIZES = [1, 10, 100, 1000]
+GRID_SIZES = [200, 2000]
+CALLBACK_BOOK_SIZES = [1, 6, 50]
+
+
+def measure(name, func, items=1, repeat=5, **details):
+    """
+    Time func with timeit, calling it often enough per run for a stable reading.
+
+    Parameters:
+    - name: Unique benchmark name.
+    - func: Function of no arguments to time.
+    - items: Number of items (prices, grid points, requests) one call processes.
+    - repeat: Number of runs; the fastest is kept.
+    - details: Extra fields copied into the result.
+
+    Returns:
+    - Result dictionary with name, seconds per call and throughput.
+    """
+    timer = timeit.Timer(func)
+    number, _ = timer.autorange()
+    seconds = min(timer.repeat(repeat, number)) / number
+    return {'name': name, 'seconds': seconds, 'items': items, 'throughput': items / seconds, **details}
+
+
+def random_book(n_legs, seed=0):
+    """Return n_legs random call and put instruments with strikes around S."""
+    rng = np.random.default_rng(seed)
+    return [
+        Instrument(rng.choice(['call', 'put']), strike=float(np.round(rng.uniform(0.6 * S, 1.6 * S), 1)),
+                   position=int(rng.choice([1, -1])), quantity=int(rng.integers(1, 5)))
+        for _ in range(n_legs)
+    ]
+
+
+def bench_instruments():
+    """Scalar and batched pricing and greeks of a single instrument."""
+    call = Instrument('call', strike=100)
+    results = [
+        measure('instrument.value.scalar', lambda: call.get_current_value(S, T, t, SIGMA, R)),
+        measure('instrument.greeks.scalar', lambda: call.compute_greeks(S, T, t, SIGMA, R))
+    ]
+    for grid_size in GRID_SIZES:
+        S_grid = np.linspace(0.5 * S, 2 * S, grid_size)
+        results.append(measure(f'instrument.value.batch[{grid_size}]',
+                               lambda: call.get_current_value(S_grid, T, t, SIGMA, R), items=grid_size))
+        results.append(measure(f'instrument.greeks.batch[{grid_size}]',
+                               lambda: call.compute_greeks(S_grid, T, t, SIGMA, R), items=grid_size))
+    return results
+
+
+def bench_portfolio():
+    """Value and greeks of whole books over a price grid."""
+    results = []
+    for n_legs in BOOK_SIZES:
+        portfolio = Portfolio.from_instruments(random_book(n_legs), T)
+        for grid_size in GRID_SIZES:
+            S_grid = np.linspace(0.5 * S, 2 * S, grid_size)
+            items = n_legs * grid_size
+            results.append(measure(f'portfolio.value[{n_legs}x{grid_size}]',
+                                   lambda: portfolio.value(S_grid, t, SIGMA, R), items=items))
+            results.append(measure(f'portfolio.greeks[{n_legs}x{grid_size}]',
+                                   lambda: portfolio.greeks(S_grid, t, SIGMA, R), items=items))
+    return results
+
+
+def bench_figures():
+    """Figure construction of the payoff and N(d) charts."""
+    results = []
+    for n_legs in BOOK_SIZES:
+        plotter = PortfolioPlotter(random_book(n_legs))
+        results.append(measure(f'figure.plot_payoffs[{n_legs}]',
+                               lambda: plotter.plot_payoffs(0.5 * S, 2 * S), items=n_legs))
+    plotter = PortfolioPlotter([])
+    results.append(measure('figure.plot_ncdf_analysis', lambda: plotter.plot_ncdf_analysis(1.0, T, SIGMA, R)))
+    return results
+
+
+def callback_request(app, output, values):
+    """
+    Build the JSON body of a Dash callback request.
+
+    Parameters:
+    - app: Dash app.
+    - output: Output key of the callback in app.callback_map.
+    - values: Dictionary of 'id.property' to value; pattern-matching ALL
+      states are keyed by 'type.property' and take a list of values, one per
+      index.
+    """
+    callback = app.callback_map[output]
+
+    def fill(dependencies):
+        filled = []
+        for dependency in dependencies:
+            if dependency['id'].startswith('{'):
+                pattern = {k: v for k, v in json.loads(dependency['id']).items() if k != 'index'}
+                filled.append([{'id': {**pattern, 'index': index}, 'property': dependency['property'], 'value': value}
+                               for index, value in enumerate(values[f"{pattern['type']}.{dependency['property']}"])])
+            else:
+                filled.append({**dependency, 'value': values.get(f"{dependency['id']}.{dependency['property']}")})
+        return filled
+
+    # Multi-output callbacks are keyed '..a.prop...b.prop..' and take a list of outputs
+    outputs = [{'id': part.rsplit('.', 1)[0], 'property': part.rsplit('.', 1)[1]}
+               for part in output.strip('.').split('...')]
+    if not output.startswith('..'):
+        outputs = outputs[0]
+    return {
+        'output': output,
+        'outputs': outputs,
+        'inputs': fill(callback['inputs']),
+        'state': fill(callback['state']),
+        'changedPropIds': [f"{callback['inputs'][0]['id']}.{callback['inputs'][0]['property']}"]
+    }
+
+
+def bench_callbacks():
+    """The update_strategy callback end to end, through the Flask test client."""
+    import app as dashboard
+    import updates
+
+    output = '..strategy-graph.figure...strategy-store.data...strategy-graph-signature.data..'
+    client = dashboard.server.test_client()
+    url = dashboard.app.config.requests_pathname_prefix + '_dash-update-component'
+
+    results = []
+    for n_legs in CALLBACK_BOOK_SIZES:
+        book = random_book(n_legs)
+        values = {
+            'update-strategy.n_clicks': 1,
+            'underlying-price.value': S, 'time-maturity.value': T, 'current-time.value': t,
+            'volatility.value': SIGMA, 'risk-free-rate.value': R,
+            'value-tolerance.value': 0.01, 'animation-frames.value': 0,
+            'strategy-graph-signature.data': None
+        }
+        for field, column in [('type', [leg.instrument_type for leg in book]),
+                              ('strike', [leg.strike for leg in book]),
+                              ('position', [leg.position for leg in book]),
+                              ('quantity', [leg.quantity for leg in book]),
+                              ('exercise', ['european'] * n_legs)]:
+            values[f'leg-{field}.value'] = column
+        body = callback_request(dashboard.app, output, values)
+
+        def post():
+            response = client.post(url, json=body)
+            assert response.status_code == 200, response.status_code
+
+        def post_cold():
+            # Without the memoized figure and the per-leg curves
+            updates.figure_cache.clear()
+            updates.leg_curve_cache = LegCurveCache(maxsize=4096)
+            post()
+
+        results.append(measure(f'callback.update_strategy.cold[{n_legs}]', post_cold))
+        results.append(measure(f'callback.update_strategy.cached[{n_legs}]', post))
+    return results
+
+
+def run():
+    """
+    Run every benchmark of this suite.
+
+    Returns:
+    - List of result dictionaries.
+    """
+    return bench_instruments() + bench_portfolio() + bench_figures() + bench_callbacks()
+
+
+def main():
+    results = run()
+    print(f"{'benchmark':<45}{'time (ms)':>12}{'items/s':>16}")
+    for result in results:
+        print(f"{result['name']:<45}{result['seconds'] * 1000:>12.4f}{result['throughput']:>16,.0f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,129 @@
+"""
+Cold start of the dashboard, each run in a fresh interpreter: import time
+by package, app construction time by step, and the time until the first
+page load (layout, dependencies, Trading Strategies tab and its first
+update_strategy callback) has been served.
+
+Run from the repository root:
+    python benchmarks/bench_startup.py
+"""
+import json
+import os
+import subprocess
+import sys
+from collections import defaultdict
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+RUNS = 3
+
+# Run in the child interpreter. App construction repeats the steps of app.py
+# one by one after its imports, then `import app` builds the real app, which
+# serves the first page load.
+CHILD = r'''
+import json, sys, time
+start = time.perf_counter()
+timings = {}
+
+def checkpoint(step):
+    global start
+    now = time.perf_counter()
+    timings[step] = now - start
+    start = now
+
+import flask, dash
+import dash_components as dc, metrics, updates
+checkpoint('imports')
+
+server = flask.Flask('startup')
+dash_app = dash.Dash('startup', server=server, url_base_pathname='/dash/', suppress_callback_exceptions=True)
+checkpoint('dash.Dash')
+dash_app.layout = dc.create_layout()
+checkpoint('create_layout')
+manager = updates.create_background_manager()
+checkpoint('create_background_manager')
+updates.register_callbacks(dash_app, manager)
+checkpoint('register_callbacks')
+metrics.install(dash_app)
+checkpoint('metrics.install')
+
+import app
+checkpoint('import app')
+
+client = app.server.test_client()
+for path in ('/dash/', '/dash/_dash-layout', '/dash/_dash-dependencies'):
+    assert client.get(path).status_code == 200, path
+sys.path.insert(0, 'benchmarks')
+from bench_pricing import callback_request
+url = '/dash/_dash-update-component'
+tab = client.post(url, json=callback_request(app.app, 'tabs-content.children', {'tabs.value': 'tab-1'}))
+assert tab.status_code == 200, tab.status_code
+defaults = {
+    'update-strategy.n_clicks': 0, 'underlying-price.value': 100, 'time-maturity.value': 1,
+    'current-time.value': 0, 'volatility.value': 0.2, 'risk-free-rate.value': 0.05,
+    'value-tolerance.value': 0.01, 'animation-frames.value': 0, 'strategy-graph-signature.data': None,
+    'leg-type.value': ['call'], 'leg-strike.value': [100], 'leg-position.value': [1],
+    'leg-quantity.value': [1], 'leg-exercise.value': ['european']
+}
+output = '..strategy-graph.figure...strategy-store.data...strategy-graph-signature.data..'
+strategy = client.post(url, json=callback_request(app.app, output, defaults))
+assert strategy.status_code == 200, strategy.status_code
+checkpoint('first page load')
+print(json.dumps(timings))
+'''
+
+
+def parse_importtime(stderr):
+    """
+    Sum the self time of every imported module by top-level package.
+
+    Returns:
+    - Dictionary of package to seconds, slowest first.
+    """
+    totals = defaultdict(float)
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        self_us, _, name = line[len('import time:'):].split('|')
+        totals[name.strip().split('.')[0]] += int(self_us) / 1e6
+    return dict(sorted(totals.items(), key=lambda item: -item[1]))
+
+
+def cold_start():
+    """Run one cold start in a fresh interpreter and return (timings, imports by package)."""
+    child = subprocess.run([sys.executable, '-X', 'importtime', '-c', CHILD], cwd=REPO_DIR,
+                           capture_output=True, text=True, check=True)
+    return json.loads(child.stdout.strip().splitlines()[-1]), parse_importtime(child.stderr)
+
+
+def run():
+    """
+    Measure the best of RUNS cold starts.
+
+    Returns:
+    - List of result dictionaries: import time and time to the first page
+      load, with the per-step and per-package breakdowns as details.
+    """
+    runs = [cold_start() for _ in range(RUNS)]
+    timings, imports = min(runs, key=lambda run: sum(run[0].values()))
+    first_page = sum(timings.values()) - timings['import app']
+    return [
+        {'name': 'startup.imports', 'seconds': timings['imports'], 'throughput': 1 / timings['imports'],
+         'packages': imports},
+        {'name': 'startup.first_page_load', 'seconds': first_page, 'throughput': 1 / first_page,
+         'steps': timings}
+    ]
+
+
+def main():
+    imports, first_page = run()
+    print(f"Imports: {imports['seconds'] * 1000:.0f} ms, slowest packages (self time):")
+    for package, seconds in list(imports['packages'].items())[:15]:
+        print(f"  {package:<30}{seconds * 1000:>10.1f} ms")
+    print("Startup steps:")
+    for step, seconds in first_page['steps'].items():
+        print(f"  {step:<30}{seconds * 1000:>10.1f} ms")
+    print(f"Time to first page load (without the duplicate 'import app'): {first_page['seconds'] * 1000:.0f} ms")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,215 @@
+"""
+Run the benchmark suites, write their results as JSON and compare the
+throughput of every benchmark with a stored baseline.
+
+Run from the repository root:
+    python benchmarks/run_benchmarks.py                    # compare with benchmarks/baseline.json
+    python benchmarks/run_benchmarks.py --update-baseline  # record a new baseline
+    python benchmarks/run_benchmarks.py --suite pricing --output results.json --threshold 0.1
+
+Every suite runs several times (--runs) and the best throughput of each
+benchmark is kept. Exits with status 1 when a benchmark's throughput is more
+than the threshold below its baseline. Throughputs are compared relative to a calibration
+workload timed in the same run, which absorbs changes in machine speed, but
+not differences between machines, so the baseline is not committed: record
+it on the machine that runs the comparison, e.g. in CI on the base commit
+before checking out the change:
+    git checkout main && python benchmarks/run_benchmarks.py --update-baseline
+    git checkout - && python benchmarks/run_benchmarks.py
+"""
+import argparse
+import json
+import os
+import platform
+import sys
+
+import numpy as np
+
+import bench_pde
+import bench_pricing
+import bench_startup
+
+BENCHMARK_DIR = os.path.dirname(os.path.abspath(__file__))
+BASELINE_PATH = os.path.join(BENCHMARK_DIR, 'baseline.json')
+
+# Largest accepted throughput drop relative to the baseline (0.25 = three
+# quarters of the throughput)
+DEFAULT_THRESHOLD = 0.25
+
+# Number of runs of every suite whose best throughput is kept. A shared
+# machine slows down for seconds at a time, which moves single runs by up to
+# 30%; the best of three runs stays within about 10%.
+DEFAULT_RUNS = 3
+
+# Number of times suites with regressions are re-run before the comparison fails
+DEFAULT_CONFIRM_RUNS = 1
+
+SUITES = {
+    'pricing': bench_pricing,
+    'pde': bench_pde,
+    'startup': bench_startup
+}
+
+
+def calibrate():
+    """
+    Throughput of a fixed reference workload (NumPy math plus a Python loop)
+    in this process, used to cancel out changes in machine speed between runs.
+    """
+    values = np.linspace(0.0, 1.0, 100_000)
+
+    def workload():
+        np.exp(values).sum()
+        sum(i * i for i in range(20_000))
+
+    return bench_pricing.measure('calibration', workload)['throughput']
+
+
+def run_suites(names, runs=DEFAULT_RUNS):
+    """
+    Run benchmark suites several times and keep the best throughput of every
+    benchmark (see merge_best).
+
+    Parameters:
+    - names: Suite names, keys of SUITES.
+    - runs: Number of runs of every suite.
+
+    Returns:
+    - JSON-serializable report with the environment and the results per suite.
+    """
+    report = run_suites_once(names)
+    for _ in range(runs - 1):
+        report = merge_best(report, run_suites_once(names))
+    report['environment']['runs'] = runs
+    return report
+
+
+def run_suites_once(names):
+    """Run benchmark suites once; returns a report like run_suites."""
+    calibration = calibrate()
+    suites = {name: SUITES[name].run() for name in names}
+    return {
+        'environment': {
+            'python': platform.python_version(),
+            'numpy': np.__version__,
+            'machine': platform.machine(),
+            'processor': platform.processor(),
+            'cpu_count': os.cpu_count(),
+            # Best of before and after the suites, like the benchmarks themselves
+            'calibration': max(calibration, calibrate())
+        },
+        'suites': suites
+    }
+
+
+def merge_best(report, rerun):
+    """
+    Keep the better throughput of each benchmark, and the better calibration,
+    from two reports of the same suites. Machine noise only ever slows a run
+    down, so the best of several runs is the most repeatable reading.
+    """
+    report['environment']['calibration'] = max(report['environment']['calibration'],
+                                               rerun['environment']['calibration'])
+    for name, results in rerun['suites'].items():
+        best = {result['name']: result for result in results}
+        report['suites'][name] = [
+            max(result, best.get(result['name'], result), key=lambda item: item['throughput'])
+            for result in report['suites'][name]
+        ]
+    return report
+
+
+def compare(report, baseline, threshold=DEFAULT_THRESHOLD):
+    """
+    Compare the throughput of every benchmark with the baseline, each relative
+    to the calibration throughput of its run.
+
+    Parameters:
+    - report: Report of run_suites.
+    - baseline: Earlier report.
+    - threshold: Largest accepted relative throughput drop.
+
+    Returns:
+    - List of (name, baseline throughput, throughput, relative change,
+      regressed) for the benchmarks present in both reports.
+    """
+    reference = {result['name']: result['throughput']
+                 for results in baseline['suites'].values() for result in results}
+    speedup = report['environment']['calibration'] / baseline['environment']['calibration']
+    rows = []
+    for results in report['suites'].values():
+        for result in results:
+            if result['name'] in reference:
+                before, after = reference[result['name']], result['throughput']
+                change = after / (before * speedup) - 1
+                rows.append((result['name'], before, after, change, change < -threshold))
+    return rows
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--suite', action='append', choices=sorted(SUITES),
+                        help="Suite to run (repeatable; all suites by default)")
+    parser.add_argument('--output', help="Write the results as JSON to this file")
+    parser.add_argument('--baseline', default=BASELINE_PATH, help="Baseline JSON file")
+    parser.add_argument('--threshold', type=float, default=DEFAULT_THRESHOLD,
+                        help="Largest accepted throughput drop (default %(default)s)")
+    parser.add_argument('--runs', type=int, default=DEFAULT_RUNS,
+                        help="Runs of every suite whose best is kept (default %(default)s)")
+    parser.add_argument('--confirm', type=int, default=DEFAULT_CONFIRM_RUNS,
+                        help="Re-runs of suites with regressions before failing, and extra runs "
+                             "when recording a baseline (default %(default)s)")
+    parser.add_argument('--update-baseline', action='store_true',
+                        help="Store the results as the new baseline instead of comparing")
+    args = parser.parse_args(argv)
+    if args.runs < 1:
+        parser.error("--runs must be at least 1")
+
+    report = run_suites(args.suite or list(SUITES), args.runs)
+    if args.update_baseline:
+        # Best of as many runs as a comparison may take, so both sides measure alike
+        for _ in range(args.confirm):
+            report = merge_best(report, run_suites(list(report['suites']), args.runs))
+        with open(args.baseline, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f"Baseline written to {args.baseline}")
+        return 0
+
+    if not os.path.exists(args.baseline):
+        if args.output:
+            with open(args.output, 'w') as f:
+                json.dump(report, f, indent=2)
+        print(f"No baseline at {args.baseline}; run with --update-baseline first")
+        return 0
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+
+    rows = compare(report, baseline, args.threshold)
+    for _ in range(args.confirm):
+        # Re-run suites with regressions and keep each benchmark's best run,
+        # so a single noisy measurement does not fail the comparison
+        suites = [name for name, results in report['suites'].items()
+                  if any(row[4] and row[0] in {result['name'] for result in results} for row in rows)]
+        if not suites:
+            break
+        report = merge_best(report, run_suites(suites, args.runs))
+        rows = compare(report, baseline, args.threshold)
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+
+    print(f"{'benchmark':<45}{'baseline/s':>16}{'now/s':>16}{'change':>10}")
+    for name, before, after, change, regressed in rows:
+        flag = '  REGRESSION' if regressed else ''
+        print(f"{name:<45}{before:>16,.0f}{after:>16,.0f}{change:>+10.1%}{flag}")
+
+    regressions = [row[0] for row in rows if row[4]]
+    if regressions:
+        print(f"{len(regressions)} benchmark(s) regressed by more than {args.threshold:.0%}")
+        return 1
+    print(f"No regressions beyond {args.threshold:.0%} in {len(rows)} benchmark(s)")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
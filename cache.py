@@ -0,0 +1,379 @@
+import copy
+import hashlib
+import math
+import os
+import stat
+import threading
+import time
+from collections import OrderedDict
+from functools import wraps
+
+import numpy as np
+
+try:
+    import diskcache
+except ImportError:  # optional, needed for the cache shared across processes
+    diskcache = None
+
+# Widest span (in grid points) kept per leg; beyond it a leg's curve is
+# recomputed for the requested range instead of being extended further.
+MAX_LEG_CURVE_POINTS = 20000
+
+# Significant digits kept when canonicalizing floats for cache keys, so that
+# 100, 100.0 and 100.00000000000001 all map to the same entry.
+KEY_SIGNIFICANT_DIGITS = 12
+
+# Every NaN input maps to this one object: NaN != NaN, but tuples compare their
+# items by identity first, so keys holding the same NaN object still match.
+NAN_KEY = float('nan')
+
+
+def canonicalize(value):
+    """
+    Convert callback inputs into a hashable, canonical cache key component.
+
+    Floats are rounded to KEY_SIGNIFICANT_DIGITS significant digits (with -0.0
+    folded into 0.0 and every NaN into NAN_KEY), integers are treated as
+    floats, lists and tuples become tuples and dictionaries become tuples of
+    sorted items.
+    """
+    if isinstance(value, bool) or value is None or isinstance(value, str):
+        return value
+    if isinstance(value, (int, float)):
+        if math.isnan(value):
+            return NAN_KEY
+        return float(f'{float(value):.{KEY_SIGNIFICANT_DIGITS}g}') + 0.0
+    if isinstance(value, dict):
+        return tuple(sorted((str(key), canonicalize(item)) for key, item in value.items()))
+    if isinstance(value, (list, tuple)):
+        return tuple(canonicalize(item) for item in value)
+    if hasattr(value, 'tolist'):
+        return canonicalize(value.tolist())
+    return value
+
+
+def private_directory(path):
+    """
+    Create a directory that only this user can access (mode 0700), or check
+    that an existing one is a real directory owned by this user and closed to
+    others.
+
+    Stores of pickled values must live in such a directory: another local
+    user able to write into it could plant entries that the server would
+    unpickle.
+
+    Returns:
+    - path
+    """
+    os.makedirs(path, mode=0o700, exist_ok=True)
+    info = os.lstat(path)
+    if not stat.S_ISDIR(info.st_mode) or info.st_uid != os.getuid() or info.st_mode & 0o077:
+        raise PermissionError(f"{path} must be a directory owned by this user with mode 0700")
+    return path
+
+
+def open_shared_store(directory, **settings):
+    """
+    Open a diskcache store in a private directory (see private_directory),
+    without keeping its connection open.
+
+    diskcache connects on first use in every process and thread, so a store
+    created at import by a server that then forks its workers is only used
+    through connections opened after the fork.
+
+    Parameters:
+    - directory: Directory of the store.
+    - settings: diskcache.Cache settings.
+
+    Returns:
+    - diskcache.Cache
+    """
+    store = diskcache.Cache(private_directory(directory), **settings)
+    store.close()
+    return store
+
+
+def canonical_legs(legs):
+    """
+    Canonicalize a collection of legs and sort them, so that the same strategy
+    entered in a different leg order produces the same cache key.
+    """
+    return tuple(sorted((canonicalize(leg) for leg in legs), key=repr))
+
+
+class FigureCache:
+    def __init__(self, maxsize=256, ttl=600):
+        """
+        Initialize a bounded, thread-safe LRU cache with time-based expiry.
+
+        Parameters:
+        - maxsize: Maximum number of entries kept; the least recently used entry
+          is evicted beyond that.
+        - ttl: Time to live of an entry in seconds (None disables expiry).
+        """
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key):
+        """
+        Look up a key.
+
+        Returns:
+        - (True, value) on a hit, (False, None) on a miss or an expired entry.
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                expires_at, value = entry
+                if expires_at is None or expires_at > time.monotonic():
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return True, value
+                del self._entries[key]
+                self.evictions += 1
+            self.misses += 1
+            return False, None
+
+    def set(self, key, value):
+        """Store a value, evicting the least recently used entries beyond maxsize."""
+        expires_at = None if self.ttl is None else time.monotonic() + self.ttl
+        with self._lock:
+            self._entries[key] = (expires_at, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        """Remove all entries; the counters are kept."""
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def stats(self):
+        """Return the hit, miss and eviction counters together with the hit rate."""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'size': len(self._entries),
+                'maxsize': self.maxsize,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'hit_rate': self.hits / lookups if lookups else 0.0
+            }
+
+
+class SharedFigureCache(FigureCache):
+    def __init__(self, directory, maxsize=256, ttl=600, size_limit=1 << 30):
+        """
+        FigureCache backed by a store shared by every process on the host, so
+        a result computed by one server worker (or background job) is served
+        by all the others without recomputation.
+
+        Entries are looked up in the in-process LRU first, then in the shared
+        store: a diskcache (SQLite plus files) in directory, which should be on
+        a memory-backed filesystem such as /dev/shm. Values are pickled, so
+        they must be picklable, and the directory must be private to this user
+        (see private_directory). Every process connects to the store on first
+        use, so the cache can be created before the server forks.
+
+        Parameters:
+        - directory: Directory of the shared store.
+        - maxsize: Maximum number of entries of the in-process LRU.
+        - ttl: Time to live of an entry in seconds, in both levels.
+        - size_limit: Approximate size limit of the shared store in bytes;
+          the least recently stored entries are evicted beyond it.
+        """
+        if diskcache is None:
+            raise ImportError("A shared figure cache requires diskcache")
+        super().__init__(maxsize, ttl)
+        self.directory = directory
+        self._store = open_shared_store(directory, size_limit=size_limit,
+                                        eviction_policy='least-recently-stored')
+        self.shared_hits = 0
+
+    @staticmethod
+    def _store_key(key):
+        return hashlib.sha1(repr(key).encode()).hexdigest()
+
+    def get(self, key):
+        """
+        Look up a key, in this process first and then in the shared store.
+
+        Returns:
+        - (True, value) on a hit, (False, None) on a miss or an expired entry.
+        """
+        found, value = super().get(key)
+        if found:
+            return True, value
+        found, value = self._store.get(self._store_key(key), default=(False, None))
+        if not found:
+            return False, None
+        super().set(key, value)
+        with self._lock:
+            # The lookup in this process was counted as a miss
+            self.misses -= 1
+            self.hits += 1
+            self.shared_hits += 1
+        return True, value
+
+    def set(self, key, value):
+        """Store a value in this process and in the shared store."""
+        super().set(key, value)
+        self._store.set(self._store_key(key), (True, value), expire=self.ttl)
+
+    def clear(self):
+        """Remove all entries, in this process and in the shared store."""
+        super().clear()
+        self._store.clear()
+
+    def stats(self):
+        """Return the FigureCache counters plus the shared hits and shared store size."""
+        stats = super().stats()
+        stats['shared_hits'] = self.shared_hits
+        stats['shared_size'] = len(self._store)
+        return stats
+
+
+def memoize(cache, copy_values=True):
+    """
+    Decorator caching a function's result in a FigureCache.
+
+    The key is the function name plus the canonicalized positional and keyword
+    arguments, so callers should pass already-normalized inputs (for example
+    legs through canonical_legs).
+
+    Every call gets its own deep copy of the cached value, so a caller editing
+    a result (e.g. a figure dictionary) does not change what the next request
+    is served. Copying a go.Figure is slow, so memoized functions return
+    figures as dictionaries (go.Figure.to_plotly_json()).
+
+    Parameters:
+    - cache: FigureCache holding the results.
+    - copy_values: Whether to copy results; only turn it off for values that
+      are not modified in place (e.g. read-only arrays).
+    """
+    def decorator(func):
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            key = (func.__name__, canonicalize(args), canonicalize(kwargs))
+            found, value = cache.get(key)
+            if not found:
+                value = func(*args, **kwargs)
+                cache.set(key, value)
+            return copy.deepcopy(value) if copy_values else value
+        return wrapper
+    return decorator
+
+
+def nice_step(raw_step):
+    """Round a grid step down to 1, 2 or 5 times a power of ten."""
+    exponent = math.floor(math.log10(raw_step))
+    base = 10.0 ** exponent
+    for factor in (5, 2, 1):
+        if factor * base <= raw_step * (1 + 1e-12):
+            return canonicalize(factor * base)
+    return canonicalize(base)
+
+
+class LegCurveCache:
+    def __init__(self, maxsize=4096):
+        """
+        Cache of per-leg value curves for incremental strategy recomputes.
+
+        Curves are evaluated on a lattice S = k * step with a "nice" step (see
+        nice_step), so grids for nearby spot ranges share points. Each leg is
+        keyed on (type, strike, position, quantity, T, exercise style, t, sigma,
+        r, step) and
+        stores a contiguous run of lattice points; when the spot range moves only
+        the new points are evaluated, and unchanged legs are not evaluated at all.
+
+        Parameters:
+        - maxsize: Maximum number of leg curves kept (LRU).
+        """
+        self._cache = FigureCache(maxsize=maxsize, ttl=None)
+        self.evaluated_points = 0
+
+    def stats(self):
+        """Return the underlying cache counters and the number of leg-points evaluated."""
+        return {**self._cache.stats(), 'evaluated_points': self.evaluated_points}
+
+    def value_curve(self, portfolio, t, sigma, r, S_min, S_max, num_points=200):
+        """
+        Compute the current value curve of a portfolio, reusing cached legs.
+
+        The payoff at expiry is not cached: it is drawn from the exact
+        vertices of portfolio.payoff_profile() instead.
+
+        Parameters:
+        - portfolio: Portfolio whose legs are priced.
+        - t, sigma, r: Current time, volatility and risk-free rate.
+        - S_min, S_max: Underlying price range.
+        - num_points: Approximate number of points; the lattice step is the
+          largest nice step giving at least this many points.
+
+        Returns:
+        - (S_range, total_value)
+        """
+        step = nice_step((S_max - S_min) / max(num_points - 1, 1))
+        first = math.ceil(S_min / step - 1e-9)
+        last = math.floor(S_max / step + 1e-9)
+        keys = [
+            canonicalize((int(code), strike, position, quantity, expiry, bool(american), t, sigma, r, step))
+            for code, strike, position, quantity, expiry, american in zip(
+                portfolio.type_codes, portfolio.strikes, portfolio.positions,
+                portfolio.quantities, portfolio.expiries, portfolio.american
+            )
+        ]
+
+        # Work out which lattice ranges are missing for each leg and group legs
+        # missing the same range so each group is one batched Portfolio call.
+        entries = []
+        work = {}
+        for idx, key in enumerate(keys):
+            found, entry = self._cache.get(key)
+            if found:
+                lo, value = entry
+                hi = lo + value.size - 1
+                span = max(hi, last) - min(lo, first) + 1
+                if first > hi + 1 or last < lo - 1 or span > MAX_LEG_CURVE_POINTS:
+                    found = False
+            if not found:
+                entry = (first, np.empty(0))
+                missing = [(first, last)]
+            else:
+                missing = []
+                if first < lo:
+                    missing.append((first, lo - 1))
+                if last > hi:
+                    missing.append((hi + 1, last))
+            entries.append(entry)
+            for k_range in missing:
+                work.setdefault(k_range, []).append(idx)
+
+        pieces = {}
+        for (k_lo, k_hi), indices in work.items():
+            grid = np.arange(k_lo, k_hi + 1) * step
+            values = portfolio.subset(indices).value(grid, t, sigma, r, per_leg=True)
+            self.evaluated_points += values.size
+            for row, idx in enumerate(indices):
+                pieces.setdefault(idx, []).append((k_lo, values[row]))
+
+        total_value = np.zeros(last - first + 1)
+        for idx, (lo, value) in enumerate(entries):
+            if idx in pieces:
+                parts = sorted(pieces[idx] + ([(lo, value)] if value.size else []), key=lambda part: part[0])
+                lo = parts[0][0]
+                value = np.concatenate([part[1] for part in parts])
+                self._cache.set(keys[idx], (lo, value))
+            total_value += value[first - lo:last - lo + 1]
+
+        return np.arange(first, last + 1) * step, total_value
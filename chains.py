@@ -0,0 +1,429 @@
+import csv
+import json
+import os
+import shutil
+import tempfile
+from functools import lru_cache
+
+import numpy as np
+
+from instruments import CALL, PUT, black_scholes_value, black_scholes_evaluate
+from implied_vol import implied_volatility
+
+# A chain loaded from chain.csv is stored next to it in chain.csv.chain/
+STORE_SUFFIX = '.chain'
+STORE_VERSION = 1
+DEFAULT_CHUNK_ROWS = 1 << 20
+
+# Rows are stored sorted by these columns, which serves as the (expiry, strike, type) index
+KEY_COLUMNS = ['expiry', 'strike', 'type']
+COLUMN_ALIASES = {
+    'option_type': 'type',
+    'right': 'type',
+    'call_put': 'type',
+    'maturity': 'expiry',
+    'tau': 'expiry',
+    'k': 'strike'
+}
+
+
+def load_chain(path, chunk_rows=DEFAULT_CHUNK_ROWS, store_dir=None):
+    """
+    Open an option chain, converting it to the columnar store on first use.
+
+    The source is a CSV or Parquet file with at least the columns strike,
+    expiry (time to expiry in years) and type ('call'/'put', or 'c'/'p'). Any
+    other numeric column (price, bid, ask, iv, underlying, ...) is kept, and
+    non-numeric columns are dropped. The source is streamed in chunks of
+    chunk_rows rows and written as one memory-mappable .npy file per column,
+    sorted by (expiry, strike, type). Later loads only check the source's size
+    and modification time and map the columns, which takes milliseconds.
+
+    Parameters:
+    - path: Source file, or an existing store directory.
+    - chunk_rows: Number of rows read and written per chunk.
+    - store_dir: Where to keep the store (defaults to path + '.chain').
+
+    Returns:
+    - OptionChain
+    """
+    if os.path.isdir(path) and os.path.exists(os.path.join(path, 'meta.json')):
+        return OptionChain(path)
+
+    store_dir = store_dir or path + STORE_SUFFIX
+    if not _store_is_current(store_dir, path):
+        _write_store(path, store_dir, chunk_rows)
+    return OptionChain(store_dir)
+
+
+def resolve_data_file(name, data_dir):
+    """
+    Resolve a file name typed by a user to a file inside data_dir.
+
+    Only relative names are accepted, without '..' components, and the
+    resolved path (symlinks followed) must stay inside data_dir, so a client
+    cannot make the server read arbitrary files.
+
+    Parameters:
+    - name: File name relative to data_dir, e.g. 'spx/2024-06-28.csv'.
+    - data_dir: Directory the files are served from.
+
+    Returns:
+    - Absolute path of the file.
+    """
+    name = (name or '').strip()
+    parts = name.replace('\\', '/').split('/')
+    if not name or os.path.isabs(name) or '..' in parts:
+        raise ValueError("Give a file name relative to the data directory, without '..'")
+    root = os.path.realpath(data_dir)
+    path = os.path.realpath(os.path.join(root, name))
+    if os.path.commonpath([root, path]) != root:
+        raise ValueError("The file is outside the data directory")
+    if not os.path.isfile(path):
+        raise ValueError(f"No file named {name!r} in the data directory")
+    return path
+
+
+def source_signature(path):
+    """Identify a version of a file by its absolute path, size and modification time."""
+    stat = os.stat(path)
+    return {'path': os.path.abspath(path), 'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns}
+
+
+def _store_is_current(store_dir, path):
+    try:
+        with open(os.path.join(store_dir, 'meta.json')) as f:
+            meta = json.load(f)
+    except (OSError, ValueError):
+        return False
+    return meta.get('version') == STORE_VERSION and meta.get('source') == source_signature(path)
+
+
+def _parse_types(values):
+    """Map 'call'/'put' (or 'c'/'p', any case) to CALL/PUT codes."""
+    first = np.char.lower(np.char.strip(np.asarray(values, dtype=str))).astype('U1')
+    codes = np.where(first == 'c', CALL, np.where(first == 'p', PUT, -1)).astype(np.int8)
+    if (codes < 0).any():
+        raise ValueError(f"Invalid option type in chain: {np.asarray(values)[codes < 0][0]}")
+    return codes
+
+
+def _convert_columns(columns, keep=None):
+    """
+    Convert raw source columns to float64 (and int8 codes for 'type'), dropping
+    non-numeric ones. keep fixes the column set after the first chunk.
+    """
+    chunk = {}
+    for name, values in columns.items():
+        name = COLUMN_ALIASES.get(name.strip().lower(), name.strip().lower())
+        if keep is not None and name not in keep:
+            continue
+        if name == 'type':
+            chunk[name] = _parse_types(values)
+            continue
+        try:
+            chunk[name] = np.asarray([np.nan if value in ('', None) else value for value in values]
+                                     if isinstance(values, list) else values, dtype=float)
+        except (TypeError, ValueError):
+            if keep is not None:
+                raise
+    missing = [name for name in KEY_COLUMNS if name not in chunk]
+    if missing:
+        raise ValueError(f"Option chain is missing required column(s): {', '.join(missing)}")
+    return chunk
+
+
+@lru_cache(maxsize=None)
+def import_pyarrow():
+    """
+    Import pyarrow's CSV and Parquet readers on first use, so app workers that
+    never read a chain, returns or portfolio file do not pay for the import.
+
+    Returns:
+    - (pyarrow.csv, pyarrow.parquet), or (None, None) without pyarrow: CSV then
+      falls back to the csv module and Parquet is unavailable.
+    """
+    try:
+        import pyarrow.csv as pa_csv
+        import pyarrow.parquet as pa_parquet
+    except ImportError:
+        return None, None
+    return pa_csv, pa_parquet
+
+
+def _iter_source_chunks(path, chunk_rows):
+    """
+    Yield the source file as dictionaries of column arrays, one chunk at a time
+    (chunk_rows rows for Parquet and the csv fallback, ~64 MB blocks with pyarrow CSV).
+    """
+    keep = None
+    pa_csv, pa_parquet = import_pyarrow()
+    if path.lower().endswith(('.parquet', '.pq')):
+        if pa_parquet is None:
+            raise ImportError("Reading Parquet option chains requires pyarrow")
+        batches = pa_parquet.ParquetFile(path).iter_batches(batch_size=chunk_rows)
+        raw_chunks = ({name: batch.column(name).to_numpy(zero_copy_only=False)
+                       for name in batch.schema.names} for batch in batches)
+    elif pa_csv is not None:
+        reader = pa_csv.open_csv(path, read_options=pa_csv.ReadOptions(block_size=64 << 20))
+        raw_chunks = ({name: batch.column(name).to_numpy(zero_copy_only=False)
+                       for name in batch.schema.names} for batch in reader)
+    else:
+        raw_chunks = iter_csv_chunks(path, chunk_rows)
+
+    for raw in raw_chunks:
+        chunk = _convert_columns(raw, keep)
+        keep = set(chunk)
+        yield chunk
+
+
+def iter_csv_chunks(path, chunk_rows):
+    """
+    Read a CSV file with the csv module, chunk_rows rows at a time.
+
+    Returns:
+    - Iterator of dictionaries of column name to list of cell strings.
+    """
+    with open(path, newline='') as f:
+        reader = csv.reader(f)
+        header = next(reader)
+        rows = []
+        for row in reader:
+            rows.append(row)
+            if len(rows) == chunk_rows:
+                yield dict(zip(header, map(list, zip(*rows))))
+                rows = []
+        if rows:
+            yield dict(zip(header, map(list, zip(*rows))))
+
+
+def _write_store(path, store_dir, chunk_rows):
+    """
+    Stream the source into per-column files, then write them sorted by the key
+    columns. Every writer works in its own temporary directory next to
+    store_dir, so concurrent conversions of the same source do not clash.
+    """
+    parent = os.path.dirname(os.path.abspath(store_dir))
+    os.makedirs(parent, exist_ok=True)
+    tmp_dir = tempfile.mkdtemp(prefix=os.path.basename(store_dir) + '.', suffix='.tmp', dir=parent)
+    try:
+        _write_columns(path, tmp_dir, chunk_rows)
+        _publish_store(tmp_dir, store_dir, path)
+    finally:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+
+
+def _write_columns(path, tmp_dir, chunk_rows):
+    """Write the columns and meta.json of a store into tmp_dir."""
+    dtypes = {}
+    n_rows = 0
+    for chunk in _iter_source_chunks(path, chunk_rows):
+        for name, values in chunk.items():
+            dtypes[name] = values.dtype
+            with open(os.path.join(tmp_dir, name + '.bin'), 'ab') as f:
+                f.write(np.ascontiguousarray(values).tobytes())
+        n_rows += len(chunk['strike'])
+    if not dtypes:
+        raise ValueError(f"Option chain {path} has no rows")
+
+    raw = {
+        name: np.memmap(os.path.join(tmp_dir, name + '.bin'), dtype=dtype, mode='r', shape=(n_rows,))
+        if n_rows else np.empty(0, dtype=dtype)
+        for name, dtype in dtypes.items()
+    }
+    order = np.lexsort((raw['type'], raw['strike'], raw['expiry']))
+
+    for name, column in raw.items():
+        out = np.lib.format.open_memmap(os.path.join(tmp_dir, name + '.npy'), mode='w+',
+                                        dtype=column.dtype, shape=(n_rows,))
+        for start in range(0, n_rows, chunk_rows):
+            out[start:start + chunk_rows] = column[order[start:start + chunk_rows]]
+        out.flush()
+        del out, column
+    del raw
+    for name in dtypes:
+        os.remove(os.path.join(tmp_dir, name + '.bin'))
+
+    meta = {
+        'version': STORE_VERSION,
+        'rows': n_rows,
+        'columns': {name: np.dtype(dtype).str for name, dtype in dtypes.items()},
+        'source': source_signature(path)
+    }
+    with open(os.path.join(tmp_dir, 'meta.json'), 'w') as f:
+        json.dump(meta, f)
+
+
+def _publish_store(tmp_dir, store_dir, path):
+    """
+    Move a finished store into place. An outdated store is moved aside first;
+    when a concurrent writer already published a current store, it is kept.
+    """
+    try:
+        os.rename(tmp_dir, store_dir)
+        return
+    except OSError:
+        if _store_is_current(store_dir, path):
+            return
+    # Renaming a directory onto an empty one replaces it; mapped columns of the
+    # old store stay readable until they are closed
+    stale = tempfile.mkdtemp(prefix=os.path.basename(store_dir) + '.', suffix='.stale',
+                             dir=os.path.dirname(os.path.abspath(store_dir)))
+    try:
+        os.rename(store_dir, stale)
+        os.rename(tmp_dir, store_dir)
+    except OSError:
+        if not _store_is_current(store_dir, path):
+            raise
+    finally:
+        shutil.rmtree(stale, ignore_errors=True)
+
+
+class OptionChain:
+    def __init__(self, store_dir):
+        """
+        Open a columnar option chain store written by load_chain().
+
+        Columns are memory-mapped, so opening is cheap and rows are only read
+        from disk when they are used.
+
+        Parameters:
+        - store_dir: Directory containing meta.json and one .npy file per column.
+        """
+        self.store_dir = store_dir
+        with open(os.path.join(store_dir, 'meta.json')) as f:
+            self.meta = json.load(f)
+        self.columns = {
+            name: np.load(os.path.join(store_dir, name + '.npy'), mmap_mode='r')
+            for name in self.meta['columns']
+        }
+
+    def __len__(self):
+        return self.meta['rows']
+
+    def __getitem__(self, name):
+        return self.columns[name]
+
+    def expiries(self):
+        """Return the distinct expiries in the chain (sorted)."""
+        expiry = self.columns['expiry']
+        if len(expiry) == 0:
+            return np.empty(0)
+        starts = np.concatenate([[0], np.flatnonzero(np.diff(expiry)) + 1])
+        return np.asarray(expiry[starts])
+
+    def rows(self, expiry=None, option_type=None, strike_min=None, strike_max=None):
+        """
+        Return the row indices matching the given filters using the sort index.
+
+        Parameters:
+        - expiry: Exact expiry to select (None for all).
+        - option_type: 'call' or 'put' (None for both).
+        - strike_min, strike_max: Inclusive strike range (None for unbounded).
+
+        Returns:
+        - Array of row indices in (expiry, strike, type) order.
+        """
+        lo, hi = 0, len(self)
+        if expiry is not None:
+            lo = int(np.searchsorted(self.columns['expiry'], expiry, side='left'))
+            hi = int(np.searchsorted(self.columns['expiry'], expiry, side='right'))
+
+        mask = None
+        strikes = self.columns['strike']
+        if expiry is not None:
+            # Strikes are sorted within one expiry, so the strike range is a slice
+            if strike_min is not None:
+                lo += int(np.searchsorted(strikes[lo:hi], strike_min, side='left'))
+            if strike_max is not None:
+                hi = lo + int(np.searchsorted(strikes[lo:hi], strike_max, side='right'))
+        elif strike_min is not None or strike_max is not None:
+            strikes = np.asarray(strikes[lo:hi])
+            mask = np.ones(hi - lo, dtype=bool)
+            if strike_min is not None:
+                mask &= strikes >= strike_min
+            if strike_max is not None:
+                mask &= strikes <= strike_max
+
+        if option_type is not None:
+            code = CALL if option_type.lower() == 'call' else PUT
+            type_mask = np.asarray(self.columns['type'][lo:hi]) == code
+            mask = type_mask if mask is None else mask & type_mask
+
+        if mask is None:
+            return np.arange(lo, hi)
+        return lo + np.flatnonzero(mask)
+
+    def lookup(self, expiry, strike, option_type):
+        """Return the row index of one contract, or None if it is not in the chain."""
+        rows = self.rows(expiry, option_type, strike, strike)
+        return int(rows[0]) if rows.size else None
+
+    def _chunks(self, rows, chunk_rows):
+        if rows is None:
+            for start in range(0, len(self), chunk_rows):
+                yield slice(start, min(start + chunk_rows, len(self)))
+        else:
+            rows = np.asarray(rows)
+            for start in range(0, rows.size, chunk_rows):
+                yield rows[start:start + chunk_rows]
+
+    def _contract_arrays(self, index, t, sigma):
+        strike = np.asarray(self.columns['strike'][index])
+        tau = np.asarray(self.columns['expiry'][index]) - t
+        is_call = np.asarray(self.columns['type'][index]) == CALL
+        if isinstance(sigma, str):
+            sigma = np.asarray(self.columns[sigma][index])
+        return strike, tau, is_call, sigma
+
+    def price(self, S, sigma, r, t=0.0, rows=None, chunk_rows=DEFAULT_CHUNK_ROWS):
+        """
+        Price contracts in bulk with Black-Scholes, one chunk of rows at a time.
+
+        Parameters:
+        - S: Current price of the underlying asset.
+        - sigma: Volatility, or the name of a column holding one per contract (e.g. 'iv').
+        - r: Risk-free interest rate.
+        - t: Current time; the expiry column is measured from t = 0.
+        - rows: Row indices to price (None for the whole chain).
+
+        Returns:
+        - Array of prices, one per selected row.
+        """
+        out = []
+        for index in self._chunks(rows, chunk_rows):
+            strike, tau, is_call, chunk_sigma = self._contract_arrays(index, t, sigma)
+            out.append(black_scholes_value(S, strike, tau, chunk_sigma, r, is_call))
+        return np.concatenate(out) if out else np.empty(0)
+
+    def greeks(self, S, sigma, r, t=0.0, rows=None, chunk_rows=DEFAULT_CHUNK_ROWS):
+        """
+        Compute the value and all Greeks of contracts in bulk (see price() for parameters).
+
+        Returns:
+        - Dictionary containing Value, Delta, Gamma, Theta, Vega, and Rho arrays
+        """
+        out = {}
+        for index in self._chunks(rows, chunk_rows):
+            strike, tau, is_call, chunk_sigma = self._contract_arrays(index, t, sigma)
+            for name, values in black_scholes_evaluate(S, strike, tau, chunk_sigma, r, is_call).items():
+                out.setdefault(name, []).append(values)
+        return {name: np.concatenate(parts) for name, parts in out.items()}
+
+    def implied_vols(self, S, r, t=0.0, price_column='price', rows=None, chunk_rows=DEFAULT_CHUNK_ROWS):
+        """
+        Solve the implied volatility of every selected contract from a price column.
+
+        Returns:
+        - (sigma, converged) arrays, one entry per selected row.
+        """
+        sigmas, flags = [], []
+        for index in self._chunks(rows, chunk_rows):
+            strike, tau, is_call, _ = self._contract_arrays(index, t, None)
+            prices = np.asarray(self.columns[price_column][index])
+            sigma, converged = implied_volatility(prices, S, strike, tau, r, is_call)
+            sigmas.append(np.atleast_1d(sigma))
+            flags.append(np.atleast_1d(converged))
+        if not sigmas:
+            return np.empty(0), np.empty(0, dtype=bool)
+        return np.concatenate(sigmas), np.concatenate(flags)
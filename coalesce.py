@@ -0,0 +1,82 @@
+import threading
+from collections import OrderedDict
+
+
+class StaleRequest(Exception):
+    """Raised for a request superseded by a newer one from the same session."""
+
+
+class RequestCoalescer:
+    def __init__(self, max_sessions=10000):
+        """
+        Initialize a registry of the latest request per client session.
+
+        Every session sends a strictly increasing sequence number with its
+        requests. Only one request per session computes at a time; requests
+        that queue up behind it during a burst (e.g. a slider being dragged)
+        are dropped, except the newest, so a burst costs at most two
+        computations whatever its length.
+
+        The registry lives in the memory of one process. Behind a server with
+        several worker processes, requests of the same session that land on
+        different workers are not coalesced with each other, so a burst costs
+        up to two computations per worker it reaches; a load balancer with
+        sticky sessions keeps every session on one worker.
+
+        Parameters:
+        - max_sessions: Maximum number of sessions tracked; the least recently
+          active session is forgotten beyond that.
+        """
+        self.max_sessions = max_sessions
+        self._sessions = OrderedDict()
+        self._lock = threading.Lock()
+        self.computed = 0
+        self.dropped = 0
+
+    def _session(self, session):
+        """Return the [latest sequence number, lock] entry of a session, creating it."""
+        entry = self._sessions.get(session)
+        if entry is None:
+            entry = self._sessions[session] = [-1, threading.Lock()]
+        self._sessions.move_to_end(session)
+        while len(self._sessions) > self.max_sessions:
+            self._sessions.popitem(last=False)
+        return entry
+
+    def submit(self, session, seq, compute):
+        """
+        Run compute() for a request unless a newer request of the same session
+        has arrived in the meantime.
+
+        Parameters:
+        - session: Client session identifier.
+        - seq: Sequence number of the request within the session.
+        - compute: Function of no arguments producing the response.
+
+        Returns:
+        - The result of compute(); StaleRequest is raised instead when the
+          request was superseded before it started.
+        """
+        with self._lock:
+            entry = self._session(session)
+            if seq <= entry[0]:
+                self.dropped += 1
+                raise StaleRequest()
+            entry[0] = seq
+            session_lock = entry[1]
+
+        with session_lock:
+            # Re-check once the previous computation of this session is done
+            if entry[0] != seq:
+                with self._lock:
+                    self.dropped += 1
+                raise StaleRequest()
+            result = compute()
+        with self._lock:
+            self.computed += 1
+        return result
+
+    def stats(self):
+        """Return the number of tracked sessions and of computed and dropped requests."""
+        with self._lock:
+            return {'sessions': len(self._sessions), 'computed': self.computed, 'dropped': self.dropped}
@@ -1,5 +1,4 @@
 from dash import dcc, html
-import plotly.graph_objs as go
 
 # Common styles
 CONTAINER_STYLE = {
@@ -27,6 +26,26 @@ BUTTON_STYLE = {
     'margin': '10px 0'
 }
 
+# Sample option chain (strike, price, type) shown in the Implied Volatility tab
+DEFAULT_IV_QUOTES = """80,24.57,call
+80,2.60,put
+85,19.58,call
+85,2.48,put
+90,14.85,call
+90,2.62,put
+95,10.53,call
+95,3.18,put
+100,6.89,call
+100,4.42,put
+105,4.23,call
+105,6.64,put
+110,2.65,call
+110,9.93,put
+115,1.92,call
+115,14.08,put
+120,1.75,call
+120,18.79,put"""
+
 INPUT_STYLE = {
     'margin': '5px 0',
     'padding': '8px',
@@ -45,49 +64,88 @@ def create_layout():
             children=[
                 dcc.Tab(label='Trading Strategies', value='tab-1'),
                 dcc.Tab(label='Single Option Analysis', value='tab-2'),
-                dcc.Tab(label='Option Greeks', value='tab-3')
+                dcc.Tab(label='Option Greeks', value='tab-3'),
+                dcc.Tab(label='Implied Volatility', value='tab-4'),
+                dcc.Tab(label='Scenarios', value='tab-5'),
+                dcc.Tab(label='Value at Risk', value='tab-6')
             ],
             style={'margin': '20px 0'}
         ),
-        html.Div(id='tabs-content')
+        html.Div(id='tabs-content'),
+        # Legs of the last strategy drawn in the Trading Strategies tab, shared with other tabs
+        dcc.Store(id='strategy-store')
     ], style=CONTAINER_STYLE)
 
-def create_instrument_input(instrument_number):
-    """Create input components for a single instrument."""
-    # Set default strike value for first instrument
-    default_strike = 100 if instrument_number == 1 else None
-    
+def create_instrument_input(index, strike=None):
+    """
+    Create input components for a single strategy leg.
+
+    Components use pattern-matching IDs ({'type': 'leg-...', 'index': index}),
+    so any number of legs can be added and removed and read with ALL.
+    """
     return html.Div([
-        html.H4(f'Instrument {instrument_number}', style={'color': '#34495e'}),
+        html.Div([
+            html.H4(f'Instrument {index + 1}', style={'color': '#34495e', 'margin': '0'}),
+            html.Button(
+                '×',
+                id={'type': 'remove-leg', 'index': index},
+                n_clicks=0,
+                title='Remove this leg',
+                style={'border': 'none', 'background': 'none', 'cursor': 'pointer', 'font-size': '18px'}
+            )
+        ], style={'display': 'flex', 'justify-content': 'space-between', 'align-items': 'center'}),
         html.Div([
             dcc.Dropdown(
-                id=f'instrument-{instrument_number}-type',
+                id={'type': 'leg-type', 'index': index},
                 options=[
                     {'label': 'Call', 'value': 'call'},
                     {'label': 'Put', 'value': 'put'},
                     {'label': 'Stock', 'value': 'stock'}
                 ],
                 value='call',
+                clearable=False,
                 style={'margin': '5px 0', 'flex': 2}
             ),
             dcc.Dropdown(
-                id=f'instrument-{instrument_number}-position',
+                id={'type': 'leg-position', 'index': index},
                 options=[
                     {'label': 'Buy', 'value': 1},
                     {'label': 'Sell', 'value': -1}
                 ],
                 value=1,
+                clearable=False,
                 style={'margin': '5px 0', 'flex': 1}
             ),
         ], style={'display': 'flex', 'gap': '10px'}),
-        dcc.Input(
-            id=f'instrument-{instrument_number}-strike',
-            type='number',
-            placeholder='Strike',
-            value=default_strike,
-            style=INPUT_STYLE
-        )
-    ], style={'padding': '15px', 'flex': 1, 'margin': '0 10px', 'background': 'white', 'border-radius': '4px'})
+        dcc.Dropdown(
+            id={'type': 'leg-exercise', 'index': index},
+            options=[
+                {'label': 'European', 'value': 'european'},
+                {'label': 'American', 'value': 'american'}
+            ],
+            value='european',
+            clearable=False,
+            style={'margin': '5px 0'}
+        ),
+        html.Div([
+            dcc.Input(
+                id={'type': 'leg-strike', 'index': index},
+                type='number',
+                placeholder='Strike',
+                value=strike,
+                style={**INPUT_STYLE, 'flex': 2}
+            ),
+            dcc.Input(
+                id={'type': 'leg-quantity', 'index': index},
+                type='number',
+                placeholder='Quantity',
+                value=1,
+                min=0,
+                style={**INPUT_STYLE, 'flex': 1}
+            )
+        ], style={'display': 'flex', 'gap': '10px'})
+    ], id={'type': 'leg', 'index': index},
+       style={'padding': '15px', 'flex': '1 1 220px', 'max-width': '32%', 'background': 'white', 'border-radius': '4px'})
 
 def create_parameter_input(label, id_name, default_value):
     """Create a labeled input component."""
@@ -101,39 +159,45 @@ def create_parameter_input(label, id_name, default_value):
         )
     ], style={'margin': '10px 0'})
 
+def create_progress_bar(id_name):
+    """Create a progress bar for a background callback, hidden until a job runs."""
+    return html.Progress(id=id_name, value='0', max='1', style={'display': 'none'})
+
 def create_trading_strategies_tab():
     """Create the layout for the Trading Strategies tab."""
     return html.Div([
         # Main content area with instruments and graph
         html.Div([
             html.H3('Trading Strategies', style={'color': '#2c3e50'}),
-            html.Div([
-                # First row of instruments
-                html.Div([
-                    create_instrument_input(1),
-                    create_instrument_input(2),
-                    create_instrument_input(3),
-                ], style={'display': 'flex', 'flex-direction': 'row', 'gap': '10px', 'margin': '10px 0'}),
-                # Second row of instruments
-                html.Div([
-                    create_instrument_input(4),
-                    create_instrument_input(5),
-                    create_instrument_input(6),
-                ], style={'display': 'flex', 'flex-direction': 'row', 'gap': '10px', 'margin': '10px 0'}),
-            ]),
-            html.Button(
-                'Update Strategy',
-                id='update-strategy',
-                n_clicks=0,
-                style=BUTTON_STYLE
+            # Legs are added and removed by the manage_legs callback
+            html.Div(
+                [create_instrument_input(0, strike=100)],
+                id='legs-container',
+                style={'display': 'flex', 'flex-wrap': 'wrap', 'gap': '10px', 'margin': '10px 0'}
             ),
-            dcc.Graph(id='strategy-graph', style={'height': '65vh'})  # Slightly shorter to accommodate more instruments
+            html.Div([
+                html.Button(
+                    'Add Leg',
+                    id='add-leg',
+                    n_clicks=0,
+                    style={**BUTTON_STYLE, 'background-color': '#6c757d'}
+                ),
+                html.Button(
+                    'Update Strategy',
+                    id='update-strategy',
+                    n_clicks=0,
+                    style=BUTTON_STYLE
+                )
+            ], style={'display': 'flex', 'gap': '10px'}),
+            dcc.Graph(id='strategy-graph', style={'height': '65vh'}),
+            # Digests of the figure shown, so updates only send the arrays that changed
+            dcc.Store(id='strategy-graph-signature')
         ], style={'flex': '4', 'margin-right': '20px'}),
         
         # Sidebar with market parameters
         html.Div([
             html.Div(
-                create_market_parameters_inputs(),
+                [create_market_parameters_inputs(), create_live_mode_inputs()],
                 style={
                     **INPUT_CONTAINER_STYLE,
                     'position': 'sticky',
@@ -163,9 +227,49 @@ def create_market_parameters_inputs():
         create_parameter_input("Time to Maturity (T):", 'time-maturity', 1),
         create_parameter_input("Current Time (t):", 'current-time', 0),
         create_parameter_input("Volatility (σ):", 'volatility', 0.2),
-        create_parameter_input("Risk Free Rate (r):", 'risk-free-rate', 0.05)
+        create_parameter_input("Risk Free Rate (r):", 'risk-free-rate', 0.05),
+        create_parameter_input("Value Curve Tolerance (blank = uniform grid):", 'value-tolerance', 0.01),
+        create_parameter_input("Time-Decay Animation Frames (0 = off):", 'animation-frames', 0)
+    ])
+
+def create_live_mode_inputs():
+    """
+    Create the live mode toggle and sliders of the Trading Strategies tab.
+
+    While live mode is on, moving a slider redraws the current value of the
+    last strategy drawn without pressing Update Strategy.
+    """
+    return html.Div([
+        html.H4('Live Mode', style={'color': '#34495e', 'margin': '20px 0 10px 0'}),
+        dcc.Checklist(
+            id='live-mode',
+            options=[{'label': ' Update on slider moves', 'value': 'live'}],
+            value=[]
+        ),
+        create_live_slider("Underlying Price (S):", 'live-underlying', 10, 300, 0.5, 100),
+        create_live_slider("Current Time (t):", 'live-current-time', 0, 5, 0.01, 0),
+        create_live_slider("Volatility (σ):", 'live-volatility', 0.01, 1, 0.01, 0.2),
+        create_live_slider("Risk Free Rate (r):", 'live-risk-free-rate', 0, 0.15, 0.0025, 0.05),
+        # Session id and sequence number of the latest slider state, see coalesce.RequestCoalescer
+        dcc.Store(id='live-request')
     ])
 
+def create_live_slider(label, id_name, min_value, max_value, step, default_value):
+    """Create a labeled slider that reports its value while being dragged."""
+    return html.Div([
+        html.Label(label, style={'font-weight': 'bold', 'margin': '5px 0'}),
+        dcc.Slider(
+            id=id_name,
+            min=min_value,
+            max=max_value,
+            step=step,
+            value=default_value,
+            marks=None,
+            updatemode='drag',
+            tooltip={'placement': 'bottom', 'always_visible': True}
+        )
+    ], style={'margin': '10px 0'})
+
 def create_single_option_analysis_tab():
     """Create the layout for the Single Option Analysis tab."""
     return html.Div([
@@ -180,7 +284,8 @@ def create_single_option_analysis_tab():
             ),
             html.Div([
                 dcc.Graph(id='graph-ncdf-diff', style={'height': '37vh'}),
-                dcc.Graph(id='graph-ncdf-ratio', style={'height': '37vh'})
+                dcc.Graph(id='graph-ncdf-ratio', style={'height': '37vh'}),
+                dcc.Store(id='ncdf-signatures')
             ])
         ], style={'flex': '4', 'margin-right': '20px'}),
         
@@ -224,6 +329,7 @@ def create_option_greeks_tab():
                 n_clicks=0,
                 style=BUTTON_STYLE
             ),
+            create_progress_bar('greeks-progress'),
             html.Div(
                 id='greeks-output',
                 style={
@@ -256,6 +362,87 @@ def create_option_greeks_tab():
                     ],
                     value='call',
                     style={'margin': '5px 0'}
+                ),
+                html.Label("Apply To:", style={'font-weight': 'bold', 'margin': '5px 0'}),
+                dcc.Dropdown(
+                    id='greek-scope',
+                    options=[
+                        {'label': 'Option Above', 'value': 'option'},
+                        {'label': 'Current Strategy', 'value': 'strategy'}
+                    ],
+                    value='option',
+                    clearable=False,
+                    style={'margin': '5px 0'}
+                ),
+                html.Label("Display:", style={'font-weight': 'bold', 'margin': '5px 0'}),
+                dcc.Dropdown(
+                    id='greek-mode',
+                    options=[
+                        {'label': 'Single Point', 'value': 'point'},
+                        {'label': 'Heatmaps (Price × Time)', 'value': 'heatmap'},
+                        {'label': 'Surfaces (Price × Time)', 'value': 'surface'}
+                    ],
+                    value='point',
+                    clearable=False,
+                    style={'margin': '5px 0'}
+                ),
+                create_parameter_input("Grid Resolution (max 500):", 'greek-grid-size', 100)
+            ], style={
+                **INPUT_CONTAINER_STYLE,
+                'position': 'sticky',
+                'top': '20px'
+            })
+        ], style={
+            'flex': '1',
+            'min-width': '200px',
+            'max-width': '300px',
+            'margin-top': '60px'  # Align with content below main heading
+        })
+    ], style={
+        'display': 'flex',
+        'flex-direction': 'row',
+        'gap': '10px',
+        'align-items': 'flex-start',
+        'width': '100%',
+        'height': '100%'
+    })
+
+def create_implied_volatility_tab():
+    """Create the layout for the Implied Volatility tab."""
+    return html.Div([
+        # Main content area with the volatility smile
+        html.Div([
+            html.H3('Implied Volatility', style={'color': '#2c3e50'}),
+            html.Button(
+                'Compute Implied Volatility',
+                id='compute-iv',
+                n_clicks=0,
+                style=BUTTON_STYLE
+            ),
+            create_progress_bar('iv-progress'),
+            html.Div(id='iv-summary', style={'margin': '10px 0'}),
+            dcc.Graph(id='iv-smile-graph', style={'height': '65vh'})
+        ], style={'flex': '4', 'margin-right': '20px'}),
+
+        # Sidebar with market parameters and quotes
+        html.Div([
+            html.Div([
+                html.H4('Chain Parameters', style={'color': '#34495e', 'margin-bottom': '15px'}),
+                create_parameter_input("Underlying Price (S):", 'iv-underlying', 100),
+                create_parameter_input("Time to Expiry (T-t):", 'iv-time-remaining', 0.5),
+                create_parameter_input("Risk Free Rate (r):", 'iv-risk-free', 0.05),
+                html.Label("Chain File (CSV/Parquet, optional):", style={'font-weight': 'bold', 'margin': '5px 0'}),
+                dcc.Input(
+                    id='iv-chain-path',
+                    type='text',
+                    placeholder='chain.csv (in the chain data directory)',
+                    style=INPUT_STYLE
+                ),
+                html.Label("Quotes (strike, price, type[, expiry]):", style={'font-weight': 'bold', 'margin': '5px 0'}),
+                dcc.Textarea(
+                    id='iv-quotes',
+                    value=DEFAULT_IV_QUOTES,
+                    style={**INPUT_STYLE, 'height': '300px', 'font-family': 'monospace'}
                 )
             ], style={
                 **INPUT_CONTAINER_STYLE,
@@ -276,3 +463,170 @@ def create_option_greeks_tab():
         'width': '100%',
         'height': '100%'
     })
+
+def create_scenarios_tab():
+    """Create the layout for the Scenarios tab."""
+    return html.Div([
+        # Main content area with the P&L heatmap and slice
+        html.Div([
+            html.H3('Scenario Analysis', style={'color': '#2c3e50'}),
+            html.P("Stress the strategy drawn in the Trading Strategies tab."),
+            html.Button(
+                'Run Scenarios',
+                id='run-scenarios',
+                n_clicks=0,
+                style=BUTTON_STYLE
+            ),
+            create_progress_bar('scenario-progress'),
+            # Key of the last scenario cube, sliced by the sliders below
+            dcc.Store(id='scenario-cube-store'),
+            html.Div(id='scenario-summary', style={'margin': '10px 0'}),
+            html.Label("Time Shock:", style={'font-weight': 'bold', 'margin': '5px 0'}),
+            dcc.Slider(id='scenario-time-slice', min=0, max=1, step=0.01, value=0, marks=None),
+            dcc.Graph(id='scenario-heatmap', style={'height': '50vh'}),
+            html.Label("Volatility Shock:", style={'font-weight': 'bold', 'margin': '5px 0'}),
+            dcc.Slider(id='scenario-vol-slice', min=0, max=1, step=0.01, value=0.5, marks=None),
+            dcc.Graph(id='scenario-slice', style={'height': '50vh'})
+        ], style={'flex': '4', 'margin-right': '20px'}),
+
+        # Sidebar with base market parameters and shock ranges
+        html.Div([
+            html.Div([
+                html.H4('Base Market', style={'color': '#34495e', 'margin-bottom': '15px'}),
+                create_parameter_input("Underlying Price (S):", 'scenario-underlying', 100),
+                create_parameter_input("Current Time (t):", 'scenario-current-time', 0),
+                create_parameter_input("Volatility (σ):", 'scenario-volatility', 0.2),
+                create_parameter_input("Risk Free Rate (r):", 'scenario-risk-free', 0.05),
+                html.H4('Shocks', style={'color': '#34495e', 'margin': '15px 0'}),
+                create_parameter_input("Spot Range (± %):", 'scenario-spot-range', 30),
+                create_parameter_input("Spot Steps:", 'scenario-spot-steps', 200),
+                create_parameter_input("Volatility Range (±):", 'scenario-vol-range', 0.1),
+                create_parameter_input("Volatility Steps:", 'scenario-vol-steps', 50),
+                create_parameter_input("Time Horizon (years):", 'scenario-time-horizon', 0.5),
+                create_parameter_input("Time Steps:", 'scenario-time-steps', 30),
+                html.Label("Rate Shocks (comma separated):", style={'font-weight': 'bold', 'margin': '5px 0'}),
+                dcc.Input(
+                    id='scenario-rate-shocks',
+                    type='text',
+                    value='0',
+                    style=INPUT_STYLE
+                )
+            ], style={
+                **INPUT_CONTAINER_STYLE,
+                'position': 'sticky',
+                'top': '20px'
+            })
+        ], style={
+            'flex': '1',
+            'min-width': '200px',
+            'max-width': '300px',
+            'margin-top': '60px'  # Align with content below main heading
+        })
+    ], style={
+        'display': 'flex',
+        'flex-direction': 'row',
+        'gap': '10px',
+        'align-items': 'flex-start',
+        'width': '100%',
+        'height': '100%'
+    })
+
+def create_var_tab():
+    """Create the layout for the Value at Risk tab."""
+    return html.Div([
+        # Main content area with the P&L distribution
+        html.Div([
+            html.H3('Historical Value at Risk', style={'color': '#2c3e50'}),
+            html.P("Reprice the strategy drawn in the Trading Strategies tab under every day "
+                   "of a historical returns file."),
+            html.Button(
+                'Compute VaR',
+                id='run-var',
+                n_clicks=0,
+                style=BUTTON_STYLE
+            ),
+            create_progress_bar('var-progress'),
+            html.Div(id='var-summary', style={'margin': '10px 0', 'white-space': 'pre-line'}),
+            dcc.Graph(id='var-distribution', style={'height': '60vh'})
+        ], style={'flex': '4', 'margin-right': '20px'}),
+
+        # Sidebar with the returns file, market parameters and method
+        html.Div([
+            html.Div([
+                html.H4('Returns', style={'color': '#34495e', 'margin-bottom': '15px'}),
+                html.Label("Returns File (CSV or Parquet):", style={'font-weight': 'bold', 'margin': '5px 0'}),
+                dcc.Input(
+                    id='var-returns-path',
+                    type='text',
+                    placeholder='returns.csv (in the returns data directory)',
+                    style=INPUT_STYLE
+                ),
+                dcc.RadioItems(
+                    id='var-return-type',
+                    options=[
+                        {'label': 'Simple returns', 'value': 'simple'},
+                        {'label': 'Log returns', 'value': 'log'}
+                    ],
+                    value='simple',
+                    style={'margin': '5px 0'}
+                ),
+                create_parameter_input("Holding Period (days):", 'var-horizon', 1),
+                create_parameter_input("Confidence (%):", 'var-confidence', 99),
+                html.Label("Method:", style={'font-weight': 'bold', 'margin': '5px 0'}),
+                dcc.Checklist(
+                    id='var-methods',
+                    options=[
+                        {'label': 'Full revaluation', 'value': 'full'},
+                        {'label': 'Delta-gamma', 'value': 'delta-gamma'}
+                    ],
+                    value=['full', 'delta-gamma'],
+                    style={'margin': '5px 0'}
+                ),
+                html.H4('Market', style={'color': '#34495e', 'margin': '15px 0'}),
+                create_parameter_input("Underlying Price (S):", 'var-underlying', 100),
+                create_parameter_input("Current Time (t):", 'var-current-time', 0),
+                create_parameter_input("Volatility (σ):", 'var-volatility', 0.2),
+                create_parameter_input("Risk Free Rate (r):", 'var-risk-free', 0.05)
+            ], style={
+                **INPUT_CONTAINER_STYLE,
+                'position': 'sticky',
+                'top': '20px'
+            })
+        ], style={
+            'flex': '1',
+            'min-width': '200px',
+            'max-width': '300px',
+            'margin-top': '60px'  # Align with content below main heading
+        })
+    ], style={
+        'display': 'flex',
+        'flex-direction': 'row',
+        'gap': '10px',
+        'align-items': 'flex-start',
+        'width': '100%',
+        'height': '100%'
+    })
+
+# Builders of the content of each tab, keyed by tab value
+TAB_BUILDERS = {
+    'tab-1': create_trading_strategies_tab,
+    'tab-2': create_single_option_analysis_tab,
+    'tab-3': create_option_greeks_tab,
+    'tab-4': create_implied_volatility_tab,
+    'tab-5': create_scenarios_tab,
+    'tab-6': create_var_tab
+}
+
+_tab_layouts = {}
+
+def get_tab_layout(tab):
+    """
+    Return the content of a tab, built the first time the tab is opened and
+    reused afterwards (the layouts are static, and callbacks never modify them).
+
+    Returns:
+    - The tab's component tree, or None for an unknown tab.
+    """
+    if tab not in _tab_layouts and tab in TAB_BUILDERS:
+        _tab_layouts[tab] = TAB_BUILDERS[tab]()
+    return _tab_layouts.get(tab)
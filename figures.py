@@ -0,0 +1,115 @@
+import base64
+import hashlib
+
+import numpy as np
+import plotly.graph_objs as go
+from dash import Patch, no_update
+from plotly.io.json import to_json_plotly
+
+# Series with at least this many points are stored as float32, which halves
+# their size on the wire (plotly sends numeric arrays as base64 typed arrays)
+COMPACT_MIN_POINTS = 64
+
+# Line traces with more points than this are drawn with WebGL (go.Scattergl)
+WEBGL_MIN_POINTS = 2000
+
+
+def compact_array(values):
+    """Return values as a float array, in float32 when the series is long enough to matter."""
+    values = np.asarray(values, dtype=float)
+    return values.astype(np.float32) if values.size >= COMPACT_MIN_POINTS else values
+
+
+def encode_array(values):
+    """
+    Encode a series as a plotly.js typed array spec, for use in a dash.Patch
+    (which would otherwise send the values as a JSON list).
+    """
+    values = compact_array(values)
+    if values.size == 0:
+        return []
+    dtype = 'f4' if values.dtype == np.float32 else 'f8'
+    return {'dtype': dtype, 'bdata': base64.b64encode(values.astype('<' + dtype).tobytes()).decode('ascii')}
+
+
+def line_trace(x, y, **kwargs):
+    """
+    Create a line trace with compact arrays, using WebGL for long series.
+
+    Parameters:
+    - x, y: Point coordinates.
+    - kwargs: Further trace attributes (name, mode, line, ...).
+    """
+    trace_class = go.Scattergl if np.size(x) > WEBGL_MIN_POINTS else go.Scatter
+    return trace_class(x=compact_array(x), y=compact_array(y), **kwargs)
+
+
+def _digest(value):
+    return hashlib.sha1(to_json_plotly(value).encode()).hexdigest()[:16]
+
+
+def figure_signature(figure):
+    """
+    Fingerprint of a figure: one digest per trace attribute, per top-level
+    layout attribute and of the animation frames.
+
+    Parameters:
+    - figure: go.Figure or figure dictionary.
+
+    Returns:
+    - (signature, figure dictionary) where the signature is JSON-serializable
+      and small enough to keep in a dcc.Store.
+    """
+    spec = figure.to_plotly_json() if hasattr(figure, 'to_plotly_json') else figure
+    signature = {
+        'data': [{key: _digest(value) for key, value in trace.items()} for trace in spec['data']],
+        'layout': {key: _digest(value) for key, value in spec.get('layout', {}).items()},
+        'frames': _digest(spec.get('frames', []))
+    }
+    return signature, spec
+
+
+def figure_update(signed, previous=None):
+    """
+    Turn a freshly built figure into the smallest update of the figure the
+    browser already shows.
+
+    When the figure has the same traces, attributes and frames as the one
+    described by previous, only the trace and layout attributes whose digest
+    changed are sent as a dash.Patch, or nothing at all when none did.
+    Otherwise the whole figure is sent.
+
+    Serializing a figure to compute its signature costs about as much as
+    sending it, so callers memoize the result of figure_signature alongside
+    the figure and pass it here.
+
+    Parameters:
+    - signed: (signature, figure dictionary) from figure_signature.
+    - previous: Signature of the figure shown in the browser, or None.
+
+    Returns:
+    - (update, signature) where update is the figure dictionary, a dash.Patch
+      or no_update.
+    """
+    signature, spec = signed
+    same_shape = (
+        previous is not None
+        and previous['frames'] == signature['frames']
+        and previous['layout'].keys() == signature['layout'].keys()
+        and [trace.keys() for trace in previous['data']] == [trace.keys() for trace in signature['data']]
+    )
+    if not same_shape:
+        return spec, signature
+
+    patch = Patch()
+    changed = False
+    for index, (old, new) in enumerate(zip(previous['data'], signature['data'])):
+        for key, digest in new.items():
+            if old[key] != digest:
+                patch['data'][index][key] = spec['data'][index][key]
+                changed = True
+    for key, digest in signature['layout'].items():
+        if previous['layout'][key] != digest:
+            patch['layout'][key] = spec['layout'][key]
+            changed = True
+    return (patch if changed else no_update), signature
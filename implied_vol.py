@@ -0,0 +1,91 @@
+import numpy as np
+
+from instruments import black_scholes_evaluate
+
+
+def implied_volatility(prices, S, K, tau, r, is_call, tol=1e-8, max_iter=100,
+                       sigma_min=1e-6, sigma_max=10.0, sigma_tol=1e-6):
+    """
+    Invert the Black-Scholes formula for whole arrays of option quotes.
+
+    Every quote runs a safeguarded Newton iteration inside its own bracket
+    [sigma_low, sigma_high]: the bracket is tightened after each evaluation
+    (the price is increasing in sigma), and a step that leaves the bracket or
+    has a vanishing vega is replaced by bisection. Only quotes that have not
+    converged are evaluated in each round, in a single vectorized call.
+
+    A quote converges when its price error is below tol and the volatility it
+    leaves open (price error / vega, the size of the next Newton step) is below
+    sigma_tol. Far from the money the vega is so small that almost any
+    volatility meets the price tolerance alone; such quotes keep iterating
+    until the volatility is pinned down, and are flagged as not converged if
+    it never is.
+
+    Quotes without a solution (price outside the no-arbitrage bounds, tau <= 0,
+    non-positive S or K) return NaN and are flagged as not converged.
+
+    Parameters:
+    - prices: Observed option prices.
+    - S: Current price of the underlying asset.
+    - K: Strike prices.
+    - tau: Time to expiry (T - t).
+    - r: Risk-free interest rate.
+    - is_call: Boolean (or boolean array) selecting calls over puts.
+    - tol: Absolute price tolerance for convergence.
+    - sigma_tol: Absolute volatility tolerance for convergence.
+    - max_iter: Maximum number of iterations.
+    - sigma_min, sigma_max: Initial bracket for the volatility.
+
+    Returns:
+    - (sigma, converged) arrays with the broadcast shape of the inputs.
+    """
+    arrays = np.broadcast_arrays(*[np.asarray(x, dtype=float) for x in (prices, S, K, tau, r)],
+                                 np.asarray(is_call, dtype=bool))
+    shape = arrays[0].shape
+    prices, S, K, tau, r, is_call = [a.ravel() for a in arrays]
+
+    # No-arbitrage bounds of European options
+    discounted_strike = K * np.exp(-r * np.maximum(tau, 0.0))
+    lower = np.maximum(np.where(is_call, S - discounted_strike, discounted_strike - S), 0.0)
+    upper = np.where(is_call, S, discounted_strike)
+    solvable = (tau > 0) & (S > 0) & (K > 0) & (prices > lower) & (prices < upper)
+
+    sigma = np.full(prices.size, np.nan)
+    converged = np.zeros(prices.size, dtype=bool)
+    low = np.full(prices.size, sigma_min)
+    high = np.full(prices.size, sigma_max)
+
+    # Brenner-Subrahmanyam starting point, clipped into the bracket
+    guess = np.sqrt(2 * np.pi / np.where(tau > 0, tau, 1.0)) * prices / np.where(S > 0, S, 1.0)
+    sigma[solvable] = np.clip(guess[solvable], 2 * sigma_min, sigma_max / 2)
+
+    active = np.flatnonzero(solvable)
+    for _ in range(max_iter):
+        if active.size == 0:
+            break
+        results = black_scholes_evaluate(S[active], K[active], tau[active], sigma[active], r[active], is_call[active])
+        diff = results['Value'] - prices[active]
+        vega = results['Vega']
+
+        done = (np.abs(diff) < tol) & (np.abs(diff) < sigma_tol * vega)
+        converged[active[done]] = True
+
+        current = sigma[active]
+        too_high = diff > 0
+        high[active] = np.where(too_high, current, high[active])
+        low[active] = np.where(too_high, low[active], current)
+
+        with np.errstate(divide='ignore', invalid='ignore', over='ignore'):
+            newton = current - diff / vega
+        inside = (vega > 1e-12) & (newton > low[active]) & (newton < high[active])
+        step = np.where(inside, newton, (low[active] + high[active]) / 2)
+        sigma[active] = np.where(done, current, step)
+
+        # Bracket collapsed without meeting the price tolerance: accept the midpoint
+        collapsed = ~done & (high[active] - low[active] < 1e-14 * np.maximum(high[active], 1.0))
+        converged[active[collapsed]] = True
+
+        active = active[~done & ~collapsed]
+
+    sigma[~converged] = np.nan
+    return sigma.reshape(shape)[()], converged.reshape(shape)[()]
@@ -1,8 +1,144 @@
-import math
-from scipy.stats import norm
+import numpy as np
+from scipy.special import ndtr
+
+from lattice import american_evaluate, american_value
+from metrics import instrument
+
+# Integer codes used when instruments are stored as arrays (see portfolio.Portfolio)
+STOCK, CALL, PUT = 0, 1, 2
+INSTRUMENT_TYPE_CODES = {'stock': STOCK, 'call': CALL, 'put': PUT}
+
+_INV_SQRT_2PI = 1.0 / np.sqrt(2 * np.pi)
+
+
+def _d1_d2(S, K, tau, sigma, r):
+    """
+    Shared Black-Scholes intermediates, broadcast over NumPy arrays.
+
+    Non-positive tau, sigma, S and K are replaced by 1.0 on each input's own
+    shape, so the (usually much larger) broadcast grid is only touched by the
+    formula itself. Callers use the returned mask to pick the deterministic
+    value at those points.
+
+    Returns:
+    - (live, S, tau, sqrt_tau, d1, d2) where live marks points with diffusion left
+      and S/tau are the substituted inputs.
+    """
+    masks = [x > 0 for x in (tau, sigma, S, K)]
+    if all(mask.all() for mask in masks):
+        live = np.True_
+    else:
+        live = masks[0] & masks[1] & masks[2] & masks[3]
+    S = np.where(S > 0, S, 1.0)
+    K = np.where(K > 0, K, 1.0)
+    tau = np.where(tau > 0, tau, 1.0)
+    sigma = np.where(sigma > 0, sigma, 1.0)
+
+    sqrt_tau = np.sqrt(tau)
+    vol = sigma * sqrt_tau
+    d1 = (np.log(S) - np.log(K) + (r + sigma**2 / 2) * tau) / vol
+    d2 = d1 - vol
+    return live, S, tau, sqrt_tau, d1, d2
+
+
+def black_scholes_value(S, K, tau, sigma, r, is_call):
+    """
+    Black-Scholes value of a European call or put, broadcast over NumPy arrays.
+
+    Points where tau <= 0, sigma <= 0, S <= 0 or K <= 0 have no diffusion left
+    and are valued deterministically as max(S - K*exp(-r*tau), 0) for calls and
+    max(K*exp(-r*tau) - S, 0) for puts, which reduces to the intrinsic value at
+    expiration. Puts are obtained from calls through put-call parity.
+
+    Parameters:
+    - S, K, tau, sigma, r: Scalars or arrays, broadcast against each other.
+    - is_call: Boolean (or boolean array) selecting calls over puts.
+
+    Returns:
+    - Array of option values with the broadcast shape of the inputs.
+    """
+    S, K, tau, sigma, r = (np.asarray(x, dtype=float) for x in (S, K, tau, sigma, r))
+    is_put = ~np.asarray(is_call, dtype=bool)
+
+    discounted_strike = K * np.exp(-r * np.maximum(tau, 0.0))
+    spot = np.maximum(S, 0.0)
+    live, S_live, _, _, d1, d2 = _d1_d2(S, K, tau, sigma, r)
+
+    call = S_live * ndtr(d1) - discounted_strike * ndtr(d2)
+    if not live.all():
+        call = np.where(live, call, np.maximum(spot - discounted_strike, 0.0))
+
+    # Put-call parity: P = C - S + K*exp(-r*tau)
+    return np.array(call + is_put * (discounted_strike - spot))
+
+
+def black_scholes_evaluate(S, K, tau, sigma, r, is_call):
+    """
+    Black-Scholes value together with Delta, Gamma, Theta, Vega and Rho,
+    broadcast over NumPy arrays.
+
+    d1, d2, sqrt(tau), exp(-r*tau), N(d1), N(d2) and the normal density at d1
+    are computed once and shared by the price and every greek, so pricing and
+    risk together cost little more than pricing alone.
+
+    Points without diffusion (tau <= 0, sigma <= 0, S <= 0 or K <= 0) use the
+    deterministic value from black_scholes_value and its derivatives: Delta is
+    +1/-1 when the option is in the money against the discounted strike and
+    Gamma and Vega are zero.
+
+    Parameters:
+    - S, K, tau, sigma, r: Scalars or arrays, broadcast against each other.
+    - is_call: Boolean (or boolean array) selecting calls over puts.
+
+    Returns:
+    - Dictionary containing Value, Delta, Gamma, Theta, Vega, and Rho arrays
+    """
+    S, K, tau, sigma, r = (np.asarray(x, dtype=float) for x in (S, K, tau, sigma, r))
+    is_put = ~np.asarray(is_call, dtype=bool)
+    shape = np.broadcast_shapes(S.shape, K.shape, tau.shape, sigma.shape, r.shape, is_put.shape)
+
+    tau_pos = np.maximum(tau, 0.0)
+    discounted_strike = K * np.exp(-r * tau_pos)
+    spot = np.maximum(S, 0.0)
+    live, S_live, tau_live, sqrt_tau, d1, d2 = _d1_d2(S, K, tau, sigma, r)
+    sigma_live = np.where(sigma > 0, sigma, 1.0)
+
+    cdf_d1 = ndtr(d1)
+    cdf_d2 = ndtr(d2)
+    pdf_d1 = np.exp(-d1**2 / 2) * _INV_SQRT_2PI
+    strike_cdf_d2 = discounted_strike * cdf_d2
+    spot_pdf_d1 = S_live * pdf_d1
+
+    value = S_live * cdf_d1 - strike_cdf_d2
+    delta = cdf_d1
+    gamma = pdf_d1 / (S_live * sigma_live * sqrt_tau)
+    theta = -(spot_pdf_d1 * sigma_live) / (2 * sqrt_tau) - r * strike_cdf_d2
+    vega = spot_pdf_d1 * sqrt_tau
+    rho = tau_live * strike_cdf_d2
+
+    if not live.all():
+        in_the_money = spot > discounted_strike
+        value = np.where(live, value, np.maximum(spot - discounted_strike, 0.0))
+        delta = np.where(live, delta, in_the_money)
+        gamma = np.where(live, gamma, 0.0)
+        theta = np.where(live, theta, -r * discounted_strike * (in_the_money & (tau > 0)))
+        vega = np.where(live, vega, 0.0)
+        rho = np.where(live, rho, tau_pos * discounted_strike * in_the_money)
+
+    # Put-call parity applied to P = C - S + K*exp(-r*tau) and each of its derivatives
+    results = {
+        'Value': value + is_put * (discounted_strike - spot),
+        'Delta': delta - is_put,
+        'Gamma': gamma,
+        'Theta': theta + is_put * r * discounted_strike * (tau > 0),
+        'Vega': vega,
+        'Rho': rho - is_put * tau_pos * discounted_strike
+    }
+    return {name: np.array(np.broadcast_to(result, shape), dtype=float) for name, result in results.items()}
+
 
 class Instrument:
-    def __init__(self, instrument_type, strike=None, position=1):
+    def __init__(self, instrument_type, strike=None, position=1, quantity=1, american=False):
         """
         Initialize an instrument.
 
@@ -10,19 +146,28 @@ class Instrument:
         - instrument_type: A string, 'call', 'put', or 'stock' (not case-sensitive).
         - strike: The strike price (required for calls and puts; can be None for stocks).
         - position: 1 for long (buy), -1 for short (sell)
+        - quantity: Number of units held (defaults to 1)
+        - american: If True, the option can be exercised early and is valued on a
+          binomial tree (see lattice.american_value) instead of with Black-Scholes.
         """
         self.instrument_type = instrument_type.lower()
         if self.instrument_type in ['call', 'put'] and strike is None:
             raise ValueError("Strike price is required for options")
         self.strike = float(strike) if strike is not None else None
         self.position = position  # 1 for long, -1 for short
+        self.quantity = float(quantity)
+        self.american = bool(american) and self.instrument_type != 'stock'
 
+    @instrument('pricing')
     def get_current_value(self, S, T, t, sigma, r):
         """
         Compute the current value of the instrument.
 
-        For calls and puts, this method uses the Black–Scholes equation.
-        For stocks, the current value is assumed to be the current underlying price.
+        For calls and puts, this method uses the Black–Scholes equation, or a
+        binomial tree for American options. For stocks, the current value is assumed to be the current underlying price.
+
+        All parameters may be scalars or NumPy arrays; they are broadcast against
+        each other so a whole grid of prices is valued in one call.
 
         Parameters:
         - S: Current price of the underlying asset.
@@ -32,14 +177,49 @@ class Instrument:
         - r: Risk-free interest rate.
 
         Returns:
-        - The current value (price) of the instrument.
+        - The current value (price) of the instrument, with the broadcast shape of the inputs.
         """
         value = self._compute_raw_value(S, T, t, sigma, r)
-        return value * self.position
+        return value * self.position * self.quantity
+
+    @instrument('pricing')
+    def evaluate(self, S, T, t, sigma, r):
+        """
+        Compute the price and all greeks of one unit of the instrument in a single pass.
+
+        The values are per unit, before position and quantity are applied, and
+        share the d1/d2 intermediates. All parameters may be scalars or NumPy arrays.
+
+        Parameters:
+        - S: Current price of the underlying asset
+        - T: Time to maturity (expiration time)
+        - t: Current time
+        - sigma: Volatility of the underlying asset
+        - r: Risk-free interest rate
+
+        Returns:
+        - Dictionary containing Value, Delta, Gamma, Theta, Vega, and Rho values.
+          For American options the value and the greeks come from binomial
+          trees (see lattice.american_evaluate).
+        """
+        if self.instrument_type == 'stock':
+            return {'Value': np.asarray(S, dtype=float)[()], 'Delta': 1, 'Gamma': 0, 'Theta': 0, 'Vega': 0, 'Rho': 0}
+        if self.instrument_type not in ['call', 'put']:
+            raise ValueError("Invalid instrument type")
+
+        tau = np.asarray(T, dtype=float) - np.asarray(t, dtype=float)
+        if self.american:
+            return american_evaluate(S, self.strike, tau, sigma, r, self.instrument_type == 'call')
+        results = black_scholes_evaluate(S, self.strike, tau, sigma, r, self.instrument_type == 'call')
+        return {key: value[()] for key, value in results.items()}
 
     def compute_greeks(self, S, T, t, sigma, r):
         """
         Compute basic greeks for a European call or put option.
+
+        The greeks are per unit of the option, before position and quantity are
+        applied. All parameters may be scalars or NumPy arrays. Use evaluate()
+        when the price is needed as well.
         
         Parameters:
         - S: Current price of the underlying asset
@@ -51,37 +231,9 @@ class Instrument:
         Returns:
         - Dictionary containing Delta, Gamma, Theta, Vega, and Rho values
         """
-        if self.instrument_type == 'stock':
-            return {'Delta': 1, 'Gamma': 0, 'Theta': 0, 'Vega': 0, 'Rho': 0}
-        
-        tau = T - t
-        d1 = (math.log(S / self.strike) + (r + sigma**2 / 2) * tau) / (sigma * math.sqrt(tau))
-        d2 = d1 - sigma * math.sqrt(tau)
-        
-        # Common calculations
-        gamma = norm.pdf(d1) / (S * sigma * math.sqrt(tau))
-        vega = S * math.sqrt(tau) * norm.pdf(d1)
-        
-        if self.instrument_type == 'call':
-            delta = norm.cdf(d1)
-            theta = (- (S * sigma * norm.pdf(d1)) / (2 * math.sqrt(tau))
-                    - r * self.strike * math.exp(-r * tau) * norm.cdf(d2))
-            rho = self.strike * tau * math.exp(-r * tau) * norm.cdf(d2)
-        elif self.instrument_type == 'put':
-            delta = norm.cdf(d1) - 1
-            theta = (- (S * sigma * norm.pdf(d1)) / (2 * math.sqrt(tau))
-                    + r * self.strike * math.exp(-r * tau) * norm.cdf(-d2))
-            rho = -self.strike * tau * math.exp(-r * tau) * norm.cdf(-d2)
-        else:
-            raise ValueError("Invalid instrument type")
-            
-        return {
-            'Delta': delta,
-            'Gamma': gamma,
-            'Theta': theta,
-            'Vega': vega,
-            'Rho': rho
-        }
+        results = self.evaluate(S, T, t, sigma, r)
+        del results['Value']
+        return results
 
     def get_payoff(self, S_T):
         """
@@ -91,56 +243,43 @@ class Instrument:
         For stocks, the payoff is simply the underlying's price at expiration.
 
         Parameters:
-        - S_T: The price of the underlying asset at expiration (time T).
+        - S_T: The price of the underlying asset at expiration (time T); a scalar or NumPy array.
 
         Returns:
-        - The payoff of the instrument.
+        - The payoff of the instrument, with the same shape as S_T.
         """
         payoff = self._compute_raw_payoff(S_T)
-        return payoff * self.position
+        return payoff * self.position * self.quantity
 
     def _compute_raw_value(self, S, T, t, sigma, r):
-        """Internal method to compute raw value before applying position direction."""
-        S = float(S)
-        
+        """
+        Internal method to compute raw value before applying position direction.
+
+        S, T, t, sigma and r may be scalars or NumPy arrays and are broadcast
+        against each other. Scalar inputs return a scalar.
+        """
+        S = np.asarray(S, dtype=float)
+
         if self.instrument_type == 'stock':
-            return S
-
-        tau = T - t
-        if tau <= 0:
-            if self.instrument_type == 'call':
-                value = max(S - self.strike, 0)
-            elif self.instrument_type == 'put':
-                value = max(self.strike - S, 0)
-            else:
-                raise ValueError("Invalid instrument type")
-        else:
-            try:
-                d1 = (math.log(S / self.strike) + (r + sigma**2 / 2) * tau) / (sigma * math.sqrt(tau))
-                d2 = d1 - sigma * math.sqrt(tau)
-                
-                if self.instrument_type == 'call':
-                    value = S * norm.cdf(d1) - self.strike * math.exp(-r * tau) * norm.cdf(d2)
-                elif self.instrument_type == 'put':
-                    value = self.strike * math.exp(-r * tau) * norm.cdf(-d2) - S * norm.cdf(-d1)
-                else:
-                    raise ValueError("Invalid instrument type")
-            except (ValueError, ZeroDivisionError) as e:
-                print(f"Error in Black-Scholes calculation: {e}")
-                value = 0
-        return value
+            return S[()]
+        if self.instrument_type not in ['call', 'put']:
+            raise ValueError("Invalid instrument type")
+
+        tau = np.asarray(T, dtype=float) - np.asarray(t, dtype=float)
+        if self.american:
+            return np.asarray(american_value(S, self.strike, tau, sigma, r, self.instrument_type == 'call'))[()]
+        value = black_scholes_value(S, self.strike, tau, sigma, r, self.instrument_type == 'call')
+        return value[()]
 
     def _compute_raw_payoff(self, S_T):
         """Internal method to compute raw payoff before applying position direction."""
-        S_T = float(S_T)
+        S_T = np.asarray(S_T, dtype=float)
         
         if self.instrument_type == 'stock':
-            return S_T
+            return S_T[()]
         elif self.instrument_type == 'call':
-            return max(S_T - self.strike, 0.0)
+            return np.maximum(S_T - self.strike, 0.0)[()]
         elif self.instrument_type == 'put':
-            return max(self.strike - S_T, 0.0)
+            return np.maximum(self.strike - S_T, 0.0)[()]
         else:
             raise ValueError("Invalid instrument type")
-
-
@@ -0,0 +1,241 @@
+import numpy as np
+
+# Tree depth used when American legs are priced as part of a Portfolio, where
+# one tree is built per (expiry, t, sigma, r) combination of the price grid.
+DEFAULT_STEPS = 200
+
+# Half-width of the band of tree levels rolled back, in standard deviations
+# of the log price at expiry
+WINDOW_STD_DEVS = 8.0
+
+# Volatility and rate bumps of the finite-difference Vega and Rho of
+# american_evaluate
+VOL_BUMP = 0.01
+RATE_BUMP = 0.0001
+
+
+def lattice_value(S, K, tau, sigma, r, is_call, american=True, steps=2000, method='binomial', greeks=False):
+    """
+    Price European or American calls and puts on a recombining tree.
+
+    The tree is built once for a unit spot and shared by every (S, K) pair in
+    the batch: option values are homogeneous in (S, K), so each pair is priced
+    as a strike K/S on the unit tree and scaled back by S. Backward induction
+    rolls a single (batch x nodes) array, so memory is O(batch x steps).
+
+    Points where tau <= 0, sigma <= 0 or S <= 0 have no diffusion left and are
+    valued deterministically as max(S - K*exp(-r*tau), 0) for calls and
+    max(K*exp(-r*tau) - S, 0) for puts, as in black_scholes_value (floored at
+    the intrinsic value for American options).
+
+    Parameters:
+    - S: Current price(s) of the underlying asset.
+    - K: Strike price(s), broadcast against S and is_call.
+    - tau: Time to expiry (T - t), one value for the whole batch.
+    - sigma: Volatility of the underlying asset, one value for the whole batch.
+    - r: Risk-free interest rate, one value for the whole batch.
+    - is_call: Boolean (or boolean array) selecting calls over puts.
+    - american: Allow early exercise at every node.
+    - steps: Number of time steps.
+    - method: 'binomial' (Cox-Ross-Rubinstein) or 'trinomial'.
+    - greeks: Also return Delta, Gamma and Theta, from finite differences
+      between the nodes of the first steps of the tree (two for binomial trees,
+      one for trinomial ones), which cost no extra tree.
+
+    Returns:
+    - Array of option values with the broadcast shape of S, K and is_call, or
+      with greeks a dictionary of Value, Delta, Gamma and Theta arrays.
+    """
+    S, K, is_call = np.broadcast_arrays(np.asarray(S, dtype=float), np.asarray(K, dtype=float),
+                                        np.asarray(is_call, dtype=bool))
+    shape = S.shape
+    S, K, is_call = S.ravel(), K.ravel(), is_call.ravel()
+    tau, sigma, r = float(tau), float(sigma), float(r)
+
+    sign = np.where(is_call, 1.0, -1.0)
+    if tau <= 0 or sigma <= 0:
+        if greeks:
+            return {name: result.reshape(shape)[()]
+                    for name, result in _deterministic_greeks(S, K, tau, r, sign, american).items()}
+        return _deterministic_value(S, K, tau, r, sign, american).reshape(shape)[()]
+
+    live = S > 0
+    sign = sign[:, None]
+    strike_ratio = (K / np.where(live, S, 1.0))[:, None]
+    dt = tau / steps
+    discount = np.exp(-r * dt)
+
+    if method == 'binomial':
+        # Cox-Ross-Rubinstein: node j of step i sits at u**(2j - i)
+        log_up = sigma * np.sqrt(dt)
+        p_up = (np.exp(r * dt) - np.exp(-log_up)) / (np.exp(log_up) - np.exp(-log_up))
+        weights = discount * np.array([1 - p_up, p_up])
+        stride = 2
+    elif method == 'trinomial':
+        # Node j of step i sits at exp((j - i) * dx)
+        log_up = sigma * np.sqrt(3 * dt)
+        drift = r - sigma**2 / 2
+        spread = (sigma**2 * dt + drift**2 * dt**2) / log_up**2
+        p_up = (spread + drift * dt / log_up) / 2
+        p_down = (spread - drift * dt / log_up) / 2
+        weights = discount * np.array([p_down, 1 - p_up - p_down, p_up])
+        stride = 1
+    else:
+        raise ValueError(f"Unknown lattice method: {method}")
+    if greeks and steps < stride:
+        raise ValueError(f"Tree greeks need at least {stride} steps")
+
+    # Unit-spot prices of every level the tree can reach. Only levels within
+    # WINDOW_STD_DEVS standard deviations of the spot are rolled back; the
+    # probability of reaching the rest is negligible, and skipping them cuts
+    # the work from O(steps^2) to O(steps^1.5) per option.
+    reach = min(steps, int(np.ceil(WINDOW_STD_DEVS * sigma * np.sqrt(tau) / log_up)) + 1)
+    levels = np.exp(log_up * np.arange(-steps, steps + 1))
+
+    def window(step):
+        """Node index range [lo, hi) of a step and the unit-spot prices of those nodes."""
+        if stride == 2:
+            lo, hi = max(0, (step - reach + 1) // 2), min(step, (step + reach) // 2) + 1
+        else:
+            lo, hi = max(0, step - reach), min(2 * step, step + reach) + 1
+        first_level = steps + stride * lo - step
+        return lo, hi, levels[first_level:first_level + stride * (hi - lo):stride]
+
+    lo, hi, prices = window(steps)
+    values = np.zeros((S.size, hi + len(weights)))
+    values[:, lo:hi] = np.maximum(sign * (prices - strike_ratio), 0.0)
+    greek_step = 2 if stride == 2 else 1
+    for step in range(steps - 1, -1, -1):
+        lo, hi, prices = window(step)
+        # Node j rolls back from its children j .. j + len(weights) - 1 of the next step
+        rolled = weights[0] * values[:, lo:hi]
+        for offset, weight in enumerate(weights[1:], start=1):
+            rolled += weight * values[:, lo + offset:hi + offset]
+        if american:
+            np.maximum(rolled, sign * (prices - strike_ratio), out=rolled)
+        values[:, lo:hi] = rolled
+        if greeks and step == greek_step:
+            # Nodes below, at and above the spot, on the unit tree
+            node_prices, node_values = prices[:3].copy(), rolled[:, :3].copy()
+
+    spot = np.where(live, S, 1.0)
+    values = values[:, 0] * spot
+    if not greeks:
+        if not live.all():
+            values = np.where(live, values, _deterministic_value(np.maximum(S, 0.0), K, tau, r, sign[:, 0], american))
+        return values.reshape(shape)[()]
+
+    # Option values are homogeneous of degree 1 in (S, K): Delta is unit-free
+    # on the unit tree and Gamma scales as 1/S
+    slope_down = (node_values[:, 1] - node_values[:, 0]) / (node_prices[1] - node_prices[0])
+    slope_up = (node_values[:, 2] - node_values[:, 1]) / (node_prices[2] - node_prices[1])
+    results = {
+        'Value': values,
+        'Delta': (node_values[:, 2] - node_values[:, 0]) / (node_prices[2] - node_prices[0]),
+        'Gamma': (slope_up - slope_down) / ((node_prices[2] - node_prices[0]) / 2) / spot,
+        # The middle node sits at the spot, greek_step steps later
+        'Theta': (node_values[:, 1] * spot - values) / (greek_step * dt)
+    }
+    if not live.all():
+        dead = _deterministic_greeks(np.maximum(S, 0.0), K, tau, r, sign[:, 0], american)
+        results = {name: np.where(live, result, dead[name]) for name, result in results.items()}
+    return {name: result.reshape(shape)[()] for name, result in results.items()}
+
+
+def _deterministic_value(S, K, tau, r, sign, american):
+    """Value of options without diffusion left; sign is +1 for calls and -1 for puts."""
+    values = np.maximum(sign * (S - K * np.exp(-r * max(tau, 0.0))), 0.0)
+    if american:
+        values = np.maximum(values, sign * (S - K))
+    return values + 0.0  # no negative zeros
+
+
+def _deterministic_greeks(S, K, tau, r, sign, american):
+    """Value, Delta, Gamma and Theta of options without diffusion left (see _deterministic_value)."""
+    values = _deterministic_value(S, K, tau, r, sign, american)
+    discounted = sign * (S - K * np.exp(-r * max(tau, 0.0)))
+    # Only the discounted-strike branch moves with time, when it is the one above the floors
+    holding = (discounted > 0) & (tau > 0) & ((not american) | (discounted > sign * (S - K)))
+    return {
+        'Value': values,
+        'Delta': sign * (values > 0),
+        'Gamma': np.zeros_like(values),
+        'Theta': np.where(holding, -sign * r * K * np.exp(-r * max(tau, 0.0)), 0.0)
+    }
+
+
+def american_value(S, K, tau, sigma, r, is_call, steps=DEFAULT_STEPS, method='binomial', greeks=False):
+    """
+    Price American calls and puts at arbitrary broadcast inputs.
+
+    Points are grouped by their (tau, sigma, r) combination and each group is
+    priced as one batch on its own tree (see lattice_value), so a whole price
+    grid for a set of legs sharing an expiry costs a single tree.
+
+    Parameters:
+    - S, K, tau, sigma, r: Scalars or arrays, broadcast against each other.
+    - is_call: Boolean (or boolean array) selecting calls over puts.
+    - steps: Number of time steps per tree.
+    - method: 'binomial' or 'trinomial'.
+    - greeks: Also return the tree Delta, Gamma and Theta (see lattice_value).
+
+    Returns:
+    - Array of option values with the broadcast shape of the inputs, or with
+      greeks a dictionary of Value, Delta, Gamma and Theta arrays.
+    """
+    arrays = np.broadcast_arrays(*[np.asarray(x, dtype=float) for x in (S, K, tau, sigma, r)],
+                                 np.asarray(is_call, dtype=bool))
+    shape = arrays[0].shape
+    S, K, tau, sigma, r, is_call = [a.ravel() for a in arrays]
+
+    combos, group = np.unique(np.stack([tau, sigma, r], axis=1), axis=0, return_inverse=True)
+    order = np.argsort(group.ravel(), kind='stable')
+    bounds = np.concatenate([[0], np.cumsum(np.bincount(group.ravel(), minlength=len(combos)))])
+
+    names = ['Value', 'Delta', 'Gamma', 'Theta'] if greeks else ['Value']
+    results = {name: np.empty(S.size) for name in names}
+    for (tau_i, sigma_i, r_i), start, stop in zip(combos, bounds[:-1], bounds[1:]):
+        idx = order[start:stop]
+        group_results = lattice_value(S[idx], K[idx], tau_i, sigma_i, r_i, is_call[idx],
+                                      american=True, steps=steps, method=method, greeks=greeks)
+        if not greeks:
+            group_results = {'Value': group_results}
+        for name in names:
+            results[name][idx] = group_results[name]
+    if not greeks:
+        return results['Value'].reshape(shape)[()]
+    return {name: result.reshape(shape)[()] for name, result in results.items()}
+
+
+def american_evaluate(S, K, tau, sigma, r, is_call, steps=DEFAULT_STEPS, method='binomial'):
+    """
+    Value of American calls and puts together with Delta, Gamma, Theta, Vega
+    and Rho, all taken from the trees rather than from Black-Scholes.
+
+    Delta, Gamma and Theta come from the first nodes of the pricing tree (see
+    lattice_value). Vega and Rho are central differences of the value over
+    trees with the volatility moved by VOL_BUMP and the rate by RATE_BUMP, so
+    they cost four more trees per (tau, sigma, r) combination.
+
+    Parameters:
+    - S, K, tau, sigma, r: Scalars or arrays, broadcast against each other.
+    - is_call: Boolean (or boolean array) selecting calls over puts.
+    - steps: Number of time steps per tree.
+    - method: 'binomial' or 'trinomial'.
+
+    Returns:
+    - Dictionary containing Value, Delta, Gamma, Theta, Vega, and Rho arrays
+      with the broadcast shape of the inputs.
+    """
+    results = american_value(S, K, tau, sigma, r, is_call, steps, method, greeks=True)
+    sigma = np.asarray(sigma, dtype=float)
+    r = np.asarray(r, dtype=float)
+    # One-sided where the volatility would drop to zero
+    sigma_down = np.maximum(sigma - VOL_BUMP, 0.0)
+    sigma_up = sigma_down + 2 * VOL_BUMP
+    results['Vega'] = (american_value(S, K, tau, sigma_up, r, is_call, steps, method)
+                       - american_value(S, K, tau, sigma_down, r, is_call, steps, method)) / (sigma_up - sigma_down)
+    results['Rho'] = (american_value(S, K, tau, sigma, r + RATE_BUMP, is_call, steps, method)
+                      - american_value(S, K, tau, sigma, r - RATE_BUMP, is_call, steps, method)) / (2 * RATE_BUMP)
+    shape = np.shape(results['Value'])
+    return {name: np.array(np.broadcast_to(result, shape), dtype=float)[()] for name, result in results.items()}
@@ -0,0 +1,376 @@
+import cProfile
+import glob
+import json
+import os
+import tempfile
+import threading
+import time
+from bisect import bisect_left
+from functools import wraps
+
+# Upper bounds of the latency histogram buckets, in seconds
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# Upper bounds of the payload size histogram buckets, in bytes
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304, 16777216)
+
+# Requests slower than this many milliseconds dump their cProfile stats (unset disables profiling)
+PROFILE_SLOW_MS = os.environ.get('OPTIONS_DASHBOARD_PROFILE_SLOW_MS')
+
+# Directory the cProfile dumps are written to
+PROFILE_DIR = os.environ.get(
+    'OPTIONS_DASHBOARD_PROFILE_DIR', os.path.join(tempfile.gettempdir(), 'options-dashboard-profiles')
+)
+
+# Directory every process publishes its metrics to, so that /metrics reports
+# the sum over all server workers and background jobs (unset: this process only)
+METRICS_DIR = os.environ.get('OPTIONS_DASHBOARD_METRICS_DIR')
+
+# Seconds between two snapshots of a process's metrics in METRICS_DIR
+PUBLISH_SECONDS = 1.0
+
+METRIC_PREFIX = 'options_dashboard_'
+
+# Type and help text of every metric family
+METRICS = {
+    'callback_seconds': ('histogram', 'Time spent in callback functions.'),
+    'callback_calls_total': ('counter', 'Callback function calls.'),
+    'callback_errors_total': ('counter', 'Callback function calls that raised an exception.'),
+    'pricing_seconds': ('histogram', 'Time spent in pricing functions.'),
+    'pricing_calls_total': ('counter', 'Pricing function calls.'),
+    'pricing_errors_total': ('counter', 'Pricing function calls that raised an exception.'),
+    'request_seconds': ('histogram', 'Wall time of Dash callback requests, from Flask receiving the request '
+                                     'to the serialized response.'),
+    'request_overhead_seconds': ('histogram', 'Part of the request time spent outside callback functions '
+                                              '(Flask, Dash dispatch and JSON serialization).'),
+    'request_bytes': ('histogram', 'Size of Dash callback request bodies.'),
+    'response_bytes': ('histogram', 'Size of Dash callback response bodies.'),
+    'responses_total': ('counter', 'Dash callback responses by status code.'),
+    'profiles_total': ('counter', 'cProfile dumps written for slow requests.')
+}
+
+
+class Histogram:
+    def __init__(self, buckets):
+        """
+        Cumulative histogram with fixed bucket upper bounds.
+
+        Parameters:
+        - buckets: Sorted upper bounds; an implicit +Inf bucket is added.
+        """
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+class MetricsRegistry:
+    def __init__(self, directory=None):
+        """
+        Initialize a thread-safe registry of labelled counters and histograms.
+
+        With a directory, the registry of every process writes a snapshot of
+        its metrics there (one JSON file per process id, from a background
+        thread every PUBLISH_SECONDS while they change) and render() adds up
+        the snapshots of all processes. A forked child starts from an empty
+        registry, so nothing is counted twice.
+
+        Parameters:
+        - directory: Directory shared by the processes, or None.
+        """
+        self.directory = directory
+        self._counters = {}
+        self._histograms = {}
+        self._lock = threading.Lock()
+        self._changed = False
+        self._publisher_pid = None
+        os.register_at_fork(after_in_child=self._reset_after_fork)
+
+    def _reset_after_fork(self):
+        self._lock = threading.Lock()
+        self._counters = {}
+        self._histograms = {}
+        self._changed = False
+
+    def _changed_metrics(self):
+        """
+        Flag new values, and start this process's publishing thread on the
+        first one; called with the lock held.
+        """
+        self._changed = True
+        if self.directory is not None and self._publisher_pid != os.getpid():
+            self._publisher_pid = os.getpid()
+            threading.Thread(target=self._publish_periodically, name='metrics-publisher', daemon=True).start()
+
+    def _publish_periodically(self):
+        while True:
+            time.sleep(PUBLISH_SECONDS)
+            if self._changed:
+                self.publish()
+
+    def increment(self, name, labels, amount=1):
+        """
+        Add to a counter.
+
+        Parameters:
+        - name: Metric family, a key of METRICS.
+        - labels: Tuple of (label, value) pairs.
+        - amount: Increment.
+        """
+        with self._lock:
+            self._counters[name, labels] = self._counters.get((name, labels), 0) + amount
+            self._changed_metrics()
+
+    def observe(self, name, labels, value, buckets=LATENCY_BUCKETS):
+        """
+        Record a value in a histogram.
+
+        Parameters:
+        - name: Metric family, a key of METRICS.
+        - labels: Tuple of (label, value) pairs.
+        - value: Observed value.
+        - buckets: Bucket upper bounds, used when the histogram is created.
+        """
+        with self._lock:
+            histogram = self._histograms.get((name, labels))
+            if histogram is None:
+                histogram = self._histograms[name, labels] = Histogram(buckets)
+            histogram.observe(value)
+            self._changed_metrics()
+
+    def clear(self):
+        """Remove all recorded values."""
+        with self._lock:
+            self._counters.clear()
+            self._histograms.clear()
+
+    def snapshot(self):
+        """
+        Current values, as JSON-compatible lists of [name, labels, value] for
+        counters and [name, labels, buckets, counts, sum, count] for histograms.
+        """
+        with self._lock:
+            self._changed = False
+            return {
+                'counters': [[name, labels, value] for (name, labels), value in self._counters.items()],
+                'histograms': [[name, labels, h.buckets, list(h.counts), h.sum, h.count]
+                               for (name, labels), h in self._histograms.items()]
+            }
+
+    def publish(self):
+        """Write this process's snapshot to the shared directory, if any."""
+        if self.directory is None:
+            return
+        path = os.path.join(self.directory, f'{os.getpid()}.json')
+        temporary = f'{path}.{threading.get_ident()}.tmp'
+        with open(temporary, 'w') as f:
+            json.dump(self.snapshot(), f)
+        os.replace(temporary, path)
+
+    def _collect(self):
+        """
+        Values of this process, plus the snapshots of the other processes
+        publishing to the shared directory.
+
+        Returns:
+        - ({(name, labels): value}, {(name, labels): (buckets, counts, sum, count)})
+        """
+        snapshots = [self.snapshot()]
+        if self.directory is not None:
+            own = os.path.join(self.directory, f'{os.getpid()}.json')
+            for path in glob.glob(os.path.join(self.directory, '*.json')):
+                if path == own:
+                    continue
+                try:
+                    with open(path) as f:
+                        snapshots.append(json.load(f))
+                except (OSError, ValueError):
+                    continue  # removed, or a process that died mid-write
+
+        counters, histograms = {}, {}
+        for snapshot in snapshots:
+            for name, labels, value in snapshot['counters']:
+                key = name, tuple(map(tuple, labels))
+                counters[key] = counters.get(key, 0) + value
+            for name, labels, buckets, counts, total, count in snapshot['histograms']:
+                key = name, tuple(map(tuple, labels))
+                if key in histograms:
+                    _, merged_counts, merged_total, merged_count = histograms[key]
+                    counts = [a + b for a, b in zip(merged_counts, counts)]
+                    total, count = total + merged_total, count + merged_count
+                histograms[key] = (tuple(buckets), counts, total, count)
+        return counters, histograms
+
+    def render(self):
+        """Return all metrics in the Prometheus text exposition format."""
+        counters, histograms = self._collect()
+        counters = sorted(counters.items())
+        snapshots = [(key, counts, total, count, buckets)
+                     for key, (buckets, counts, total, count) in sorted(histograms.items())]
+
+        lines = []
+        described = set()
+
+        def describe(name):
+            if name not in described:
+                metric_type, help_text = METRICS[name]
+                lines.append(f"# HELP {METRIC_PREFIX}{name} {help_text}")
+                lines.append(f"# TYPE {METRIC_PREFIX}{name} {metric_type}")
+                described.add(name)
+
+        for (name, labels), value in counters:
+            describe(name)
+            lines.append(f"{METRIC_PREFIX}{name}{_format_labels(labels)} {value}")
+        for (name, labels), counts, total, count, buckets in snapshots:
+            describe(name)
+            cumulative = 0
+            for bound, bucket_count in zip([*buckets, '+Inf'], counts):
+                cumulative += bucket_count
+                lines.append(f"{METRIC_PREFIX}{name}_bucket{_format_labels(labels + (('le', str(bound)),))} "
+                             f"{cumulative}")
+            lines.append(f"{METRIC_PREFIX}{name}_sum{_format_labels(labels)} {total:.9g}")
+            lines.append(f"{METRIC_PREFIX}{name}_count{_format_labels(labels)} {count}")
+        return '\n'.join(lines) + '\n'
+
+
+def _format_labels(labels):
+    if not labels:
+        return ''
+    escaped = (str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for _, value in labels)
+    return '{' + ','.join(f'{name}="{value}"' for (name, _), value in zip(labels, escaped)) + '}'
+
+
+def clear_directory(directory):
+    """
+    Create the shared metrics directory of a server, private to this user,
+    and remove the snapshots of an earlier run from it.
+
+    Returns:
+    - directory
+    """
+    os.makedirs(directory, mode=0o700, exist_ok=True)
+    for path in glob.glob(os.path.join(directory, '*.json')):
+        os.remove(path)
+    return directory
+
+
+# Metrics of this process (and, with METRICS_DIR, of its sibling processes)
+registry = MetricsRegistry(METRICS_DIR)
+
+
+def instrument(kind):
+    """
+    Decorator recording the latency, call count and error count of a function.
+
+    Callbacks that stop with dash.exceptions.PreventUpdate are not counted as
+    errors. Time spent in callbacks is also credited to the current Flask
+    request, so the request metrics can tell it apart from the overhead.
+
+    Parameters:
+    - kind: 'callback' or 'pricing'; selects the metric families.
+    """
+    def decorator(func):
+        labels = (('function', func.__qualname__.split('<locals>.')[-1]),)
+
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            except Exception as e:
+                # Matched by name, so pricing code does not have to import dash
+                if type(e).__name__ != 'PreventUpdate':
+                    registry.increment(f'{kind}_errors_total', labels)
+                raise
+            finally:
+                elapsed = time.perf_counter() - start
+                registry.observe(f'{kind}_seconds', labels, elapsed)
+                registry.increment(f'{kind}_calls_total', labels)
+                if kind == 'callback':
+                    _credit_request(elapsed)
+        return wrapper
+    return decorator
+
+
+def _credit_request(elapsed):
+    """Add callback time to the current Flask request, if any."""
+    try:
+        from flask import g, has_request_context
+    except ImportError:
+        return
+    if has_request_context() and 'metrics_start' in g:
+        g.metrics_callback_seconds += elapsed
+
+
+def install(app, profile_slow_ms=PROFILE_SLOW_MS, profile_dir=PROFILE_DIR):
+    """
+    Record request metrics for every Dash callback request and serve them on
+    a Prometheus /metrics route of the app's Flask server.
+
+    Parameters:
+    - app: Dash app.
+    - profile_slow_ms: When set, every callback request runs under cProfile
+      and requests slower than this many milliseconds dump their stats to
+      profile_dir (one .prof file per request, readable with pstats or
+      snakeviz).
+    - profile_dir: Directory of the cProfile dumps.
+    """
+    import flask
+
+    server = app.server
+    profile_seconds = float(profile_slow_ms) / 1000 if profile_slow_ms not in (None, '') else None
+    if profile_seconds is not None:
+        os.makedirs(profile_dir, exist_ok=True)
+
+    def callback_name(payload):
+        """Name of the callback function of a request, or its output when unknown."""
+        output = (payload or {}).get('output', 'unknown')
+        callback = app.callback_map.get(output, {}).get('callback')
+        return getattr(callback, '__name__', output)
+
+    @server.before_request
+    def start_request_metrics():
+        if flask.request.path.endswith('_dash-update-component'):
+            flask.g.metrics_start = time.perf_counter()
+            flask.g.metrics_callback_seconds = 0.0
+            if profile_seconds is not None:
+                profiler = cProfile.Profile()
+                try:
+                    profiler.enable()
+                except ValueError:
+                    # Another request of this process is being profiled (Python 3.12+
+                    # allows a single active profiler)
+                    return
+                flask.g.metrics_profiler = profiler
+
+    @server.after_request
+    def record_request_metrics(response):
+        if 'metrics_start' not in flask.g:
+            return response
+        elapsed = time.perf_counter() - flask.g.metrics_start
+        profiler = flask.g.pop('metrics_profiler', None)
+        if profiler is not None:
+            profiler.disable()
+
+        name = callback_name(flask.request.get_json(silent=True))
+        labels = (('callback', name),)
+        registry.observe('request_seconds', labels, elapsed)
+        registry.observe('request_overhead_seconds', labels, max(elapsed - flask.g.metrics_callback_seconds, 0.0))
+        registry.observe('request_bytes', labels, flask.request.content_length or 0, SIZE_BUCKETS)
+        if not response.is_streamed:
+            registry.observe('response_bytes', labels, response.calculate_content_length() or 0, SIZE_BUCKETS)
+        registry.increment('responses_total', labels + (('status', str(response.status_code)),))
+
+        if profiler is not None and elapsed >= profile_seconds:
+            profiler.dump_stats(os.path.join(profile_dir, f"{name}-{time.time_ns()}.prof"))
+            registry.increment('profiles_total', labels)
+        return response
+
+    @server.route('/metrics')
+    def serve_metrics():
+        return flask.Response(registry.render(), mimetype='text/plain; version=0.0.4')
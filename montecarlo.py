@@ -0,0 +1,214 @@
+import time
+
+import numpy as np
+
+from instruments import CALL, STOCK, black_scholes_value
+from parallel import imap
+
+# Paths simulated per chunk. Memory per chunk is a few arrays of
+# (number of expiries x DEFAULT_CHUNK_PATHS) floats, whatever the path count.
+DEFAULT_CHUNK_PATHS = 1 << 16
+
+
+class MonteCarloResult:
+    def __init__(self, value, std_error, n_paths, elapsed, beta=0.0):
+        """
+        Monte Carlo estimate of a portfolio value.
+
+        Parameters:
+        - value: Estimated value.
+        - std_error: Standard error of the estimate.
+        - n_paths: Number of simulated paths (antithetic pairs count twice).
+        - elapsed: Wall time of the simulation in seconds.
+        - beta: Control variate coefficient (0 without a control).
+        """
+        self.value = value
+        self.std_error = std_error
+        self.n_paths = n_paths
+        self.elapsed = elapsed
+        self.beta = beta
+
+    @property
+    def paths_per_second(self):
+        """Simulation throughput."""
+        return self.n_paths / self.elapsed if self.elapsed > 0 else np.inf
+
+    def confidence_interval(self, z=1.96):
+        """Return the (low, high) confidence interval, 95% by default."""
+        return self.value - z * self.std_error, self.value + z * self.std_error
+
+    def __repr__(self):
+        return (f"MonteCarloResult(value={self.value:.6f}, std_error={self.std_error:.2e}, "
+                f"n_paths={self.n_paths}, paths_per_second={self.paths_per_second:,.0f})")
+
+
+def _chunk_statistics(target, control):
+    """Return (n, mean_target, mean_control, M2_target, M2_control, M2_cross) of one chunk."""
+    target_dev = target - target.mean()
+    control_dev = control - control.mean()
+    return (target.size, target.mean(), control.mean(),
+            target_dev @ target_dev, control_dev @ control_dev, target_dev @ control_dev)
+
+
+def _combine_statistics(a, b):
+    """Merge two sets of chunk statistics (pairwise update of means and co-moments)."""
+    n_a, target_a, control_a, tt_a, cc_a, tc_a = a
+    n_b, target_b, control_b, tt_b, cc_b, tc_b = b
+    n = n_a + n_b
+    target_delta = target_b - target_a
+    control_delta = control_b - control_a
+    weight = n_a * n_b / n
+    return (n,
+            target_a + target_delta * n_b / n,
+            control_a + control_delta * n_b / n,
+            tt_a + tt_b + target_delta**2 * weight,
+            cc_a + cc_b + control_delta**2 * weight,
+            tc_a + tc_b + target_delta * control_delta * weight)
+
+
+def _simulate_chunk(seed, n_paths, antithetic, S, sigma, r, horizons, groups, payoff, payoff_horizon):
+    """
+    Simulate one chunk of GBM paths at every horizon and return its statistics.
+
+    Parameters:
+    - seed: np.random.SeedSequence of this chunk.
+    - n_paths: Number of paths in the chunk.
+    - antithetic: Pair every normal draw with its negation.
+    - S, sigma, r: Spot, volatility and risk-free rate.
+    - horizons: Sorted distinct times to expiry (T - t >= 0).
+    - groups: (horizon index, PayoffProfile) of the option legs expiring at each horizon.
+    - payoff: Optional vectorized payoff of the underlying at payoff_horizon.
+    - payoff_horizon: Horizon index used by payoff.
+    """
+    rng = np.random.default_rng(seed)
+    n_draws = n_paths // 2 if antithetic else n_paths
+    normals = rng.standard_normal((horizons.size, n_draws))
+    if antithetic:
+        normals = np.concatenate([normals, -normals], axis=1)
+
+    # Exact GBM increments between consecutive horizons
+    steps = np.diff(horizons, prepend=0.0)[:, None]
+    log_paths = np.cumsum((r - sigma**2 / 2) * steps + sigma * np.sqrt(steps) * normals, axis=0)
+    prices = S * np.exp(log_paths)
+    discounts = np.exp(-r * horizons)
+
+    options = np.zeros(prices.shape[1])
+    for horizon, profile in groups:
+        options += discounts[horizon] * profile.evaluate(prices[horizon])
+
+    if payoff is not None:
+        # Exotic payoff, with the Black-Scholes-priced option legs as the control
+        target = discounts[payoff_horizon] * np.asarray(payoff(prices[payoff_horizon]), dtype=float)
+        control = options
+    else:
+        # The option legs, with the discounted underlying (worth S) as the control
+        target = options
+        control = (discounts[:, None] * prices).mean(axis=0)
+
+    if antithetic:
+        # Antithetic pairs are the independent samples
+        target = (target[:n_draws] + target[n_draws:]) / 2
+        control = (control[:n_draws] + control[n_draws:]) / 2
+    return _chunk_statistics(target, control)
+
+
+def monte_carlo_value(portfolio, S, t, sigma, r, n_paths=1_000_000, payoff=None, T=None,
+                      antithetic=True, control_variate=True, seed=None, processes=1,
+                      chunk_paths=DEFAULT_CHUNK_PATHS):
+    """
+    Price a portfolio, or an arbitrary payoff, by Monte Carlo simulation of
+    geometric Brownian motion.
+
+    Paths are drawn directly at each distinct leg expiry, so legs with
+    different maturities share the same paths. Simulation runs in chunks of
+    chunk_paths paths that only keep running means and co-moments, so memory
+    stays bounded for 10^7+ paths. Every chunk gets its own child of one
+    np.random.SeedSequence, which makes the result depend on the seed and
+    chunk size only, not on the number of processes.
+
+    The control variate is a payoff whose exact value is known: when payoff
+    is given, the portfolio's option legs (valued with Black-Scholes);
+    otherwise the discounted underlying, whose value is S. The control
+    coefficient is estimated from the same paths.
+
+    Only payoffs at expiry are simulated, so the pricer is European-only: a
+    portfolio with American legs is rejected, except as the control of a
+    payoff, where its legs are held to expiry and valued as European options.
+
+    Parameters:
+    - portfolio: Portfolio of calls, puts and stock with expiries set. Stock
+      legs are valued exactly at S.
+    - S, t, sigma, r: Current underlying price, current time, volatility and rate.
+    - n_paths: Number of paths (rounded up to whole chunks and, with
+      antithetic variates, to an even count).
+    - payoff: Optional vectorized function of the underlying price at T,
+      priced instead of the portfolio. Must be picklable when processes > 1.
+    - T: Maturity of payoff (defaults to the latest leg expiry).
+    - antithetic: Use antithetic variates.
+    - control_variate: Use the control variate described above.
+    - seed: Seed for reproducible results.
+    - processes: Largest number of chunks simulated at once on the shared
+      process pool (parallel.POOL_PROCESSES workers); 1 runs in-process.
+    - chunk_paths: Paths per chunk.
+
+    Returns:
+    - MonteCarloResult
+    """
+    start = time.perf_counter()
+    is_option = portfolio.type_codes != STOCK
+    option_taus = np.maximum(portfolio.expiries[is_option] - t, 0.0)
+    if np.isnan(option_taus).any():
+        raise ValueError("Option legs need an expiry for Monte Carlo pricing")
+    if payoff is None and portfolio.american.any():
+        raise ValueError("Monte Carlo pricing is European-only; value American legs with the lattice pricer")
+
+    horizons = option_taus
+    if payoff is not None:
+        if T is None and is_option.any():
+            T = np.max(portfolio.expiries[is_option])
+        if T is None or np.isnan(T):
+            raise ValueError("A maturity T is required to price a payoff")
+        horizons = np.append(horizons, max(T - t, 0.0))
+    horizons, horizon_index = np.unique(horizons, return_inverse=True)
+    if horizons.size == 0:
+        horizons = np.zeros(1)
+
+    options = portfolio.subset(np.flatnonzero(is_option))
+    leg_horizons = horizon_index[:options.type_codes.size]
+    groups = [
+        (horizon, options.subset(np.flatnonzero(leg_horizons == horizon)).payoff_profile())
+        for horizon in np.unique(leg_horizons)
+    ]
+    payoff_horizon = horizon_index[-1] if payoff is not None else None
+
+    chunk_paths = max(2, int(chunk_paths) // 2 * 2) if antithetic else max(1, int(chunk_paths))
+    n_chunks = max(1, -(-int(n_paths) // chunk_paths))
+    seeds = np.random.SeedSequence(seed).spawn(n_chunks)
+    args = (chunk_paths, antithetic, S, sigma, r, horizons, groups, payoff, payoff_horizon)
+
+    if processes <= 1 or n_chunks == 1:
+        chunks = (_simulate_chunk(chunk_seed, *args) for chunk_seed in seeds)
+    else:
+        chunks = imap(_simulate_chunk, ((chunk_seed, *args) for chunk_seed in seeds), processes)
+
+    statistics = None
+    for chunk in chunks:
+        statistics = chunk if statistics is None else _combine_statistics(statistics, chunk)
+    n, target_mean, control_mean, target_m2, control_m2, cross_m2 = statistics
+
+    if payoff is not None:
+        # The simulated control holds every leg to expiry, American ones included
+        control_value = float(np.dot(options.weights, black_scholes_value(
+            S, options.strikes, np.maximum(options.expiries - t, 0.0), sigma, r, options.type_codes == CALL
+        )))
+        stock_value = 0.0
+    else:
+        control_value = S
+        stock_value = float(portfolio.weights[~is_option].sum() * S)
+
+    beta = cross_m2 / control_m2 if control_variate and control_m2 > 0 else 0.0
+    value = target_mean - beta * (control_mean - control_value) + stock_value
+    variance = max(target_m2 - beta * cross_m2, 0.0) / max(n - 1, 1)
+
+    return MonteCarloResult(value, np.sqrt(variance / n), n_chunks * chunk_paths,
+                            time.perf_counter() - start, beta)
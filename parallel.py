@@ -0,0 +1,66 @@
+import atexit
+import os
+import threading
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+# Worker processes of the pool shared by every caller in this process
+POOL_PROCESSES = int(os.environ.get('OPTIONS_DASHBOARD_POOL_PROCESSES', 0)) or os.cpu_count() or 1
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def get_executor():
+    """
+    Return the process pool of this process, created on first use with
+    POOL_PROCESSES workers.
+
+    The pool is never resized or shut down while the process runs, so
+    concurrent callers (e.g. Dash request threads) can always submit to it;
+    use imap to limit how many workers one call occupies.
+    """
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ProcessPoolExecutor(max_workers=POOL_PROCESSES)
+        return _executor
+
+
+def imap(func, arg_tuples, processes, executor=None):
+    """
+    Call func(*args) for every tuple of arg_tuples on the shared pool, with at
+    most processes calls of this iteration in flight.
+
+    arg_tuples is consumed lazily, so a long stream of tasks never queues up
+    in memory.
+
+    Parameters:
+    - func: Picklable function.
+    - arg_tuples: Iterable of argument tuples.
+    - processes: Largest number of concurrent calls.
+    - executor: Pool to run on instead of the shared one, e.g. one owned by a
+      command-line run.
+
+    Returns:
+    - Iterator of the results, in the order of arg_tuples.
+    """
+    executor = executor or get_executor()
+    in_flight = deque()
+    try:
+        for args in arg_tuples:
+            in_flight.append(executor.submit(func, *args))
+            if len(in_flight) >= max(int(processes), 1):
+                yield in_flight.popleft().result()
+        while in_flight:
+            yield in_flight.popleft().result()
+    finally:
+        # Abandoned or failed iterations do not leave work queued on the pool
+        for future in in_flight:
+            future.cancel()
+
+
+@atexit.register
+def _shutdown_executor():
+    if _executor is not None:
+        _executor.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,114 @@
+import numpy as np
+
+from instruments import STOCK, PUT
+
+
+class PayoffProfile:
+    def __init__(self, breakpoints, slopes, values, cost=0.0):
+        """
+        Exact piecewise-linear payoff at expiration of a book of calls, puts and stock.
+
+        Use PayoffProfile.from_portfolio() rather than calling this directly.
+
+        Parameters:
+        - breakpoints: Sorted distinct strikes where the slope changes.
+        - slopes: Slope of each segment; slopes[0] applies on [0, breakpoints[0]]
+          and slopes[-1] beyond the last breakpoint (len(breakpoints) + 1 entries).
+        - values: Net payoff at S = 0 followed by the net payoff at each breakpoint.
+        - cost: Amount subtracted from the payoff (e.g. the premium paid), already
+          included in values.
+        """
+        self.breakpoints = np.asarray(breakpoints, dtype=float)
+        self.slopes = np.asarray(slopes, dtype=float)
+        self.values = np.asarray(values, dtype=float)
+        self.cost = float(cost)
+
+        # Segment j covers [lefts[j], lefts[j + 1]] with value intercepts[j] + slopes[j] * S
+        self.lefts = np.concatenate([[0.0], self.breakpoints])
+        self.intercepts = self.values - self.slopes * self.lefts
+
+    @classmethod
+    def from_portfolio(cls, portfolio, cost=0.0):
+        """
+        Derive the segments of a portfolio's payoff from its legs in O(n log n).
+
+        Every call and put adds a kink of +quantity*position at its strike; puts
+        and stock also set the slope and value at S = 0.
+
+        Parameters:
+        - portfolio: Portfolio of calls, puts and stock.
+        - cost: Amount subtracted from the payoff, e.g. the current cost of the
+          strategy so that the profile describes profit and loss.
+        """
+        weights = portfolio.weights
+        codes = portfolio.type_codes
+        is_option = codes != STOCK
+        is_put = codes == PUT
+
+        slope_at_zero = weights[codes == STOCK].sum() - weights[is_put].sum()
+        value_at_zero = (weights[is_put] * portfolio.strikes[is_put]).sum() - cost
+
+        breakpoints, inverse = np.unique(portfolio.strikes[is_option], return_inverse=True)
+        kinks = np.bincount(inverse, weights=weights[is_option], minlength=breakpoints.size)
+        slopes = slope_at_zero + np.concatenate([[0.0], np.cumsum(kinks)])
+
+        widths = np.diff(np.concatenate([[0.0], breakpoints]))
+        values = value_at_zero + np.concatenate([[0.0], np.cumsum(slopes[:-1] * widths)])
+        return cls(breakpoints, slopes, values, cost)
+
+    def evaluate(self, S_T):
+        """
+        Evaluate the net payoff exactly at any price(s) S_T >= 0.
+
+        Returns:
+        - Array with the shape of S_T.
+        """
+        S_T = np.asarray(S_T, dtype=float)
+        segment = np.searchsorted(self.breakpoints, S_T, side='right')
+        return (self.intercepts[segment] + self.slopes[segment] * S_T)[()]
+
+    def vertices(self, S_min, S_max):
+        """
+        Return the few points needed to draw the payoff exactly over [S_min, S_max]:
+        the two ends plus every breakpoint in between.
+
+        Returns:
+        - (x, y) arrays.
+        """
+        inside = self.breakpoints[(self.breakpoints > S_min) & (self.breakpoints < S_max)]
+        x = np.concatenate([[S_min], inside, [S_max]])
+        return x, self.evaluate(x)
+
+    @property
+    def max_profit(self):
+        """Largest net payoff over S >= 0 (inf when the right tail slopes upwards)."""
+        if self.slopes[-1] > 0:
+            return np.inf
+        return float(self.values.max())
+
+    @property
+    def max_loss(self):
+        """Smallest net payoff over S >= 0 (-inf when the right tail slopes downwards)."""
+        if self.slopes[-1] < 0:
+            return -np.inf
+        return float(self.values.min())
+
+    @property
+    def break_evens(self):
+        """Sorted prices S >= 0 where the net payoff crosses or touches zero."""
+        rights = np.concatenate([self.breakpoints, [np.inf]])
+        starts = self.values
+        with np.errstate(divide='ignore', invalid='ignore'):
+            roots = self.lefts - starts / self.slopes
+        crossing = (self.slopes != 0) & (roots >= self.lefts) & (roots <= rights)
+        flat_zero = (self.slopes == 0) & (starts == 0)
+        candidates = np.concatenate([roots[crossing], self.lefts[flat_zero]])
+        return np.unique(np.round(candidates, 10))
+
+    def summary(self):
+        """Return max profit, max loss and break-even prices as a dictionary."""
+        return {
+            'max_profit': self.max_profit,
+            'max_loss': self.max_loss,
+            'break_evens': self.break_evens.tolist()
+        }
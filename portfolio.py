@@ -0,0 +1,307 @@
+import numpy as np
+
+from instruments import (
+    STOCK, CALL, INSTRUMENT_TYPE_CODES,
+    black_scholes_value, black_scholes_evaluate
+)
+from lattice import DEFAULT_STEPS, american_evaluate, american_value
+from metrics import instrument
+from payoff import PayoffProfile
+
+# Upper bound on legs x points evaluated per block. Large books over fine grids
+# are processed in column blocks so the kernel temporaries stay a few MB each.
+MAX_BLOCK_ELEMENTS = 1 << 16
+
+GREEK_NAMES = ['Delta', 'Gamma', 'Theta', 'Vega', 'Rho']
+
+
+class Portfolio:
+    def __init__(self, types, strikes, positions, quantities=None, expiries=None, american=None):
+        """
+        Initialize a portfolio stored as contiguous NumPy arrays, one entry per leg.
+
+        Parameters:
+        - types: Instrument type per leg, as strings ('call', 'put', 'stock') or integer codes.
+        - strikes: Strike price per leg (None or NaN is allowed for stocks).
+        - positions: 1 for long (buy), -1 for short (sell), per leg.
+        - quantities: Number of units per leg (defaults to 1).
+        - expiries: Time to maturity T per leg (defaults to NaN, which only
+          supports payoff evaluation).
+        - american: True per leg for options that can be exercised early
+          (defaults to False, i.e. European).
+        """
+        types = np.asarray(types)
+        if types.dtype.kind in 'iu':
+            self.type_codes = np.ascontiguousarray(types, dtype=np.int8)
+        else:
+            self.type_codes = np.array(
+                [INSTRUMENT_TYPE_CODES[str(kind).lower()] for kind in types], dtype=np.int8
+            )
+        n_legs = self.type_codes.size
+
+        strikes = np.array(
+            [np.nan if strike is None else strike for strike in np.ravel(strikes)], dtype=float
+        ).reshape(n_legs)
+        is_stock = self.type_codes == STOCK
+        if np.isnan(strikes[~is_stock]).any():
+            raise ValueError("Strike price is required for options")
+        self.strikes = np.where(is_stock, 0.0, strikes)
+
+        self.positions = np.ascontiguousarray(np.broadcast_to(np.asarray(positions, dtype=float), n_legs))
+        if quantities is None:
+            quantities = 1.0
+        self.quantities = np.ascontiguousarray(np.broadcast_to(np.asarray(quantities, dtype=float), n_legs))
+        if expiries is None:
+            expiries = np.nan
+        self.expiries = np.ascontiguousarray(np.broadcast_to(np.asarray(expiries, dtype=float), n_legs))
+        if american is None:
+            american = False
+        self.american = np.broadcast_to(np.asarray(american, dtype=bool), n_legs) & ~is_stock
+
+    @classmethod
+    def from_instruments(cls, instruments, T=np.nan):
+        """
+        Build a portfolio from a list of Instrument objects sharing one maturity.
+
+        Parameters:
+        - instruments: List of Instrument objects.
+        - T: Time to maturity (expiration time) applied to every leg.
+        """
+        return cls(
+            [instrument.instrument_type for instrument in instruments],
+            [instrument.strike for instrument in instruments],
+            [instrument.position for instrument in instruments],
+            [getattr(instrument, 'quantity', 1) for instrument in instruments],
+            T,
+            [getattr(instrument, 'american', False) for instrument in instruments]
+        )
+
+    @classmethod
+    def from_records(cls, records):
+        """
+        Build a portfolio from a list of leg dictionaries, as produced by to_records().
+
+        Each record has the keys 'type', 'strike', 'position', and optionally
+        'quantity' (default 1), 'expiry' (default NaN) and 'american' (default False).
+        """
+        return cls(
+            [record['type'] for record in records],
+            [record.get('strike') for record in records],
+            [record['position'] for record in records],
+            [record.get('quantity', 1) for record in records],
+            [record.get('expiry', np.nan) for record in records],
+            [record.get('american', False) for record in records]
+        )
+
+    def to_records(self):
+        """Return the legs as a list of JSON-serializable dictionaries."""
+        names = {code: name for name, code in INSTRUMENT_TYPE_CODES.items()}
+        return [
+            {
+                'type': names[int(code)],
+                'strike': None if code == STOCK else float(strike),
+                'position': float(position),
+                'quantity': float(quantity),
+                'expiry': float(expiry),
+                'american': bool(american)
+            }
+            for code, strike, position, quantity, expiry, american in zip(
+                self.type_codes, self.strikes, self.positions, self.quantities, self.expiries, self.american
+            )
+        ]
+
+    def subset(self, indices):
+        """Return a new Portfolio holding only the legs at the given indices."""
+        indices = np.asarray(indices, dtype=int)
+        return Portfolio(
+            self.type_codes[indices], self.strikes[indices], self.positions[indices],
+            self.quantities[indices], self.expiries[indices], self.american[indices]
+        )
+
+    def __len__(self):
+        return self.type_codes.size
+
+    @property
+    def weights(self):
+        """Signed number of units per leg (position times quantity)."""
+        return self.positions * self.quantities
+
+    def leg_label(self, idx):
+        """Short description of a leg for plot legends, e.g. 'Call, K=100.0'."""
+        names = {code: name for name, code in INSTRUMENT_TYPE_CODES.items()}
+        kind = names[int(self.type_codes[idx])]
+        if self.type_codes[idx] == STOCK:
+            return kind.capitalize()
+        return f'{kind.capitalize()}, K={self.strikes[idx]}'
+
+    def payoff(self, S_T, per_leg=False):
+        """
+        Compute the payoff of the portfolio at expiration.
+
+        Parameters:
+        - S_T: Price(s) of the underlying at expiration; a scalar or NumPy array.
+        - per_leg: If True, return one row per leg instead of the total.
+
+        Returns:
+        - Array with the shape of S_T, or (n_legs,) + S_T.shape when per_leg is True.
+        """
+        return self._evaluate(self._payoff_block, per_leg, S_T)['Payoff']
+
+    def payoff_profile(self, cost=0.0):
+        """
+        Return the exact piecewise-linear payoff of the portfolio (see payoff.PayoffProfile),
+        with its breakpoints, max profit, max loss and break-even prices.
+
+        Parameters:
+        - cost: Amount subtracted from the payoff, e.g. the current cost of the portfolio.
+        """
+        return PayoffProfile.from_portfolio(self, cost)
+
+    @instrument('pricing')
+    def value(self, S, t, sigma, r, per_leg=False, steps=DEFAULT_STEPS):
+        """
+        Compute the current value of the portfolio with Black-Scholes for European
+        options, binomial trees for American options (see lattice.american_value)
+        and the underlying price for stocks.
+
+        S, t, sigma and r may be scalars or NumPy arrays and are broadcast against
+        each other; every leg is evaluated at every resulting point.
+
+        Parameters:
+        - S: Current price of the underlying asset.
+        - t: Current time.
+        - sigma: Volatility of the underlying asset.
+        - r: Risk-free interest rate.
+        - per_leg: If True, return one row per leg instead of the total.
+        - steps: Number of time steps of the trees of American legs.
+
+        Returns:
+        - Array with the broadcast shape of the inputs, or (n_legs,) + that shape
+          when per_leg is True.
+        """
+        if not self.american.any():
+            return self._evaluate(self._value_block, per_leg, S, t, sigma, r)['Value']
+        if per_leg:
+            values = self._evaluate(self._value_block, True, S, t, sigma, r)['Value']
+            weights = self.weights[self.american].reshape((-1,) + (1,) * (values.ndim - 1))
+            values[self.american] = weights * self._american_values(S, t, sigma, r, steps=steps)
+            return values
+        american = self._american_values(S, t, sigma, r, steps=steps)
+        european = self.subset(np.flatnonzero(~self.american))
+        return (european._evaluate(european._value_block, False, S, t, sigma, r)['Value']
+                + np.tensordot(self.weights[self.american], american, axes=1))[()]
+
+    @instrument('pricing')
+    def evaluate(self, S, t, sigma, r, per_leg=False, steps=DEFAULT_STEPS):
+        """
+        Compute the value and the position-weighted Delta, Gamma, Theta, Vega and
+        Rho of the portfolio in one fused pass over the legs.
+
+        Parameters are the same as for value(). American legs are valued on
+        binomial trees, which also give their greeks (see lattice.american_evaluate).
+
+        Returns:
+        - Dictionary of arrays keyed by 'Value' and greek name.
+        """
+        if not self.american.any():
+            return self._evaluate(self._evaluate_block, per_leg, S, t, sigma, r)
+        american = self._american_values(S, t, sigma, r, greeks=True, steps=steps)
+        weights = self.weights[self.american]
+        if per_leg:
+            results = self._evaluate(self._evaluate_block, True, S, t, sigma, r)
+            weights = weights.reshape((-1,) + (1,) * (results['Value'].ndim - 1))
+            for name, values in results.items():
+                values[self.american] = weights * american[name]
+            return results
+        european = self.subset(np.flatnonzero(~self.american))
+        european = european._evaluate(european._evaluate_block, False, S, t, sigma, r)
+        return {name: (values + np.tensordot(weights, american[name], axes=1))[()]
+                for name, values in european.items()}
+
+    def greeks(self, S, t, sigma, r, per_leg=False, steps=DEFAULT_STEPS):
+        """
+        Compute the position-weighted Delta, Gamma, Theta, Vega and Rho of the portfolio.
+
+        Parameters are the same as for value().
+
+        Returns:
+        - Dictionary of arrays keyed by greek name.
+        """
+        results = self.evaluate(S, t, sigma, r, per_leg, steps)
+        del results['Value']
+        return results
+
+    def _american_values(self, S, t, sigma, r, greeks=False, steps=DEFAULT_STEPS):
+        """
+        Per-unit values of the American legs, with shape (n_american,) + the
+        broadcast point shape; with greeks, a dictionary of such arrays keyed by
+        'Value' and greek name.
+        """
+        points = np.broadcast_arrays(*[np.asarray(arg, dtype=float) for arg in (S, t, sigma, r)])
+        S, t, sigma, r = (point[None, ...] for point in points)
+        column = (-1,) + (1,) * points[0].ndim
+        strikes = self.strikes[self.american].reshape(column)
+        expiries = self.expiries[self.american].reshape(column)
+        is_call = (self.type_codes[self.american] == CALL).reshape(column)
+        if greeks:
+            return american_evaluate(S, strikes, expiries - t, sigma, r, is_call, steps)
+        return american_value(S, strikes, expiries - t, sigma, r, is_call, steps)
+
+    def _payoff_block(self, legs, S_T):
+        codes, strikes, _ = legs
+        intrinsic = np.maximum(np.where(codes == CALL, S_T - strikes, strikes - S_T), 0.0)
+        return {'Payoff': np.where(codes == STOCK, S_T, intrinsic)}
+
+    def _value_block(self, legs, S, t, sigma, r):
+        codes, strikes, expiries = legs
+        option = black_scholes_value(S, strikes, expiries - t, sigma, r, codes == CALL)
+        return {'Value': np.where(codes == STOCK, S, option)}
+
+    def _evaluate_block(self, legs, S, t, sigma, r):
+        codes, strikes, expiries = legs
+        results = black_scholes_evaluate(S, strikes, expiries - t, sigma, r, codes == CALL)
+        is_stock = codes == STOCK
+        results['Value'] = np.where(is_stock, S, results['Value'])
+        results['Delta'] = np.where(is_stock, 1.0, results['Delta'])
+        for name in GREEK_NAMES[1:]:
+            results[name] = np.where(is_stock, 0.0, results[name])
+        return results
+
+    def _evaluate(self, block_fn, per_leg, *point_args):
+        """
+        Evaluate block_fn over the (n_legs x n_points) grid in column blocks.
+
+        Leg arrays are passed as columns and point arrays as rows, so each block
+        is a single broadcast over all legs. Totals are reduced with a weighted
+        sum over the leg axis.
+        """
+        points = np.broadcast_arrays(*[np.asarray(arg, dtype=float) for arg in point_args])
+        shape = points[0].shape
+        points = [point.ravel() for point in points]
+        n_points = points[0].size
+        n_legs = len(self)
+
+        weights = self.weights
+        legs = (self.type_codes[:, None], self.strikes[:, None], self.expiries[:, None])
+        block_size = max(1, MAX_BLOCK_ELEMENTS // max(n_legs, 1))
+
+        results = {}
+        for start in range(0, n_points, block_size):
+            stop = min(start + block_size, n_points)
+            block = block_fn(legs, *[point[None, start:stop] for point in points])
+            for name, raw in block.items():
+                if name not in results:
+                    results[name] = np.zeros((n_legs, n_points) if per_leg else n_points)
+                if per_leg:
+                    results[name][:, start:stop] = weights[:, None] * raw
+                else:
+                    results[name][start:stop] = weights @ np.broadcast_to(raw, (n_legs, stop - start))
+
+        if not results:
+            # No points to evaluate: still return correctly shaped (empty) arrays
+            names = block_fn(legs, *[point[None, :0] for point in points]).keys()
+            results = {name: np.zeros((n_legs, 0) if per_leg else 0) for name in names}
+
+        if per_leg:
+            return {name: value.reshape((n_legs,) + shape) for name, value in results.items()}
+        return {name: value.reshape(shape)[()] for name, value in results.items()}
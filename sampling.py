@@ -0,0 +1,62 @@
+import numpy as np
+
+
+def adaptive_sample(func, x_min, x_max, tolerance, seeds=(), initial_points=17,
+                    max_evaluations=2000, min_width=None):
+    """
+    Sample a smooth curve on a non-uniform grid until linear interpolation
+    between neighbouring samples is within tolerance.
+
+    Each round evaluates the midpoints of all intervals still being refined in a
+    single batched call to func, compares them with the straight line through the
+    interval ends, and keeps splitting only the intervals whose error exceeds the
+    tolerance. Seeds (e.g. strikes) are always included as samples, so kinks and
+    the high-curvature region around them are resolved first.
+
+    Parameters:
+    - func: Vectorized function mapping an array of x to an array of y.
+    - x_min: Left end of the range.
+    - x_max: Right end of the range.
+    - tolerance: Maximum allowed absolute interpolation error (in units of y).
+    - seeds: Points that must be part of the grid; those outside the range are ignored.
+    - initial_points: Number of uniform points in the starting grid.
+    - max_evaluations: Budget of function evaluations; refinement stops once reached.
+    - min_width: Intervals narrower than this are not split further
+      (defaults to 1e-6 of the range).
+
+    Returns:
+    - (x, y, n_evaluations) with x sorted ascending.
+    """
+    x_min, x_max = float(x_min), float(x_max)
+    if min_width is None:
+        min_width = 1e-6 * (x_max - x_min)
+
+    seeds = np.asarray(seeds, dtype=float).ravel()
+    seeds = seeds[(seeds > x_min) & (seeds < x_max)]
+    x = np.unique(np.concatenate([np.linspace(x_min, x_max, initial_points), seeds]))
+    y = np.asarray(func(x), dtype=float)
+    n_evaluations = x.size
+
+    # Intervals (by left index) that still need checking
+    active = np.ones(x.size - 1, dtype=bool)
+    while active.any() and n_evaluations < max_evaluations:
+        left = np.flatnonzero(active & (np.diff(x) > min_width))
+        if left.size == 0:
+            break
+        left = left[:max_evaluations - n_evaluations]
+
+        x_mid = (x[left] + x[left + 1]) / 2
+        y_mid = np.asarray(func(x_mid), dtype=float)
+        n_evaluations += x_mid.size
+        error = np.abs(y_mid - (y[left] + y[left + 1]) / 2)
+        split = error > tolerance
+
+        # Insert the midpoints; both halves of an interval that failed stay active
+        x = np.insert(x, left + 1, x_mid)
+        y = np.insert(y, left + 1, y_mid)
+        new_index = left + 1 + np.arange(left.size)
+        active = np.zeros(x.size - 1, dtype=bool)
+        active[new_index - 1] = split
+        active[new_index] = split
+
+    return x, y, n_evaluations
@@ -0,0 +1,131 @@
+
+import numpy as np
+
+from parallel import POOL_PROCESSES, imap
+
+# Scenario chunks smaller than this many leg-evaluations run in the calling
+# process, where the pool's pickling overhead would outweigh the gain.
+MIN_PARALLEL_EVALUATIONS = 2_000_000
+
+# Number of in-process chunks when progress is reported
+PROGRESS_CHUNKS = 10
+
+
+def _value_chunk(portfolio, S_grid, sigma_grid, t_values, r_values):
+    """
+    Value a portfolio over one chunk of (rate, time) scenarios and the full
+    (vol x spot) grid in one vectorized call.
+
+    Returns:
+    - Array of shape (len(r_values), len(t_values), len(sigma_grid), len(S_grid)).
+    """
+    return portfolio.value(
+        S_grid[None, None, None, :],
+        t_values[None, :, None, None],
+        sigma_grid[None, None, :, None],
+        r_values[:, None, None, None]
+    )
+
+
+class ScenarioCube:
+    def __init__(self, spot_shocks, vol_shocks, time_shocks, rate_shocks, pnl, base_value):
+        """
+        P&L of a portfolio over a grid of market shocks.
+
+        Parameters:
+        - spot_shocks: Relative spot moves (0.1 = +10%).
+        - vol_shocks: Absolute volatility moves (0.05 = +5 vol points).
+        - time_shocks: Time elapsed, in years.
+        - rate_shocks: Absolute rate moves.
+        - pnl: Array of shape (n_rate, n_time, n_vol, n_spot).
+        - base_value: Portfolio value without shocks.
+        """
+        self.spot_shocks = spot_shocks
+        self.vol_shocks = vol_shocks
+        self.time_shocks = time_shocks
+        self.rate_shocks = rate_shocks
+        self.pnl = pnl
+        self.base_value = base_value
+
+    def save(self, path):
+        """Write the cube to an uncompressed .npz file."""
+        np.savez(path, spot_shocks=self.spot_shocks, vol_shocks=self.vol_shocks, time_shocks=self.time_shocks,
+                 rate_shocks=self.rate_shocks, pnl=self.pnl, base_value=self.base_value)
+
+    @classmethod
+    def load(cls, path):
+        """Read a cube written by save()."""
+        with np.load(path) as data:
+            return cls(data['spot_shocks'], data['vol_shocks'], data['time_shocks'], data['rate_shocks'],
+                       data['pnl'], float(data['base_value']))
+
+    def worst(self):
+        """Return (pnl, spot_shock, vol_shock, time_shock, rate_shock) of the worst scenario."""
+        idx = np.unravel_index(np.argmin(self.pnl), self.pnl.shape)
+        return (float(self.pnl[idx]), self.spot_shocks[idx[3]], self.vol_shocks[idx[2]],
+                self.time_shocks[idx[1]], self.rate_shocks[idx[0]])
+
+
+def pnl_cube(portfolio, S, t, sigma, r, spot_shocks, vol_shocks, time_shocks, rate_shocks=(0.0,),
+             processes=None, progress=None):
+    """
+    Compute the P&L of a portfolio for every combination of spot, volatility,
+    time and rate shocks.
+
+    Scenarios are split into chunks along the (rate, time) axes and spread over
+    a process pool; each chunk values every leg over its whole (vol x spot)
+    block with one broadcast. Small cubes are computed in-process.
+
+    Parameters:
+    - portfolio: Portfolio to stress.
+    - S, t, sigma, r: Base underlying price, current time, volatility and rate.
+    - spot_shocks: Relative spot moves, e.g. np.linspace(-0.5, 0.5, 200).
+    - vol_shocks: Absolute volatility moves; shocked volatility is floored at 0.
+    - time_shocks: Time elapsed in years (0 = today).
+    - rate_shocks: Absolute rate moves.
+    - processes: Largest number of concurrent chunks (defaults to the size of
+      the shared pool, POOL_PROCESSES; 1 computes everything in-process).
+    - progress: Optional function called as progress(done, total) after each
+      chunk of scenarios.
+
+    Returns:
+    - ScenarioCube
+    """
+    spot_shocks, vol_shocks, time_shocks, rate_shocks = (
+        np.atleast_1d(np.asarray(shocks, dtype=float))
+        for shocks in (spot_shocks, vol_shocks, time_shocks, rate_shocks)
+    )
+    S_grid = S * (1 + spot_shocks)
+    sigma_grid = np.maximum(sigma + vol_shocks, 0.0)
+    t_values = t + time_shocks
+    r_values = r + rate_shocks
+
+    base_value = float(portfolio.value(S, t, sigma, r))
+    processes = processes or POOL_PROCESSES
+
+    # Work is split into (rate index, time indices) chunks, one time chunk per worker
+    n_scenarios = rate_shocks.size * time_shocks.size
+    evaluations = n_scenarios * vol_shocks.size * spot_shocks.size * max(len(portfolio), 1)
+    parallel = processes > 1 and evaluations >= MIN_PARALLEL_EVALUATIONS
+    if parallel:
+        n_chunks = min(processes, time_shocks.size)
+    else:
+        # In-process chunks only exist to report progress
+        n_chunks = min(PROGRESS_CHUNKS, time_shocks.size) if progress else 1
+    time_chunks = [chunk for chunk in np.array_split(np.arange(time_shocks.size), n_chunks) if chunk.size]
+    tasks = [(rate_idx, chunk) for rate_idx in range(rate_shocks.size) for chunk in time_chunks]
+
+    chunk_args = [(portfolio, S_grid, sigma_grid, t_values[chunk], r_values[rate_idx:rate_idx + 1])
+                  for rate_idx, chunk in tasks]
+    if parallel:
+        results = imap(_value_chunk, chunk_args, processes)
+    else:
+        results = (_value_chunk(*args) for args in chunk_args)
+
+    values = np.empty((rate_shocks.size, time_shocks.size, vol_shocks.size, spot_shocks.size))
+    for done, ((rate_idx, chunk), result) in enumerate(zip(tasks, results), start=1):
+        values[rate_idx, chunk[0]:chunk[-1] + 1] = result[0]
+        if progress:
+            progress(done, len(tasks))
+
+    return ScenarioCube(spot_shocks, vol_shocks, time_shocks, rate_shocks, values - base_value, base_value)
@@ -0,0 +1,167 @@
+"""
+Production server: the dashboard served by a pool of worker processes.
+
+Every worker is a separate interpreter, so throughput scales with the number
+of cores; memoized figures and results go to the cache shared by all workers
+(see updates.figure_cache), so whatever one worker computed the others serve
+without recomputation. Shared stores are created before the fork but every
+worker opens its own connection to them on first use.
+
+Live slider requests are coalesced per worker (see updates.live_requests):
+the workers share one socket, so a burst from one session may be spread over
+several workers and cost up to two computations on each.
+
+Every worker publishes its metrics to $OPTIONS_DASHBOARD_METRICS_DIR (a new
+temporary directory when unset), so /metrics reports all of them whichever
+worker serves the scrape (see metrics.MetricsRegistry).
+
+Run from the repository root:
+    python serve.py                          # one worker per core on 0.0.0.0:8050
+    python serve.py --workers 4 --threads 8 --bind 127.0.0.1:5000
+
+Uses gunicorn when it is installed, otherwise a built-in pre-fork server:
+the listening socket is shared by workers running the Werkzeug server.
+"""
+import argparse
+import os
+import signal
+import socket
+import sys
+import tempfile
+
+try:
+    import gunicorn.app.base
+except ImportError:  # optional, the built-in pre-fork server is used without it
+    gunicorn = None
+
+# Default address the server listens on
+DEFAULT_BIND = '0.0.0.0:8050'
+
+# Default number of request threads per worker; callbacks spend most of their
+# time in NumPy, which releases the GIL
+DEFAULT_THREADS = 4
+
+
+def default_workers():
+    """One worker per core available to this process."""
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:
+        return os.cpu_count() or 1
+
+
+def parse_bind(bind):
+    """Split 'host:port' into (host, port)."""
+    host, _, port = bind.rpartition(':')
+    return host or '0.0.0.0', int(port)
+
+
+def serve_gunicorn(workers, threads, bind, timeout):
+    """
+    Serve app.server with gunicorn.
+
+    The app is loaded before the workers are forked, so they share its
+    memory pages until they write to them.
+    """
+    from app import server
+
+    class Application(gunicorn.app.base.BaseApplication):
+        def load_config(self):
+            self.cfg.set('bind', bind)
+            self.cfg.set('workers', workers)
+            self.cfg.set('threads', threads)
+            self.cfg.set('timeout', timeout)
+            self.cfg.set('preload_app', True)
+
+        def load(self):
+            return server
+
+    Application().run()
+
+
+def serve_prefork(workers, threads, bind):
+    """
+    Serve app.server with a pool of forked Werkzeug servers sharing one socket.
+
+    Workers that exit are replaced; SIGINT or SIGTERM stops the pool.
+    """
+    from werkzeug.serving import make_server
+
+    from app import server
+
+    host, port = parse_bind(bind)
+    listener = socket.create_server((host, port), backlog=128)
+    print(f"Serving on http://{host}:{port}/dash/ with {workers} worker(s) of {threads} thread(s)")
+
+    def run_worker():
+        signal.signal(signal.SIGINT, signal.SIG_DFL)
+        signal.signal(signal.SIGTERM, signal.SIG_DFL)
+        httpd = make_server(host, port, server, threaded=threads > 1, fd=listener.fileno())
+        httpd.serve_forever()
+
+    def spawn():
+        pid = os.fork()
+        if pid == 0:
+            try:
+                run_worker()
+            finally:
+                os._exit(0)
+        return pid
+
+    children = {spawn() for _ in range(workers)}
+    stopping = False
+
+    def stop(signum, frame):
+        nonlocal stopping
+        stopping = True
+        for pid in children:
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    signal.signal(signal.SIGINT, stop)
+    signal.signal(signal.SIGTERM, stop)
+    while children:
+        try:
+            pid, _ = os.wait()
+        except ChildProcessError:
+            break
+        except InterruptedError:
+            continue
+        children.discard(pid)
+        if not stopping:
+            print(f"Worker {pid} exited; starting a new one", file=sys.stderr)
+            children.add(spawn())
+    listener.close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--workers', type=int, default=default_workers(),
+                        help="Number of worker processes (default: one per core, %(default)s here)")
+    parser.add_argument('--threads', type=int, default=DEFAULT_THREADS,
+                        help="Request threads per worker (default %(default)s)")
+    parser.add_argument('--bind', default=DEFAULT_BIND, help="host:port to listen on (default %(default)s)")
+    parser.add_argument('--timeout', type=int, default=120,
+                        help="Seconds before gunicorn restarts a silent worker (default %(default)s)")
+    parser.add_argument('--builtin', action='store_true',
+                        help="Use the built-in pre-fork server even when gunicorn is installed")
+    args = parser.parse_args(argv)
+    if args.workers < 1 or args.threads < 1:
+        parser.error("--workers and --threads must be at least 1")
+
+    # Read by metrics when it is first imported, and inherited by the workers
+    if not os.environ.get('OPTIONS_DASHBOARD_METRICS_DIR'):
+        os.environ['OPTIONS_DASHBOARD_METRICS_DIR'] = tempfile.mkdtemp(prefix='options-dashboard-metrics-')
+    import metrics
+    metrics.clear_directory(metrics.METRICS_DIR)
+
+    if gunicorn is not None and not args.builtin:
+        serve_gunicorn(args.workers, args.threads, args.bind, args.timeout)
+    else:
+        serve_prefork(args.workers, args.threads, args.bind)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,114 @@
+import csv
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pytest
+
+import batch
+from batch import iter_book_shards, price_portfolio_file
+from portfolio import GREEK_NAMES, Portfolio
+
+S, t, SIGMA, R, T = 100.0, 0.0, 0.2, 0.05, 1.0
+SPOT_SHOCKS = (-0.1, 0.1)
+
+
+@pytest.fixture
+def books():
+    rng = np.random.default_rng(2)
+    books = {}
+    for book in range(60):
+        n_legs = int(rng.integers(1, 5))
+        books[f'book{book:03d}'] = [
+            {'type': str(rng.choice(['call', 'put', 'stock'], p=[0.45, 0.45, 0.1])),
+             'strike': float(np.round(rng.uniform(80, 120), 1)),
+             'position': int(rng.choice([1, -1])),
+             'quantity': int(rng.integers(1, 4)),
+             'expiry': float(rng.choice([0.25, 0.5, 1.0])),
+             'american': bool(rng.random() < 0.2)}
+            for _ in range(n_legs)
+        ]
+    return books
+
+
+def write_books(path, books, order=None, id_column='portfolio'):
+    with open(path, 'w', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow([id_column, 'type', 'strike', 'position', 'quantity', 'expiry', 'american'])
+        for book, leg in order or [(book, leg) for book, legs in books.items() for leg in legs]:
+            writer.writerow([book, leg['type'], '' if leg['type'] == 'stock' else leg['strike'], leg['position'],
+                             leg['quantity'], leg['expiry'], 'true' if leg['american'] else 'false'])
+
+
+def to_portfolio(legs):
+    return Portfolio([leg['type'] for leg in legs],
+                     [np.nan if leg['type'] == 'stock' else leg['strike'] for leg in legs],
+                     [leg['position'] for leg in legs], [leg['quantity'] for leg in legs],
+                     [np.nan if leg['type'] == 'stock' else leg['expiry'] for leg in legs],
+                     [leg['american'] and leg['type'] != 'stock' for leg in legs])
+
+
+@pytest.mark.parametrize('processes', [1, 2])
+def test_batch_matches_per_book_portfolios(tmp_path, books, processes):
+    source, output = tmp_path / 'books.csv', tmp_path / 'results.csv'
+    write_books(source, books)
+    result = price_portfolio_file(str(source), str(output), S, t, SIGMA, R, T, SPOT_SHOCKS,
+                                  processes=processes, shard_books=7, chunk_rows=13)
+    assert result.books == len(books)
+    assert result.legs == sum(len(legs) for legs in books.values())
+
+    with open(output, newline='') as f:
+        rows = list(csv.DictReader(f))
+    assert [row['portfolio'] for row in rows] == list(books)
+    for row in rows:
+        portfolio = to_portfolio(books[row['portfolio']])
+        expected = portfolio.evaluate(S, t, SIGMA, R)
+        assert float(row['value']) == pytest.approx(expected['Value'], abs=1e-9)
+        for name in GREEK_NAMES:
+            assert float(row[name.lower()]) == pytest.approx(expected[name], abs=1e-9)
+        profile = portfolio.payoff_profile(expected['Value'])
+        assert float(row['max_loss']) == pytest.approx(profile.max_loss)
+        for shock in SPOT_SHOCKS:
+            shocked = portfolio.value(S * (1 + shock), t, SIGMA, R) - expected['Value']
+            assert float(row[f'pnl_spot_{shock:+.0%}']) == pytest.approx(shocked, abs=1e-9)
+
+
+@pytest.mark.parametrize('chunk_rows', [1, 2, 100])
+def test_non_consecutive_legs_are_rejected(tmp_path, books, chunk_rows):
+    source = tmp_path / 'books.csv'
+    (first, legs_a), (second, legs_b) = list(books.items())[:2]
+    write_books(source, books, [(first, legs_a[0]), (second, legs_b[0]), (first, legs_a[0])])
+    with pytest.raises(ValueError, match=f"{first} are not on consecutive rows"):
+        list(iter_book_shards(str(source), shard_books=10, chunk_rows=chunk_rows))
+
+
+def test_processes_sets_the_pool_size(tmp_path, books, monkeypatch):
+    sizes = []
+
+    class RecordingExecutor(ProcessPoolExecutor):
+        def __init__(self, max_workers):
+            sizes.append(max_workers)
+            super().__init__(max_workers)
+
+    monkeypatch.setattr(batch, 'ProcessPoolExecutor', RecordingExecutor)
+    source = tmp_path / 'books.csv'
+    write_books(source, books)
+    result = price_portfolio_file(str(source), str(tmp_path / 'results.csv'), S, t, SIGMA, R, T, SPOT_SHOCKS,
+                                  processes=3, shard_books=7)
+    assert sizes == [3]
+    assert result.books == len(books)
+
+
+@pytest.mark.parametrize('reader', ['pyarrow', 'csv'])
+def test_books_span_chunks(tmp_path, books, reader, monkeypatch):
+    if reader == 'csv':
+        monkeypatch.setattr(batch, 'import_pyarrow', lambda: (None, None))
+    legs = list(books.values())[0]
+    books = {'007': (legs * 4)[:4], '010': (legs * 2)[:2]}
+    source = tmp_path / 'books.csv'
+    write_books(source, books, id_column=' Portfolio')
+
+    chunks = list(batch._iter_leg_chunks(str(source), 3))
+    # Book 007 starts in the first chunk and ends in the second; its id keeps the leading zeros
+    assert [chunk['portfolio'].tolist() for chunk in chunks] == [['007'] * 3, ['007', '010', '010']]
+    shards = list(iter_book_shards(str(source), shard_books=1, chunk_rows=3))
+    assert [shard['portfolio'].tolist() for shard in shards] == [['007'] * 4, ['010'] * 2]
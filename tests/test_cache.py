@@ -0,0 +1,84 @@
+import os
+
+import numpy as np
+import pytest
+
+from cache import FigureCache, LegCurveCache, canonicalize, memoize, private_directory
+from portfolio import Portfolio
+
+
+def test_canonical_keys():
+    assert canonicalize([100, 100.0, 100.00000000000001]) == (100.0, 100.0, 100.0)
+    assert canonicalize(-0.0) == canonicalize(0)
+    assert canonicalize({'b': 1, 'a': [2]}) == canonicalize({'a': (2,), 'b': 1.0})
+    assert canonicalize((float('nan'), 1)) == canonicalize([np.nan, 1.0])
+
+
+def test_figure_cache_evicts_least_recent_and_expired(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr('cache.time.monotonic', lambda: now[0])
+    cache = FigureCache(maxsize=2, ttl=10)
+    cache.set('a', 1)
+    cache.set('b', 2)
+    assert cache.get('a') == (True, 1)
+    cache.set('c', 3)
+    assert cache.get('b') == (False, None)
+    now[0] += 11
+    assert cache.get('a') == (False, None)
+    assert cache.stats()['evictions'] == 2 and len(cache) == 1
+
+
+def test_memoize_hits_nan_inputs_and_returns_copies():
+    cache = FigureCache()
+    calls = []
+
+    @memoize(cache)
+    def build(value):
+        calls.append(value)
+        return {'data': [value]}
+
+    first = build(float('nan'))
+    first['data'].append('edited')
+    second = build(np.nan)
+    assert len(calls) == 1
+    assert len(second['data']) == 1
+
+
+def test_private_directory(tmp_path):
+    path = private_directory(str(tmp_path / 'store'))
+    assert os.stat(path).st_mode & 0o777 == 0o700
+    assert private_directory(path) == path
+    shared = tmp_path / 'shared'
+    shared.mkdir(mode=0o777)
+    shared.chmod(0o777)
+    with pytest.raises(PermissionError):
+        private_directory(str(shared))
+    link = tmp_path / 'link'
+    link.symlink_to(path)
+    with pytest.raises(PermissionError):
+        private_directory(str(link))
+
+
+def test_leg_curve_cache_evaluates_only_new_points():
+    cache = LegCurveCache()
+    portfolio = Portfolio(['call', 'put', 'stock'], [100.0, 95.0, None], [1, -1, 1], [1, 2, 1],
+                          expiries=[1.0, 0.5, np.nan])
+    S_range, value = cache.value_curve(portfolio, 0.1, 0.2, 0.03, 50.0, 150.0)
+    assert S_range.size >= 200 and S_range[0] >= 50.0 and S_range[-1] <= 150.0
+    np.testing.assert_allclose(value, portfolio.value(S_range, 0.1, 0.2, 0.03))
+    assert cache.evaluated_points == 3 * S_range.size
+
+    # Panning the range evaluates the new lattice points only
+    step = S_range[1] - S_range[0]
+    shifted, value = cache.value_curve(portfolio, 0.1, 0.2, 0.03, 60.0, 160.0)
+    np.testing.assert_allclose(value, portfolio.value(shifted, 0.1, 0.2, 0.03))
+    new_points = round((shifted[-1] - S_range[-1]) / step)
+    assert cache.evaluated_points == 3 * (S_range.size + new_points)
+
+    # Editing one leg re-evaluates that leg only
+    before = cache.evaluated_points
+    edited = Portfolio(['call', 'put', 'stock'], [100.0, 97.5, None], [1, -1, 1], [1, 2, 1],
+                       expiries=[1.0, 0.5, np.nan])
+    shifted, value = cache.value_curve(edited, 0.1, 0.2, 0.03, 60.0, 160.0)
+    np.testing.assert_allclose(value, edited.value(shifted, 0.1, 0.2, 0.03))
+    assert cache.evaluated_points == before + shifted.size
@@ -0,0 +1,110 @@
+import os
+
+import numpy as np
+import pytest
+
+import chains
+from chains import load_chain, resolve_data_file
+from instruments import CALL, PUT, black_scholes_value
+
+S, R, SIGMA = 100.0, 0.03, 0.25
+
+
+@pytest.fixture
+def contracts():
+    rng = np.random.default_rng(11)
+    expiry = np.repeat([0.25, 0.5, 1.0], 20)
+    strike = np.tile(np.repeat(np.linspace(80.0, 125.0, 10), 2), 3)
+    is_call = np.tile([True, False], 30)
+    price = black_scholes_value(S, strike, expiry, SIGMA, R, is_call)
+    order = rng.permutation(expiry.size)
+    return expiry[order], strike[order], is_call[order], price[order]
+
+
+def write_csv(path, contracts):
+    expiry, strike, is_call, price = contracts
+    rows = ['Strike,Maturity,Right,Price,Note']
+    rows += [f"{k!r},{tau!r},{'Call' if call else 'p'},{value!r},x"
+             for tau, k, call, value in zip(expiry.tolist(), strike.tolist(), is_call.tolist(), price.tolist())]
+    path.write_text('\n'.join(rows) + '\n')
+    return str(path)
+
+
+@pytest.mark.parametrize('reader', ['pyarrow', 'csv'])
+def test_csv_chain_is_sorted_and_indexed(tmp_path, contracts, reader, monkeypatch):
+    if reader == 'csv':
+        monkeypatch.setattr(chains, 'import_pyarrow', lambda: (None, None))
+    chain = load_chain(write_csv(tmp_path / 'chain.csv', contracts), chunk_rows=7)
+
+    assert len(chain) == 60
+    # Aliased headers are renamed and non-numeric columns dropped
+    assert set(chain.columns) == {'strike', 'expiry', 'type', 'price'}
+    keys = np.stack([chain['expiry'], chain['strike'], chain['type']])
+    assert (np.lexsort(keys[::-1]) == np.arange(60)).all()
+    np.testing.assert_array_equal(chain.expiries(), [0.25, 0.5, 1.0])
+
+    rows = chain.rows(expiry=0.5, option_type='put', strike_min=90.0, strike_max=110.0)
+    assert (chain['expiry'][rows] == 0.5).all() and (chain['type'][rows] == PUT).all()
+    np.testing.assert_allclose(chain['strike'][rows], [90.0, 95.0, 100.0, 105.0, 110.0])
+    row = chain.lookup(1.0, 125.0, 'call')
+    assert chain['type'][row] == CALL and chain['strike'][row] == 125.0
+    assert chain.lookup(1.0, 126.0, 'call') is None
+
+    np.testing.assert_allclose(chain.price(S, SIGMA, R, chunk_rows=8), chain['price'], atol=1e-10)
+    sigma, converged = chain.implied_vols(S, R, rows=rows)
+    assert converged.all()
+    np.testing.assert_allclose(sigma, SIGMA, atol=1e-6)
+
+
+def test_store_is_reused_until_the_source_changes(tmp_path, contracts):
+    path = write_csv(tmp_path / 'chain.csv', contracts)
+    meta = os.path.join(path + chains.STORE_SUFFIX, 'meta.json')
+    load_chain(path)
+    written = os.stat(meta).st_mtime_ns
+    assert len(load_chain(path)) == 60
+    assert os.stat(meta).st_mtime_ns == written
+
+    expiry, strike, is_call, price = contracts
+    write_csv(tmp_path / 'chain.csv', (expiry[:10], strike[:10], is_call[:10], price[:10]))
+    os.utime(path, ns=(written + 10**9, written + 10**9))
+    assert len(load_chain(path)) == 10
+
+
+def test_parquet_chain(tmp_path, contracts):
+    pa = pytest.importorskip('pyarrow')
+    pa_parquet = pytest.importorskip('pyarrow.parquet')
+    expiry, strike, is_call, price = contracts
+    path = str(tmp_path / 'chain.parquet')
+    table = pa.table({'k': strike, 'tau': expiry, 'option_type': np.where(is_call, 'C', 'P'),
+                      'iv': np.full(strike.size, SIGMA)})
+    pa_parquet.write_table(table, path)
+    chain = load_chain(path, chunk_rows=16)
+    np.testing.assert_allclose(np.sort(chain.price(S, 'iv', R)), np.sort(price), atol=1e-10)
+
+
+def test_invalid_option_type(tmp_path):
+    path = tmp_path / 'chain.csv'
+    path.write_text('strike,expiry,type\n100,0.5,call\n100,0.5,straddle\n')
+    with pytest.raises(ValueError, match='Invalid option type'):
+        load_chain(str(path))
+
+
+def test_missing_key_column(tmp_path):
+    path = tmp_path / 'chain.csv'
+    path.write_text('strike,type\n100,call\n')
+    with pytest.raises(ValueError, match='expiry'):
+        load_chain(str(path))
+
+
+def test_resolve_data_file(tmp_path):
+    data_dir = tmp_path / 'data'
+    (data_dir / 'spx').mkdir(parents=True)
+    (data_dir / 'spx' / 'chain.csv').write_text('strike,expiry,type\n')
+    outside = tmp_path / 'secret.csv'
+    outside.write_text('strike,expiry,type\n')
+    (data_dir / 'link.csv').symlink_to(outside)
+
+    assert resolve_data_file(' spx/chain.csv ', str(data_dir)) == os.path.realpath(data_dir / 'spx' / 'chain.csv')
+    for name in ('', str(outside), '../secret.csv', 'spx/../../secret.csv', 'link.csv', 'missing.csv', 'spx'):
+        with pytest.raises(ValueError):
+            resolve_data_file(name, str(data_dir))
@@ -0,0 +1,65 @@
+import threading
+import time
+
+import pytest
+
+from coalesce import RequestCoalescer, StaleRequest
+
+
+def test_out_of_order_requests_are_stale():
+    coalescer = RequestCoalescer()
+    assert coalescer.submit('a', 2, lambda: 'second') == 'second'
+    with pytest.raises(StaleRequest):
+        coalescer.submit('a', 1, lambda: 'first')
+    # Sessions are independent
+    assert coalescer.submit('b', 1, lambda: 'other') == 'other'
+    assert coalescer.stats() == {'sessions': 2, 'computed': 2, 'dropped': 1}
+
+
+def test_burst_computes_first_and_newest_only():
+    coalescer = RequestCoalescer()
+    started, release = threading.Event(), threading.Event()
+    computed, results = [], {}
+
+    def compute(seq):
+        def run():
+            computed.append(seq)
+            if seq == 1:
+                started.set()
+                release.wait(5)
+            return seq
+        return run
+
+    def request(seq):
+        try:
+            results[seq] = coalescer.submit('session', seq, compute(seq))
+        except StaleRequest:
+            results[seq] = 'stale'
+
+    first = threading.Thread(target=request, args=(1,))
+    first.start()
+    assert started.wait(5)
+    # These queue up behind the running request; only the newest survives
+    burst = [threading.Thread(target=request, args=(seq,)) for seq in range(2, 7)]
+    for thread in burst:
+        thread.start()
+    deadline = time.monotonic() + 5
+    while coalescer._sessions['session'][0] != 6 and time.monotonic() < deadline:
+        time.sleep(0.01)
+    release.set()
+    for thread in [first, *burst]:
+        thread.join(5)
+
+    assert computed == [1, 6]
+    assert results == {1: 1, 2: 'stale', 3: 'stale', 4: 'stale', 5: 'stale', 6: 6}
+
+
+def test_least_recent_session_is_forgotten():
+    coalescer = RequestCoalescer(max_sessions=2)
+    for session in ('a', 'b', 'c'):
+        coalescer.submit(session, 5, lambda: None)
+    assert coalescer.stats()['sessions'] == 2
+    # 'a' was forgotten, so its old sequence numbers are accepted again
+    coalescer.submit('a', 1, lambda: None)
+    with pytest.raises(StaleRequest):
+        coalescer.submit('c', 5, lambda: None)
@@ -0,0 +1,67 @@
+import base64
+
+import numpy as np
+import plotly.graph_objs as go
+from dash import Patch, no_update
+
+from figures import COMPACT_MIN_POINTS, encode_array, figure_signature, figure_update, line_trace
+
+
+def make_figure(y_scale=1.0, title='Strategy', n_traces=2):
+    x = np.linspace(50.0, 150.0, 200)
+    figure = go.Figure([line_trace(x, y_scale * (i + 1) * x, name=f'leg {i}') for i in range(n_traces)])
+    figure.update_layout(title=title)
+    return figure
+
+
+def assignments(patch):
+    return {tuple(op['location']): op['params']['value'] for op in patch.to_plotly_json()['operations']}
+
+
+def test_first_figure_is_sent_whole():
+    signed = figure_signature(make_figure())
+    update, signature = figure_update(signed)
+    assert update is signed[1]
+    assert signature == signed[0]
+
+
+def test_unchanged_figure_sends_nothing():
+    previous, _ = figure_signature(make_figure())
+    update, _ = figure_update(figure_signature(make_figure()), previous)
+    assert update is no_update
+
+
+def test_only_changed_attributes_are_patched():
+    previous, shown = figure_signature(make_figure())
+    signed = figure_signature(make_figure(y_scale=2.0, title='Moved'))
+    update, signature = figure_update(signed, previous)
+    assert isinstance(update, Patch)
+    changed = assignments(update)
+    assert set(changed) == {('data', 0, 'y'), ('data', 1, 'y'), ('layout', 'title')}
+    assert signature == signed[0]
+
+    # Applying the patch to the figure in the browser gives the new figure
+    for (*path, key), value in changed.items():
+        target = shown
+        for part in path:
+            target = target[part]
+        target[key] = value
+    assert figure_signature(shown)[0] == signature
+
+
+def test_new_traces_send_the_whole_figure():
+    previous, _ = figure_signature(make_figure())
+    signed = figure_signature(make_figure(n_traces=3))
+    update, _ = figure_update(signed, previous)
+    assert update is signed[1]
+
+
+def test_encode_array_round_trip():
+    short = np.arange(COMPACT_MIN_POINTS - 1, dtype=float) / 3
+    long = np.arange(COMPACT_MIN_POINTS, dtype=float) / 3
+    for values, dtype in ((short, '<f8'), (long, '<f4')):
+        spec = encode_array(values)
+        decoded = np.frombuffer(base64.b64decode(spec['bdata']), dtype=dtype)
+        assert spec['dtype'] == dtype[1:]
+        np.testing.assert_allclose(decoded, values, rtol=1e-7)
+    assert encode_array([]) == []
@@ -0,0 +1,34 @@
+import numpy as np
+
+from implied_vol import implied_volatility
+from instruments import black_scholes_value
+
+S, K, TAU, R = 100.0, 105.0, 0.75, 0.03
+
+
+def test_implied_volatility_round_trip():
+    strikes = np.linspace(70.0, 140.0, 15)
+    sigmas = np.linspace(0.1, 0.8, 15)
+    is_call = np.arange(15) % 2 == 0
+    prices = black_scholes_value(S, strikes, TAU, sigmas, R, is_call)
+    implied, converged = implied_volatility(prices, S, strikes, TAU, R, is_call)
+    assert converged.all()
+    np.testing.assert_allclose(implied, sigmas, atol=1e-6)
+
+
+def test_implied_volatility_rejects_arbitrage():
+    implied, converged = implied_volatility(S + 1.0, S, K, TAU, R, True)
+    assert np.isnan(implied) and not converged
+
+
+def test_far_from_the_money_quotes_pin_down_the_volatility():
+    # Quotes worth less than the price tolerance above their bounds, where
+    # almost any volatility matches the price to 1e-8
+    strikes = np.array([200.0, 250.0, 40.0, 30.0, 180.0, 50.0])
+    is_call = np.array([True, True, False, False, True, True])
+    sigmas = np.array([0.3, 0.35, 0.3, 0.4, 0.25, 0.2])
+    prices = black_scholes_value(S, strikes, 0.25, sigmas, R, is_call)
+    implied, converged = implied_volatility(prices, S, strikes, 0.25, R, is_call)
+    assert converged.all()
+    # The price tolerance alone accepted 0.32 for the 40 put and 0.25 for the 50 call
+    np.testing.assert_allclose(implied, sigmas, atol=1e-4)
@@ -0,0 +1,48 @@
+import numpy as np
+
+from instruments import Instrument, black_scholes_evaluate, black_scholes_value
+
+S, K, T, SIGMA, R = 100.0, 105.0, 0.75, 0.25, 0.03
+SPOTS = np.linspace(60.0, 160.0, 11)
+
+
+def test_put_call_parity():
+    call, put = Instrument('call', K), Instrument('put', K)
+    for t in (0.0, 0.5, 0.74):
+        np.testing.assert_allclose(call.get_current_value(SPOTS, T, t, SIGMA, R)
+                                   - put.get_current_value(SPOTS, T, t, SIGMA, R),
+                                   SPOTS - K * np.exp(-R * (T - t)), atol=1e-10)
+
+
+def test_array_inputs_match_scalar_calls():
+    put = Instrument('put', K, position=-1)
+    grid = put.get_current_value(SPOTS[None, :], T, np.array([[0.0], [0.25]]), SIGMA, R)
+    assert grid.shape == (2, 11)
+    for i, t in enumerate((0.0, 0.25)):
+        for j, spot in enumerate(SPOTS):
+            assert grid[i, j] == put.get_current_value(float(spot), T, t, SIGMA, R)
+    assert np.ndim(put.get_current_value(S, T, 0.0, SIGMA, R)) == 0
+
+
+def test_expired_and_zero_volatility_values():
+    call = Instrument('call', K)
+    np.testing.assert_allclose(call.get_current_value(SPOTS, T, T, SIGMA, R), np.maximum(SPOTS - K, 0.0))
+    np.testing.assert_allclose(call.get_payoff(SPOTS), np.maximum(SPOTS - K, 0.0))
+    np.testing.assert_allclose(Instrument('stock', position=-1).get_payoff(SPOTS), -SPOTS)
+    # Without volatility the option is worth its discounted intrinsic value
+    np.testing.assert_allclose(call.get_current_value(SPOTS, T, 0.0, 0.0, R),
+                               np.maximum(SPOTS - K * np.exp(-R * T), 0.0))
+
+
+def test_greeks_match_finite_differences():
+    h = 1e-4
+    results = black_scholes_evaluate(SPOTS, K, T, SIGMA, R, False)
+
+    def price(S=SPOTS, tau=T, sigma=SIGMA, r=R):
+        return black_scholes_value(S, K, tau, sigma, r, False)
+
+    np.testing.assert_allclose(results['Value'], price(), atol=1e-12)
+    np.testing.assert_allclose(results['Delta'], (price(S=SPOTS + h) - price(S=SPOTS - h)) / (2 * h), atol=1e-6)
+    np.testing.assert_allclose(results['Theta'], -(price(tau=T + h) - price(tau=T - h)) / (2 * h), atol=1e-5)
+    np.testing.assert_allclose(results['Vega'], (price(sigma=SIGMA + h) - price(sigma=SIGMA - h)) / (2 * h), atol=1e-5)
+    np.testing.assert_allclose(results['Rho'], (price(r=R + h) - price(r=R - h)) / (2 * h), atol=1e-5)
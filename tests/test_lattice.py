@@ -0,0 +1,49 @@
+import numpy as np
+import pytest
+
+from instruments import black_scholes_evaluate, black_scholes_value
+from lattice import american_evaluate, lattice_value
+from portfolio import Portfolio
+
+S, K, TAU, SIGMA, R = 100.0, 105.0, 0.75, 0.25, 0.03
+SPOTS = np.linspace(60.0, 160.0, 11)
+
+
+@pytest.mark.parametrize('method', ['binomial', 'trinomial'])
+@pytest.mark.parametrize('is_call', [True, False])
+def test_european_lattice_matches_black_scholes(method, is_call):
+    values = lattice_value(SPOTS, K, TAU, SIGMA, R, is_call, american=False, steps=2000, method=method)
+    np.testing.assert_allclose(values, black_scholes_value(SPOTS, K, TAU, SIGMA, R, is_call), atol=0.02)
+
+
+def test_american_put_is_worth_more_than_european():
+    american = lattice_value(SPOTS, K, TAU, SIGMA, R, False, american=True, steps=1000)
+    european = black_scholes_value(SPOTS, K, TAU, SIGMA, R, False)
+    assert (american >= european - 1e-8).all()
+    assert (american >= np.maximum(K - SPOTS, 0.0) - 1e-8).all()
+    assert american[0] > european[0] + 1.0
+
+
+def test_american_call_greeks_match_black_scholes():
+    # Without dividends early exercise of a call never pays, so its tree greeks are the European ones
+    american = american_evaluate(SPOTS, K, TAU, SIGMA, R, True, steps=1000)
+    european = black_scholes_evaluate(SPOTS, K, TAU, SIGMA, R, True)
+    for name, atol in [('Value', 0.02), ('Delta', 0.005), ('Gamma', 0.001), ('Theta', 0.05),
+                       ('Vega', 0.3), ('Rho', 0.3)]:
+        np.testing.assert_allclose(american[name], european[name], atol=atol, err_msg=name)
+
+
+def test_deep_american_put_delta_is_minus_one():
+    results = american_evaluate(60.0, K, TAU, SIGMA, R, False)
+    assert results['Value'] == pytest.approx(K - 60.0)
+    assert results['Delta'] == pytest.approx(-1.0, abs=1e-6)
+
+
+def test_portfolio_american_legs_sum_per_leg():
+    portfolio = Portfolio(['call', 'put', 'stock'], [100.0, 95.0, None], [1, -1, 1], [1, 2, 3],
+                          expiries=[1.0, 0.5, np.nan], american=[False, True, False])
+    totals = portfolio.evaluate(SPOTS, 0.0, SIGMA, R)
+    per_leg = portfolio.evaluate(SPOTS, 0.0, SIGMA, R, per_leg=True)
+    for name, values in totals.items():
+        np.testing.assert_allclose(values, per_leg[name].sum(axis=0), err_msg=name)
+    np.testing.assert_allclose(totals['Value'], portfolio.value(SPOTS, 0.0, SIGMA, R))
@@ -0,0 +1,128 @@
+import multiprocessing
+import re
+import time
+
+import pytest
+from dash import Dash, Input, Output, html
+from dash.exceptions import PreventUpdate
+
+import metrics
+from metrics import MetricsRegistry, instrument, registry
+
+
+@pytest.fixture(autouse=True)
+def clean_registry():
+    registry.clear()
+    yield
+    registry.clear()
+
+
+def samples(text):
+    """Parse the exposition format into {(name, labels): value}."""
+    parsed = {}
+    for line in text.splitlines():
+        if line and not line.startswith('#'):
+            match = re.fullmatch(r'(\w+)(?:\{(.*)\})? (\S+)', line)
+            labels = tuple(re.findall(r'(\w+)="((?:[^"\\]|\\.)*)"', match.group(2) or ''))
+            parsed[match.group(1), labels] = float(match.group(3))
+    return parsed
+
+
+def test_instrument_counts_calls_errors_and_latency():
+    @instrument('pricing')
+    def price(fail=False):
+        if fail:
+            raise ValueError('bad input')
+        return 1.0
+
+    @instrument('callback')
+    def callback():
+        raise PreventUpdate
+
+    price()
+    price()
+    with pytest.raises(ValueError):
+        price(fail=True)
+    with pytest.raises(PreventUpdate):
+        callback()
+
+    parsed = samples(registry.render())
+    labels = (('function', 'price'),)
+    assert parsed['options_dashboard_pricing_calls_total', labels] == 3
+    assert parsed['options_dashboard_pricing_errors_total', labels] == 1
+    assert parsed['options_dashboard_pricing_seconds_count', labels] == 3
+    assert parsed['options_dashboard_pricing_seconds_bucket', labels + (('le', '+Inf'),)] == 3
+    callback_labels = (('function', 'callback'),)
+    assert parsed['options_dashboard_callback_calls_total', callback_labels] == 1
+    assert ('options_dashboard_callback_errors_total', callback_labels) not in parsed
+
+
+def test_histogram_buckets_are_cumulative():
+    for value in (0.0005, 0.003, 0.003, 20.0):
+        registry.observe('request_seconds', (('callback', 'a"b'),), value)
+    text = registry.render()
+    assert text.count('# TYPE options_dashboard_request_seconds histogram') == 1
+    parsed = samples(text)
+    labels = (('callback', 'a\\"b'),)
+    assert parsed['options_dashboard_request_seconds_bucket', labels + (('le', '0.001'),)] == 1
+    assert parsed['options_dashboard_request_seconds_bucket', labels + (('le', '0.005'),)] == 3
+    assert parsed['options_dashboard_request_seconds_bucket', labels + (('le', '10.0'),)] == 3
+    assert parsed['options_dashboard_request_seconds_bucket', labels + (('le', '+Inf'),)] == 4
+    assert parsed['options_dashboard_request_seconds_sum', labels] == pytest.approx(20.0065)
+
+
+def test_install_records_callback_requests():
+    app = Dash(__name__)
+    app.layout = html.Div([html.Div(id='source'), html.Div(id='target')])
+
+    @app.callback(Output('target', 'children'), Input('source', 'children'))
+    @instrument('callback')
+    def echo(value):
+        return value
+
+    metrics.install(app)
+    client = app.server.test_client()
+    payload = {
+        'output': 'target.children',
+        'outputs': {'id': 'target', 'property': 'children'},
+        'inputs': [{'id': 'source', 'property': 'children', 'value': 'hello'}],
+        'changedPropIds': ['source.children']
+    }
+    assert client.post('/_dash-update-component', json=payload).status_code == 200
+
+    response = client.get('/metrics')
+    assert response.status_code == 200
+    assert response.mimetype == 'text/plain'
+    parsed = samples(response.get_data(as_text=True))
+    assert parsed['options_dashboard_responses_total', (('callback', 'echo'), ('status', '200'))] == 1
+    assert parsed['options_dashboard_request_seconds_count', (('callback', 'echo'),)] == 1
+    assert parsed['options_dashboard_callback_calls_total', (('function', 'echo'),)] == 1
+
+
+def test_shared_directory_adds_up_processes(tmp_path, monkeypatch):
+    monkeypatch.setattr(metrics, 'PUBLISH_SECONDS', 0.05)
+    shared = MetricsRegistry(str(metrics.clear_directory(str(tmp_path / 'metrics'))))
+    labels = (('callback', 'echo'),)
+    shared.increment('responses_total', labels)
+    shared.observe('request_seconds', labels, 0.002)
+
+    def worker(value):
+        # Published by the background thread of the worker, not explicitly
+        shared.increment('responses_total', labels, 2)
+        shared.observe('request_seconds', labels, value)
+        time.sleep(0.3)
+
+    processes = [multiprocessing.get_context('fork').Process(target=worker, args=(value,)) for value in (0.02, 3.0)]
+    for process in processes:
+        process.start()
+    for process in processes:
+        process.join()
+    published = {path.name for path in (tmp_path / 'metrics').iterdir()}
+    assert {f'{process.pid}.json' for process in processes} <= published
+
+    parsed = samples(shared.render())
+    # The values recorded before the fork are counted once
+    assert parsed['options_dashboard_responses_total', labels] == 5
+    assert parsed['options_dashboard_request_seconds_count', labels] == 3
+    assert parsed['options_dashboard_request_seconds_bucket', labels + (('le', '0.025'),)] == 2
+    assert parsed['options_dashboard_request_seconds_sum', labels] == pytest.approx(3.022)
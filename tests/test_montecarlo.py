@@ -0,0 +1,49 @@
+import numpy as np
+import pytest
+from scipy.special import ndtr
+
+from montecarlo import monte_carlo_value
+from portfolio import Portfolio
+
+S, K, TAU, SIGMA, R = 100.0, 105.0, 0.75, 0.25, 0.03
+
+
+def test_monte_carlo_within_standard_error():
+    portfolio = Portfolio(['call', 'put', 'call'], [95.0, 100.0, 120.0], [1, -1, 1], [1, 2, 1],
+                          expiries=[0.5, 1.0, 1.0])
+    exact = portfolio.value(S, 0.0, SIGMA, R)
+    for control_variate in (False, True):
+        result = monte_carlo_value(portfolio, S, 0.0, SIGMA, R, n_paths=200_000, seed=7,
+                                   control_variate=control_variate)
+        assert abs(result.value - exact) < 4 * result.std_error
+
+
+def test_monte_carlo_payoff_within_standard_error():
+    # A digital call, against its closed form exp(-r*tau) * N(d2)
+    portfolio = Portfolio(['call'], [K], [1], expiries=[TAU])
+    d2 = (np.log(S / K) + (R - SIGMA**2 / 2) * TAU) / (SIGMA * np.sqrt(TAU))
+    result = monte_carlo_value(portfolio, S, 0.0, SIGMA, R, n_paths=200_000, seed=3,
+                               payoff=_digital_call_payoff, T=TAU)
+    assert abs(result.value - np.exp(-R * TAU) * ndtr(d2)) < 4 * result.std_error
+
+
+def _digital_call_payoff(S_T):
+    return (S_T > K).astype(float)
+
+
+def test_monte_carlo_rejects_american_legs():
+    portfolio = Portfolio(['put'], [K], [1], expiries=[TAU], american=[True])
+    with pytest.raises(ValueError, match='European-only'):
+        monte_carlo_value(portfolio, S, 0.0, SIGMA, R, n_paths=1000, seed=1)
+
+
+def test_american_control_is_valued_as_european():
+    # The control legs are held to expiry, so their exercise style must not move the estimate
+    results = [
+        monte_carlo_value(Portfolio(['put', 'call'], [K, 95.0], [1, 1], expiries=[TAU, TAU], american=american),
+                          S, 0.0, SIGMA, R, n_paths=100_000, seed=3, payoff=_digital_call_payoff, T=TAU)
+        for american in ([False, False], [True, True])
+    ]
+    assert results[0].value == results[1].value
+    d2 = (np.log(S / K) + (R - SIGMA**2 / 2) * TAU) / (SIGMA * np.sqrt(TAU))
+    assert abs(results[1].value - np.exp(-R * TAU) * ndtr(d2)) < 4 * results[1].std_error
@@ -0,0 +1,50 @@
+import numpy as np
+import pytest
+
+from portfolio import Portfolio
+
+
+def brute_force_break_evens(portfolio, cost, grid):
+    """Sign changes of the net payoff on a fine grid."""
+    pnl = portfolio.payoff(grid) - cost
+    crossings = np.flatnonzero(np.sign(pnl[:-1]) != np.sign(pnl[1:]))
+    return grid[crossings] - pnl[crossings] * (grid[crossings + 1] - grid[crossings]) / (pnl[crossings + 1] - pnl[crossings])
+
+
+def test_straddle():
+    portfolio = Portfolio(['call', 'put'], [100.0, 100.0], [1, 1])
+    profile = portfolio.payoff_profile(cost=10.0)
+    np.testing.assert_allclose(profile.break_evens, [90.0, 110.0])
+    assert profile.max_profit == np.inf
+    assert profile.max_loss == pytest.approx(-10.0)
+
+
+def test_iron_condor():
+    portfolio = Portfolio(['put', 'put', 'call', 'call'], [80.0, 90.0, 110.0, 120.0], [1, -1, -1, 1])
+    profile = portfolio.payoff_profile(cost=-4.0)
+    np.testing.assert_allclose(profile.break_evens, [86.0, 114.0])
+    assert profile.max_profit == pytest.approx(4.0)
+    assert profile.max_loss == pytest.approx(-6.0)
+
+
+def test_covered_call_with_quantities():
+    portfolio = Portfolio(['stock', 'call'], [None, 110.0], [1, -1], [2, 2])
+    profile = portfolio.payoff_profile(cost=190.0)
+    np.testing.assert_allclose(profile.break_evens, [95.0])
+    assert profile.max_profit == pytest.approx(30.0)
+    assert profile.max_loss == pytest.approx(-190.0)
+
+
+def test_break_evens_match_the_sampled_payoff():
+    rng = np.random.default_rng(1)
+    grid = np.linspace(0.0, 400.0, 400_001)
+    for _ in range(20):
+        n_legs = int(rng.integers(1, 6))
+        portfolio = Portfolio(rng.choice(['call', 'put'], n_legs), np.round(rng.uniform(50, 150, n_legs), 1),
+                              rng.choice([1, -1], n_legs), rng.integers(1, 4, n_legs))
+        cost = float(rng.uniform(-20, 20))
+        profile = portfolio.payoff_profile(cost)
+        np.testing.assert_allclose(profile.evaluate(grid), portfolio.payoff(grid) - cost, atol=1e-9)
+        expected = brute_force_break_evens(portfolio, cost, grid)
+        visible = profile.break_evens[profile.break_evens < grid[-1]]
+        np.testing.assert_allclose(visible, expected, atol=1e-6)
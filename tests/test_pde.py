@@ -0,0 +1,17 @@
+import numpy as np
+import pytest
+
+from instruments import black_scholes_evaluate
+from pde import crank_nicolson
+
+K, TAU, SIGMA, R = 105.0, 0.75, 0.25, 0.03
+
+
+@pytest.mark.parametrize('is_call', [True, False])
+def test_european_pde_matches_black_scholes(is_call):
+    solution = crank_nicolson(K, TAU, SIGMA, R, is_call, n_space=800, n_time=400)
+    spots = np.linspace(70.0, 140.0, 8)
+    exact = black_scholes_evaluate(spots, K, TAU, SIGMA, R, is_call)
+    interpolated = solution.interpolate(spots)
+    for name, atol in [('Value', 0.01), ('Delta', 1e-3), ('Gamma', 1e-3)]:
+        np.testing.assert_allclose(interpolated[name], exact[name], atol=atol, err_msg=name)
@@ -0,0 +1,57 @@
+import numpy as np
+import pytest
+
+from portfolio import Portfolio
+from risk import VaRResult, historical_var, scenario_pnl
+
+S, T, SIGMA, R = 100.0, 1.0, 0.2, 0.05
+
+
+@pytest.fixture
+def portfolio():
+    return Portfolio(['call', 'put', 'stock'], [105.0, 95.0, None], [-1, 1, 1], [2, 1, 1], expiries=[T, T, np.nan])
+
+
+@pytest.fixture
+def returns_file(tmp_path):
+    rng = np.random.default_rng(5)
+    returns = rng.standard_t(4, 1000) * 0.01
+    path = tmp_path / 'returns.csv'
+    rows = [f"2020-01-{i % 28 + 1:02d},{value!r},{value * -0.5!r}" for i, value in enumerate(returns.tolist())]
+    path.write_text('date,return,vol_change\n' + '\n'.join(rows) + '\n')
+    return str(path), returns
+
+
+@pytest.mark.parametrize('confidence', [0.9, 0.95, 0.99, 0.999])
+def test_var_and_expected_shortfall_match_sorted_pnl(confidence):
+    pnl = np.random.default_rng(0).normal(size=1234)
+    result = VaRResult(pnl, confidence, 'full', 0.0, 1.0)
+    n_tail = int(np.ceil(pnl.size * (1 - confidence) - 1e-9))
+    tail = np.sort(pnl)[:n_tail]
+    assert result.var == pytest.approx(-tail[-1])
+    assert result.expected_shortfall == pytest.approx(-tail.mean())
+    assert result.expected_shortfall >= result.var
+
+
+def test_historical_var_matches_scenario_pnl(portfolio, returns_file):
+    path, returns = returns_file
+    results = historical_var(portfolio, path, S, 0.0, SIGMA, R, confidence=0.99, methods=('full', 'delta-gamma'),
+                             chunk_rows=97)
+    for method, result in results.items():
+        pnl = scenario_pnl(portfolio, S, 0.0, SIGMA, R, returns, -0.5 * returns, method=method)
+        np.testing.assert_allclose(result.pnl, pnl, atol=1e-9)
+        assert result.var == pytest.approx(-np.sort(pnl)[9])
+    # Daily moves are small, so the delta-gamma approximation stays near full revaluation
+    assert results['delta-gamma'].var == pytest.approx(results['full'].var, rel=0.2)
+
+
+def test_returns_file_errors(portfolio, tmp_path):
+    missing = tmp_path / 'missing.csv'
+    missing.write_text('date,close\n2020-01-01,1\n')
+    with pytest.raises(ValueError, match="missing the 'return' column"):
+        historical_var(portfolio, str(missing), S, 0.0, SIGMA, R)
+    text = tmp_path / 'text.csv'
+    text.write_text('return\nsecret\n')
+    with pytest.raises(ValueError) as error:
+        historical_var(portfolio, str(text), S, 0.0, SIGMA, R)
+    assert 'secret' not in str(error.value)
@@ -0,0 +1,50 @@
+import numpy as np
+
+from instruments import black_scholes_value
+from sampling import adaptive_sample
+
+STRIKES = (90.0, 100.0, 115.0)
+
+
+def butterfly(S):
+    return (black_scholes_value(S, STRIKES[0], 0.1, 0.2, 0.03, True)
+            - 2 * black_scholes_value(S, STRIKES[1], 0.1, 0.2, 0.03, True)
+            + black_scholes_value(S, STRIKES[2], 0.1, 0.2, 0.03, True))
+
+
+def test_interpolation_error_within_tolerance():
+    x, y, n_evaluations = adaptive_sample(butterfly, 50.0, 150.0, 1e-3, seeds=STRIKES)
+    assert (np.diff(x) > 0).all()
+    assert x[0] == 50.0 and x[-1] == 150.0
+    assert set(STRIKES) <= set(x.tolist())
+    np.testing.assert_allclose(y, butterfly(x))
+    assert n_evaluations == x.size
+
+    fine = np.linspace(50.0, 150.0, 20001)
+    assert np.abs(np.interp(fine, x, y) - butterfly(fine)).max() < 2e-3
+    # Far fewer points than a uniform grid of the same accuracy
+    assert x.size < 400
+
+
+def test_payoff_kinks_are_exact():
+    def payoff(S):
+        return np.maximum(S - 100.0, 0.0) - np.maximum(S - 110.0, 0.0)
+
+    x, y, _ = adaptive_sample(payoff, 0.0, 200.0, 1e-9, seeds=(100.0, 110.0, 250.0))
+    assert 250.0 not in x
+    fine = np.linspace(0.0, 200.0, 4001)
+    np.testing.assert_allclose(np.interp(fine, x, y), payoff(fine), atol=1e-9)
+    # 17 uniform points and the 110 seed (100 is on the grid); linear between kinks, so each
+    # starting interval is checked at its midpoint once and never split again
+    assert x.size == 2 * 18 - 1
+
+
+def test_evaluation_budget():
+    calls = []
+
+    def func(x):
+        calls.append(x.size)
+        return np.sin(50 * x)
+
+    x, y, n_evaluations = adaptive_sample(func, 0.0, 10.0, 1e-12, max_evaluations=300)
+    assert n_evaluations == sum(calls) == x.size == 300
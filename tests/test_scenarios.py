@@ -0,0 +1,61 @@
+import numpy as np
+import pytest
+
+from portfolio import Portfolio
+from scenarios import ScenarioCube, pnl_cube
+
+S, t, SIGMA, R = 100.0, 0.0, 0.2, 0.03
+SPOT_SHOCKS = np.linspace(-0.3, 0.3, 13)
+VOL_SHOCKS = (-0.1, 0.0, 0.05)
+TIME_SHOCKS = (0.0, 0.1, 0.25, 0.4)
+RATE_SHOCKS = (-0.01, 0.0, 0.01)
+
+
+@pytest.fixture
+def portfolio():
+    return Portfolio(['call', 'put', 'call', 'stock'], [100.0, 90.0, 115.0, None], [-1, -1, 1, 1],
+                     [1, 2, 1, 1], expiries=[0.5, 0.5, 1.0, np.nan])
+
+
+def test_cube_matches_direct_valuation(portfolio):
+    progress = []
+    cube = pnl_cube(portfolio, S, t, SIGMA, R, SPOT_SHOCKS, VOL_SHOCKS, TIME_SHOCKS, RATE_SHOCKS,
+                    processes=1, progress=lambda done, total: progress.append((done, total)))
+
+    assert cube.pnl.shape == (3, 4, 3, 13)
+    assert cube.base_value == pytest.approx(portfolio.value(S, t, SIGMA, R))
+    for i, dr in enumerate(RATE_SHOCKS):
+        for j, dt in enumerate(TIME_SHOCKS):
+            for k, dv in enumerate(VOL_SHOCKS):
+                expected = portfolio.value(S * (1 + SPOT_SHOCKS), t + dt, SIGMA + dv, R + dr) - cube.base_value
+                np.testing.assert_allclose(cube.pnl[i, j, k], expected, atol=1e-10)
+    # No shock, no P&L
+    assert cube.pnl[1, 0, 1, 6] == pytest.approx(0.0, abs=1e-10)
+    assert progress[-1][0] == progress[-1][1] == len(progress)
+
+
+def test_worst_scenario_and_round_trip(portfolio, tmp_path):
+    cube = pnl_cube(portfolio, S, t, SIGMA, R, SPOT_SHOCKS, VOL_SHOCKS, TIME_SHOCKS, RATE_SHOCKS, processes=1)
+    pnl, spot, vol, time, rate = cube.worst()
+    assert pnl == cube.pnl.min()
+    direct = portfolio.value(S * (1 + spot), t + time, SIGMA + vol, R + rate) - cube.base_value
+    assert pnl == pytest.approx(direct)
+
+    path = str(tmp_path / 'cube.npz')
+    cube.save(path)
+    loaded = ScenarioCube.load(path)
+    np.testing.assert_array_equal(loaded.pnl, cube.pnl)
+    np.testing.assert_array_equal(loaded.spot_shocks, cube.spot_shocks)
+    assert loaded.worst() == cube.worst()
+
+
+def test_shocked_volatility_is_floored(portfolio):
+    cube = pnl_cube(portfolio, S, t, 0.05, R, (0.0,), (-0.1, -0.05), (0.0,), processes=1)
+    np.testing.assert_allclose(cube.pnl[0, 0, 0], cube.pnl[0, 0, 1])
+
+
+def test_parallel_chunks_match_in_process(portfolio, monkeypatch):
+    serial = pnl_cube(portfolio, S, t, SIGMA, R, SPOT_SHOCKS, VOL_SHOCKS, TIME_SHOCKS, RATE_SHOCKS, processes=1)
+    monkeypatch.setattr('scenarios.MIN_PARALLEL_EVALUATIONS', 0)
+    parallel = pnl_cube(portfolio, S, t, SIGMA, R, SPOT_SHOCKS, VOL_SHOCKS, TIME_SHOCKS, RATE_SHOCKS, processes=2)
+    np.testing.assert_allclose(parallel.pnl, serial.pnl, atol=1e-12)
@@ -0,0 +1,109 @@
+import base64
+import time
+
+import numpy as np
+import pytest
+
+import updates
+from portfolio import Portfolio
+from updates import (ANIMATION_TREE_STEPS, LIVE_TREE_STEPS, MAX_AMERICAN_ANIMATION_FRAMES,
+                     MAX_AMERICAN_GREEK_GRID_SIZE, build_greeks_output, build_live_patch, build_strategy_figure,
+                     canonical_legs, open_chain)
+
+S, T, t, SIGMA, R = 100.0, 1.0, 0.0, 0.3, 0.03
+
+# Six legs, alternating calls and puts
+LEGS = tuple(('call' if i % 2 else 'put', 80.0 + 10 * i, 1 if i % 3 else -1, 1.0) for i in range(6))
+
+
+def trace_values(values):
+    """Decode a trace array, which plotly may serialize as a typed array spec."""
+    if isinstance(values, dict):
+        return np.frombuffer(base64.b64decode(values['bdata']), dtype=values['dtype']).astype(float)
+    return np.asarray(values, dtype=float)
+
+
+def build(american, frames):
+    legs = tuple(leg + (american,) for leg in LEGS)
+    # Unmemoized, so every call prices the frames
+    return build_strategy_figure.__wrapped__(legs, S, T, t, SIGMA, R, None, frames)
+
+
+def test_animation_frames_follow_the_value():
+    (_, spec), store = build(False, 30)
+    assert len(spec['frames']) == 30
+    portfolio = Portfolio.from_records(store['legs'])
+    S_range = np.asarray(store['spot_grid'])
+    last = spec['frames'][-1]
+    np.testing.assert_allclose(trace_values(last['data'][0]['y']), portfolio.value(S_range, T, SIGMA, R),
+                               atol=1e-4)
+
+
+def test_american_animation_is_fast():
+    start = time.perf_counter()
+    (_, spec), store = build(True, 60)
+    elapsed = time.perf_counter() - start
+    # 60 frames on full trees took about 15 s
+    assert elapsed < 3.0
+    assert len(spec['frames']) == MAX_AMERICAN_ANIMATION_FRAMES
+    assert 'American legs' in spec['layout']['sliders'][0]['currentvalue']['suffix']
+
+    # Shallow trees stay close to the full ones
+    portfolio = Portfolio.from_records(store['legs'])
+    S_range = np.asarray(store['spot_grid'])
+    t_frame = np.linspace(t, T, MAX_AMERICAN_ANIMATION_FRAMES)[10]
+    frame = trace_values(spec['frames'][10]['data'][0]['y'])
+    np.testing.assert_allclose(frame, portfolio.value(S_range, t_frame, SIGMA, R), atol=0.25)
+    np.testing.assert_allclose(frame, portfolio.value(S_range, t_frame, SIGMA, R, steps=ANIMATION_TREE_STEPS),
+                               atol=1e-4)
+
+
+def patched(patch, location):
+    return next(op['params']['value'] for op in patch.to_plotly_json()['operations'] if op['location'] == location)
+
+
+def test_american_live_patch_is_fast():
+    _, store = build(True, 0)
+    build_live_patch(store, S, t, SIGMA, R)
+    timings = []
+    for _ in range(5):
+        start = time.perf_counter()
+        patch = build_live_patch(store, 1.02 * S, 0.1, SIGMA, R)
+        timings.append(time.perf_counter() - start)
+    # Full trees took about 250 ms per move
+    assert np.median(timings) < 0.05
+    assert 'American legs on' in patched(patch, ['layout', 'annotations', 0, 'text'])
+
+    portfolio = Portfolio.from_records(store['legs'])
+    S_range = np.asarray(store['spot_grid'])
+    np.testing.assert_allclose(trace_values(patched(patch, ['data', 1, 'y'])),
+                               portfolio.value(S_range, 0.1, SIGMA, R, steps=LIVE_TREE_STEPS), atol=1e-4)
+
+
+def test_american_greek_surfaces_are_capped():
+    legs = canonical_legs([dict(type=kind, strike=strike, position=position, quantity=1, expiry=expiry, american=True)
+                           for kind, strike, position, expiry in LEGS])
+    start = time.perf_counter()
+    note, grid = build_greeks_output.__wrapped__(S, S, T, t, SIGMA, R, 'call', 'heatmap', 500, legs)
+    elapsed = time.perf_counter() - start
+    # 100x100 on full trees took about 30 s
+    assert elapsed < 5.0
+    assert 'American legs' in note.children
+    heatmap = grid.children[0].figure['data'][0]
+    assert trace_values(heatmap['x']).size == trace_values(heatmap['y']).size == MAX_AMERICAN_GREEK_GRID_SIZE
+
+
+def test_chain_errors_do_not_echo_the_file(tmp_path, monkeypatch, caplog):
+    monkeypatch.setattr(updates, 'CHAIN_DATA_DIR', str(tmp_path / 'chains'))
+    monkeypatch.setattr(updates, 'JOB_CACHE_DIR', str(tmp_path / 'jobs'))
+    monkeypatch.setattr(updates, 'CHAIN_STORE_DIR', str(tmp_path / 'jobs' / 'chains'))
+    (tmp_path / 'chains').mkdir()
+    (tmp_path / 'chains' / 'chain.csv').write_text('strike,expiry,type\n100,0.5,call\n100,0.5,hunter2\n')
+
+    with pytest.raises(ValueError) as error:
+        open_chain('chain.csv')
+    assert 'hunter2' not in str(error.value)
+    assert 'hunter2' in caplog.text
+    # Errors about the name itself are shown as they are
+    with pytest.raises(ValueError, match="No file named 'missing.csv'"):
+        open_chain('missing.csv')
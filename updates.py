@@ -1,155 +1,778 @@
+import hashlib
+import logging
+import os
+import re
+import tempfile
+import time
+
 import numpy as np
-from scipy.stats import norm
 import plotly.graph_objs as go
 from dash.dependencies import Input, Output, State
 import dash_components as dc
-from dash import html
+from dash import ALL, DiskcacheManager, Patch, ctx, dcc, html, no_update
+
+try:
+    import diskcache
+except ImportError:  # optional, needed for background callbacks and the shared cache
+    diskcache = None
 
-from instruments import Instrument
+from cache import (
+    FigureCache, LegCurveCache, SharedFigureCache, canonical_legs, canonicalize, memoize, open_shared_store,
+    private_directory
+)
+from chains import STORE_SUFFIX, load_chain, resolve_data_file, source_signature
+from coalesce import RequestCoalescer, StaleRequest
+from figures import compact_array, encode_array, figure_signature, figure_update, line_trace
+from implied_vol import implied_volatility
+from instruments import CALL, Instrument
+from lattice import DEFAULT_STEPS
+from metrics import instrument, registry
+from portfolio import Portfolio
+from risk import METHOD_NAMES, METHODS, TRADING_DAYS, historical_var
+from sampling import adaptive_sample
+from scenarios import ScenarioCube, pnl_cube
 from visualization import PortfolioPlotter
 
-def register_callbacks(app):
-    """Register all callbacks with the Dash app."""
+logger = logging.getLogger(__name__)
+
+# Largest grid resolution accepted by the Greeks surfaces (per axis)
+MAX_GREEK_GRID_SIZE = 500
+
+# With American legs every row of the Greeks grid costs five trees per leg and
+# every grid point a row of each tree, so their grids are capped further and
+# priced on shallower trees
+MAX_AMERICAN_GREEK_GRID_SIZE = 50
+GREEK_TREE_STEPS = 50
+
+# Largest number of frames in the time-decay animation of the Trading Strategies tab
+MAX_ANIMATION_FRAMES = 120
+
+# With American legs every frame of the animation costs a tree per expiry, so
+# frames are priced on shallower trees than the still curve
+# (lattice.DEFAULT_STEPS) and their number is capped further
+ANIMATION_TREE_STEPS = 50
+MAX_AMERICAN_ANIMATION_FRAMES = 40
+
+# Tree depth of American legs while the live sliders move, which keeps a patch
+# of a 6-leg strategy within the 50 ms budget; the next full draw restores
+# lattice.DEFAULT_STEPS
+LIVE_TREE_STEPS = 50
+
+# Largest number of scenarios (spot x vol x time x rate) in one scenario cube
+MAX_SCENARIOS = 5_000_000
+
+# Background jobs and scenario cubes are kept here, shared by all server
+# processes; the directory must be private to the user running the server
+JOB_CACHE_DIR = os.environ.get(
+    'OPTIONS_DASHBOARD_CACHE_DIR', os.path.join(tempfile.gettempdir(), f'options-dashboard-{os.getuid()}')
+)
+
+# Option chain files the Implied Volatility tab may open, named relative to this directory
+CHAIN_DATA_DIR = os.environ.get('OPTIONS_DASHBOARD_CHAIN_DIR', os.path.join(os.getcwd(), 'data', 'chains'))
+
+# Columnar stores of the chains opened from the UI, owned by the server
+CHAIN_STORE_DIR = os.path.join(JOB_CACHE_DIR, 'chains')
+
+# Historical returns files the Value at Risk tab may open, named relative to this directory
+RETURNS_DATA_DIR = os.environ.get('OPTIONS_DASHBOARD_RETURNS_DIR', os.path.join(os.getcwd(), 'data', 'returns'))
+
+# Scenario cubes are referred to by the sha1 hex digest of their inputs
+SCENARIO_KEY_PATTERN = re.compile(r'[0-9a-f]{40}')
+
+# Memoized figures and results shared by all server processes and background
+# jobs; on the memory-backed /dev/shm where available, in a directory private
+# to the user running the server
+SHARED_CACHE_DIR = os.environ.get(
+    'OPTIONS_DASHBOARD_SHARED_CACHE_DIR',
+    os.path.join('/dev/shm', f'options-dashboard-figures-{os.getuid()}') if os.access('/dev/shm', os.W_OK)
+    else os.path.join(JOB_CACHE_DIR, 'figures')
+)
+
+# Size limit of the shared cache in bytes
+SHARED_CACHE_SIZE = int(os.environ.get('OPTIONS_DASHBOARD_SHARED_CACHE_SIZE', 1 << 30))
+
+# Style of the progress bars while a background job is running, and when idle
+PROGRESS_VISIBLE = {'width': '100%', 'display': 'block'}
+PROGRESS_HIDDEN = {'display': 'none'}
+
+# Figures are memoized on the normalized callback inputs, so repeated views
+# (e.g. many users opening the default strategy) skip the recomputation. With
+# diskcache installed, a result computed by one server worker or background
+# job is served by every other process.
+figure_cache = (
+    SharedFigureCache(SHARED_CACHE_DIR, maxsize=256, ttl=600, size_limit=SHARED_CACHE_SIZE)
+    if diskcache is not None else FigureCache(maxsize=256, ttl=600)
+)
+
+# Recently sliced scenario cubes of this process; the cubes themselves are
+# already shared on disk, so they are not copied into figure_cache.
+scenario_cube_cache = FigureCache(maxsize=8, ttl=600)
+
+# Per-leg value curves, so editing one leg (or panning the spot range) only
+# reprices what changed.
+leg_curve_cache = LegCurveCache(maxsize=4096)
+
+# Latest live slider request per browser session; bursts of slider moves only
+# compute the newest state. Coalescing is per server process: with several
+# workers, only the requests of a burst that reach the same worker are
+# coalesced (see serve.py).
+live_requests = RequestCoalescer()
+
+
+def format_extreme(value):
+    """Format a max profit/loss, showing unbounded tails as 'Unlimited'."""
+    return 'Unlimited' if np.isinf(value) else f'{value:.2f}'
+
+
+@memoize(figure_cache)
+def build_strategy_figure(legs, S, T, t, sigma, r, tolerance=None, animation_frames=0):
+    """
+    Build the payoff and current value figure for a strategy.
+
+    Parameters:
+    - legs: Canonical (type, strike, position, quantity, american) tuples, see
+      cache.canonical_legs.
+    - S, T, t, sigma, r: Market parameters from the sidebar.
+    - tolerance: Maximum interpolation error of the current value curve. When
+      set, the curve is sampled adaptively around strikes and curvature;
+      otherwise a uniform grid from the per-leg curve cache is used.
+    - animation_frames: Number of time slices from t to T to animate the value
+      curve over (0 disables the animation). With American legs, at most
+      MAX_AMERICAN_ANIMATION_FRAMES frames are priced, on ANIMATION_TREE_STEPS-step trees.
+
+    Returns:
+    - (signed figure, strategy-store data), where the signed figure is the
+      (signature, figure dictionary) pair of figures.figure_signature, so the
+      signature is computed once per cached figure.
+    """
+    # Store all legs as arrays so each curve is a single vectorized pass
+    types, strikes, positions, quantities, american = zip(*legs)
+    portfolio = Portfolio(types, strikes, positions, quantities, T, american)
+    S_min = max(0.1, S/2)
+    S_max = 2 * S
+    
+    # Plot both payoff and current value on the same figure
+    fig = go.Figure()
+    
+    if tolerance:
+        # Current value, refined only where linear interpolation is not accurate enough
+        S_range, total_value, n_evaluations = adaptive_sample(
+            lambda S_grid: portfolio.value(S_grid, t, sigma, r),
+            S_min, S_max, tolerance, seeds=portfolio.strikes
+        )
+    else:
+        # Current value, summed from the per-leg curve cache
+        S_range, total_value = leg_curve_cache.value_curve(portfolio, t, sigma, r, S_min, S_max, 200)
+        n_evaluations = S_range.size
+    
+    # Add payoff at expiration, drawn exactly through its vertices
+    x_payoff, y_payoff = portfolio.payoff_profile().vertices(S_range[0], S_range[-1])
+    fig.add_trace(line_trace(
+        x_payoff,
+        y_payoff,
+        mode='lines',
+        name='Payoff at T'
+    ))
+    
+    # Add current portfolio value
+    fig.add_trace(line_trace(
+        S_range,
+        total_value,
+        mode='lines',
+        name='Current Value'
+    ))
+    
+    # Profit and loss at expiration against today's cost of the strategy
+    cost, break_evens, summary = strategy_summary(portfolio, S, t, sigma, r, S_range, n_evaluations)
+    fig.add_trace(go.Scatter(
+        x=break_evens,
+        y=np.full(break_evens.size, cost),
+        mode='markers',
+        name='Break-even',
+        marker=dict(size=10, symbol='diamond')
+    ))
+    fig.add_annotation(
+        text=summary,
+        xref='paper', yref='paper', x=0, y=1.08, showarrow=False, xanchor='left'
+    )
+    
+    fig.update_layout(
+        title="Trading Strategy: Payoff at Expiration vs. Current Value",
+        xaxis_title="Underlying Price",
+        yaxis_title="Profit / Loss",
+        hovermode='x unified',
+        template="plotly_white"
+    )
+
+    if animation_frames and T > t:
+        # Value at every (time slice x price) point in one batch; frames only
+        # replace the y values of the current value trace, so playback and
+        # scrubbing run in the browser.
+        steps = DEFAULT_STEPS
+        if portfolio.american.any():
+            animation_frames = min(animation_frames, MAX_AMERICAN_ANIMATION_FRAMES)
+            steps = ANIMATION_TREE_STEPS
+        t_slices = np.linspace(t, T, animation_frames)
+        values = portfolio.value(S_range[None, :], t_slices[:, None], sigma, r, steps=steps)
+        add_time_decay_frames(fig, t_slices, values, trace_index=1,
+                              y_range=(min(values.min(), y_payoff.min()), max(values.max(), y_payoff.max())))
+        if steps != DEFAULT_STEPS:
+            fig.layout.sliders[0].currentvalue.suffix = f' (American legs on {steps}-step trees)'
+
+    # The spot grid lets live slider updates redraw the value curve in place
+    return figure_signature(fig), {'legs': portfolio.to_records(), 'spot_grid': S_range.tolist()}
+
+
+def strategy_summary(portfolio, S, t, sigma, r, S_range, n_evaluations, steps=DEFAULT_STEPS):
+    """
+    Cost, visible break-even points and summary text of a strategy.
+
+    Returns:
+    - (cost, break-evens within S_range, annotation text)
+    """
+    cost = portfolio.value(S, t, sigma, r, steps=steps)
+    pnl = portfolio.payoff_profile(cost)
+    break_evens = pnl.break_evens[(pnl.break_evens >= S_range[0]) & (pnl.break_evens <= S_range[-1])]
+    summary = (f"Max profit: {format_extreme(pnl.max_profit)} | "
+               f"Max loss: {format_extreme(pnl.max_loss)} | "
+               f"Break-even: {', '.join(f'{x:.2f}' for x in pnl.break_evens) or 'none'} | "
+               f"Value curve: {n_evaluations} points")
+    return cost, break_evens, summary
+
+
+def build_live_patch(strategy, S, t, sigma, r):
+    """
+    Partial update of the strategy figure for a move of the live sliders.
+
+    Only the current value curve, the break-even markers, the spot line and
+    the summary text are recomputed and sent, on the spot grid of the last
+    full draw; the payoff trace and the layout stay in the browser. A
+    time-decay animation of the full draw no longer matches the sliders and
+    is removed. American legs are priced on LIVE_TREE_STEPS-step trees, which
+    the summary text states.
+
+    Parameters:
+    - strategy: Strategy-store data of the last full draw.
+    - S, t, sigma, r: Slider values.
+
+    Returns:
+    - dash.Patch of the strategy figure
+    """
+    portfolio = Portfolio.from_records(strategy['legs'])
+    S_range = np.asarray(strategy['spot_grid'])
+    steps = LIVE_TREE_STEPS if portfolio.american.any() else DEFAULT_STEPS
+    total_value = portfolio.value(S_range, t, sigma, r, steps=steps)
+    cost, break_evens, summary = strategy_summary(portfolio, S, t, sigma, r, S_range, S_range.size, steps)
+    if steps != DEFAULT_STEPS:
+        summary += f" (American legs on {steps}-step trees)"
+
+    patch = Patch()
+    patch['data'][1]['y'] = encode_array(total_value)
+    patch['data'][2]['x'] = encode_array(break_evens)
+    patch['data'][2]['y'] = encode_array(np.full(break_evens.size, cost))
+    patch['layout']['annotations'][0]['text'] = summary
+    patch['layout']['shapes'] = [dict(type='line', x0=S, x1=S, yref='paper', y0=0, y1=1,
+                                      line=dict(color='gray', dash='dot'))]
+    patch['frames'] = []
+    patch['layout']['sliders'] = []
+    patch['layout']['updatemenus'] = []
+    patch['layout']['yaxis']['autorange'] = True
+    return patch
+
+
+def add_time_decay_frames(fig, t_slices, values, trace_index, y_range):
+    """
+    Attach one animation frame per time slice to a figure, with a play button
+    and a time slider.
+
+    Parameters:
+    - fig: Figure whose trace at trace_index is animated.
+    - t_slices: Current time of each frame.
+    - values: Array of shape (len(t_slices), n_points) with the y values per frame.
+    - trace_index: Index of the animated trace.
+    - y_range: Fixed (min, max) of the y axis, so the axis does not jump between frames.
+    """
+    names = [f"{t_slice:.3f}" for t_slice in t_slices]
+    fig.frames = [
+        go.Frame(data=[type(fig.data[trace_index])(y=compact_array(row))], traces=[trace_index], name=name)
+        for name, row in zip(names, values)
+    ]
+    pad = 0.05 * (y_range[1] - y_range[0] or 1.0)
+    frame_args = {'mode': 'immediate', 'frame': {'duration': 0, 'redraw': False}, 'transition': {'duration': 0}}
+    fig.update_layout(
+        yaxis_range=[y_range[0] - pad, y_range[1] + pad],
+        updatemenus=[dict(
+            type='buttons',
+            showactive=False,
+            x=0, y=-0.15, xanchor='left', yanchor='top',
+            buttons=[
+                dict(label='Play', method='animate',
+                     args=[None, {**frame_args, 'frame': {'duration': 80, 'redraw': False}, 'fromcurrent': True}]),
+                dict(label='Pause', method='animate', args=[[None], frame_args])
+            ]
+        )],
+        sliders=[dict(
+            x=0.12, y=-0.1, len=0.88,
+            currentvalue={'prefix': 'Current time t = '},
+            steps=[dict(label=name, method='animate', args=[[name], frame_args]) for name in names]
+        )]
+    )
+
+
+@memoize(figure_cache)
+def build_ncdf_figures(stk_ratio, tau, sigma, r):
+    """
+    Build the N(d1)-N(d2) and N(d1)/N(d2) figures of the Single Option Analysis
+    tab, as (signature, figure dictionary) pairs (see figures.figure_signature).
+    """
+    plotter = PortfolioPlotter([])  # Empty list since we don't need instruments for this analysis
+    return tuple(figure_signature(fig) for fig in plotter.plot_ncdf_analysis(stk_ratio, tau, sigma, r))
+
+
+@memoize(figure_cache)
+def build_greeks_output(S, K, T, t, sigma, r, option_type, mode, num_points, strategy_legs):
+    """
+    Build the contents of the Option Greeks output panel.
+
+    Parameters:
+    - S, K, T, t, sigma, r, option_type: Option parameters from the sidebar.
+    - mode: 'point', 'heatmap' or 'surface'.
+    - num_points: Grid resolution of the heatmaps/surfaces, at most
+      MAX_AMERICAN_GREEK_GRID_SIZE with American legs.
+    - strategy_legs: Canonical strategy records to use instead of the single
+      option, or None.
+    """
+    if strategy_legs is not None:
+        portfolio = Portfolio.from_records([dict(leg) for leg in strategy_legs])
+    else:
+        portfolio = Portfolio.from_instruments([Instrument(option_type, K)], T)
+
+    if mode == 'point':
+        if strategy_legs is not None:
+            results = portfolio.evaluate(S, t, sigma, r)
+        else:
+            results = Instrument(option_type, K).evaluate(S, T, t, sigma, r)
+        return [html.P(f"{key}: {value:.4f}") for key, value in results.items()]
+
+    notes = []
+    steps = DEFAULT_STEPS
+    if portfolio.american.any():
+        steps = GREEK_TREE_STEPS
+        if num_points > MAX_AMERICAN_GREEK_GRID_SIZE:
+            num_points = MAX_AMERICAN_GREEK_GRID_SIZE
+            notes.append(html.P(f"American legs: grid reduced to {num_points}×{num_points}, "
+                                f"on {steps}-step trees."))
+
+    # Evaluate the whole price x time grid in one batch and draw one chart per greek
+    figures = PortfolioPlotter(portfolio).plot_greek_surfaces(
+        max(0.1, S / 2), 2 * S, t, sigma, r, num_points=num_points, chart_type=mode, steps=steps
+    )
+    return notes + [html.Div(
+        [dcc.Graph(figure=fig.to_plotly_json(), style={'height': '45vh'}) for fig in figures.values()],
+        style={'display': 'grid', 'grid-template-columns': '1fr 1fr', 'gap': '10px'}
+    )]
+
+
+def build_scenario_cube(strategy_legs, S, t, sigma, r, spot_range, spot_steps,
+                        vol_range, vol_steps, time_horizon, time_steps, rate_shocks, progress=None):
+    """
+    Compute the scenario P&L cube of a strategy and store it under JOB_CACHE_DIR.
+
+    Cubes are written to disk rather than memoized in memory, so a cube
+    computed by a background job can be sliced by any server process, and the
+    same inputs are never computed twice.
+
+    Parameters:
+    - strategy_legs: Canonical strategy records.
+    - S, t, sigma, r: Base market parameters.
+    - spot_range: Largest relative spot move (0.3 = +/-30%).
+    - vol_range: Largest absolute volatility move.
+    - time_horizon: Largest time shock in years.
+    - *_steps: Number of shocks along each axis.
+    - rate_shocks: Tuple of absolute rate moves.
+    - progress: Optional progress(done, total) function, see scenarios.pnl_cube.
+
+    Returns:
+    - Key of the stored cube, see scenario_cube_path.
+    """
+    key = hashlib.sha1(repr(canonicalize((strategy_legs, S, t, sigma, r, spot_range, spot_steps, vol_range,
+                                          vol_steps, time_horizon, time_steps, rate_shocks))).encode()).hexdigest()
+    path = scenario_cube_path(key)
+    if os.path.exists(path):
+        return key
+
+    portfolio = Portfolio.from_records([dict(leg) for leg in strategy_legs])
+    cube = pnl_cube(
+        portfolio, S, t, sigma, r,
+        spot_shocks=np.linspace(-spot_range, spot_range, spot_steps),
+        vol_shocks=np.linspace(-vol_range, vol_range, vol_steps),
+        time_shocks=np.linspace(0.0, time_horizon, time_steps),
+        rate_shocks=rate_shocks,
+        progress=progress
+    )
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    temporary = f"{path}.{os.getpid()}.tmp"
+    with open(temporary, 'wb') as f:
+        cube.save(f)
+    os.replace(temporary, path)
+    return key
+
+
+def scenario_cube_path(key):
+    """
+    Path of a stored scenario cube under JOB_CACHE_DIR.
+
+    Keys come back from the browser, so anything but a sha1 hex digest is
+    rejected rather than joined into a path.
+
+    Returns:
+    - Path of the cube file, or None for an invalid key.
+    """
+    if not isinstance(key, str) or not SCENARIO_KEY_PATTERN.fullmatch(key):
+        return None
+    return os.path.join(private_directory(JOB_CACHE_DIR), 'scenarios', key + '.npz')
+
+
+@memoize(scenario_cube_cache, copy_values=False)
+def load_scenario_cube(key):
+    """
+    Load a stored scenario cube by key, keeping recently sliced cubes in memory.
+
+    Cubes can hold millions of scenarios, so the cached cube is shared rather
+    than copied, with its arrays made read-only.
+    """
+    cube = ScenarioCube.load(scenario_cube_path(key))
+    for values in (cube.spot_shocks, cube.vol_shocks, cube.time_shocks, cube.rate_shocks, cube.pnl):
+        values.setflags(write=False)
+    return cube
+
+
+@memoize(figure_cache)
+def build_var_output(strategy_legs, returns_path, source, S, t, sigma, r, confidence, horizon_days,
+                     log_returns, methods):
+    """
+    Compute the historical VaR and expected shortfall of a strategy and build
+    the outputs of the Value at Risk tab.
+
+    Parameters:
+    - strategy_legs: Canonical strategy records.
+    - returns_path: Returns file (see risk.iter_returns).
+    - source: Size and modification time of the file, so an updated file is
+      not served from the cache.
+    - S, t, sigma, r: Market parameters.
+    - confidence: Confidence level (0.99 = 99%).
+    - horizon_days: Holding period in trading days.
+    - log_returns: Whether the file holds log returns.
+    - methods: Tuple of risk.METHODS to compute.
+
+    Returns:
+    - (figure dictionary, summary text)
+    """
+    portfolio = Portfolio.from_records([dict(leg) for leg in strategy_legs])
+    results = historical_var(portfolio, returns_path, S, t, sigma, r, confidence, methods,
+                             horizon_days / TRADING_DAYS, log_returns)
+    first = next(iter(results.values()))
+    lines = [f"{first.n_scenarios:,} scenarios | Portfolio value {first.base_value:.2f}"]
+    for method, result in results.items():
+        lines.append(f"{METHOD_NAMES[method]}: "
+                     f"VaR {result.var:.2f}, ES {result.expected_shortfall:.2f} "
+                     f"({result.elapsed * 1000:.1f} ms, {result.scenarios_per_second:,.0f} scenarios/s)")
+    return PortfolioPlotter([]).plot_var_distribution(results).to_plotly_json(), '\n'.join(lines)
+
+
+def open_chain(chain_path):
+    """
+    Load an option chain file named relative to CHAIN_DATA_DIR, through its
+    columnar store under CHAIN_STORE_DIR.
+
+    Errors are raised with messages fit for the browser: parse errors of
+    chains quote cell values of the file, so they are only logged.
+
+    Returns:
+    - OptionChain
+
+    Raises:
+    - ValueError: The name is not a file of the data directory, or the file
+      could not be read or parsed.
+    - ImportError: The file is Parquet and pyarrow is not installed.
+    """
+    # Messages of resolve_data_file never include file contents
+    path = resolve_data_file(chain_path, CHAIN_DATA_DIR)
+    try:
+        private_directory(JOB_CACHE_DIR)
+        store_dir = os.path.join(CHAIN_STORE_DIR, hashlib.sha1(path.encode()).hexdigest() + STORE_SUFFIX)
+        return load_chain(path, store_dir=store_dir)
+    except (OSError, ValueError) as e:
+        logger.warning("Could not load option chain %s", path, exc_info=True)
+        raise ValueError("the file could not be read or parsed") from e
+
+
+def create_background_manager(cache_dir=None):
+    """
+    Create the manager that runs heavy callbacks as background jobs in local
+    subprocesses, with job state kept in a disk cache private to this user.
+    Each process connects to the cache on first use (see
+    cache.open_shared_store), so the manager can be created before the server
+    forks.
+
+    Returns:
+    - A DiskcacheManager, or None when the diskcache extra is not installed
+      (heavy callbacks then run synchronously).
+    """
+    if diskcache is None:
+        return None
+    try:
+        cache_dir = cache_dir or os.path.join(private_directory(JOB_CACHE_DIR), 'jobs')
+        return DiskcacheManager(open_shared_store(cache_dir))
+    except ImportError:
+        return None
+
+
+def _ignore_progress(done, total):
+    """Stand-in for the progress function when callbacks run synchronously."""
+
+
+def heavy_callback(app, background_manager, outputs, inputs, states, button_id, progress_id):
+    """
+    Register a callback for expensive work.
+
+    With a background manager the callback runs as a background job: the
+    button is disabled and the progress bar shown while it runs, a newer
+    request from the same callback supersedes (cancels) the running one, and
+    switching tabs or changing any of its states cancels it, since the result
+    would no longer match the inputs shown. Without one it runs synchronously.
+
+    The decorated function takes set_progress as its first argument and may
+    call it with (done, total).
+    """
+    def decorator(func):
+        # Background jobs record their metrics in the job process, which
+        # publishes them when the job ends (exported when the server shares a
+        # metrics directory, see metrics.METRICS_DIR)
+        timed = instrument('callback')(func)
+
+        if background_manager is None:
+            def run_synchronously(*args):
+                return timed(_ignore_progress, *args)
+            run_synchronously.__name__ = func.__name__  # request metrics label
+            return app.callback(outputs, inputs, states)(run_synchronously)
+
+        def report(set_progress):
+            return lambda done, total: set_progress((str(done), str(total)))
+
+        def run_in_background(set_progress, *args):
+            try:
+                return timed(report(set_progress), *args)
+            finally:
+                registry.publish()
+        run_in_background.__name__ = func.__name__
+
+        return app.callback(
+            outputs, inputs, states,
+            background=True,
+            manager=background_manager,
+            progress=[Output(progress_id, 'value'), Output(progress_id, 'max')],
+            running=[
+                (Output(button_id, 'disabled'), True, False),
+                (Output(progress_id, 'style'), PROGRESS_VISIBLE, PROGRESS_HIDDEN)
+            ],
+            cancel=[Input('tabs', 'value')] + [Input(state.component_id, state.component_property)
+                                               for state in states]
+        )(run_in_background)
+    return decorator
+
+
+def parse_quotes(text, default_expiry):
+    """
+    Parse option quotes typed as 'strike, price, type[, expiry]' lines.
+
+    Blank lines and lines starting with '#' are ignored; malformed lines are
+    counted and skipped.
+
+    Returns:
+    - (strikes, prices, is_call, expiries, n_skipped)
+    """
+    rows = []
+    skipped = 0
+    for line in (text or '').splitlines():
+        line = line.strip()
+        if not line or line.startswith('#'):
+            continue
+        fields = [field.strip() for field in line.split(',')]
+        try:
+            option_type = fields[2].lower()
+            if option_type not in ['call', 'put']:
+                raise ValueError(f"Invalid option type: {fields[2]}")
+            expiry = float(fields[3]) if len(fields) > 3 else default_expiry
+            rows.append((float(fields[0]), float(fields[1]), option_type == 'call', expiry))
+        except (IndexError, ValueError):
+            skipped += 1
+    if not rows:
+        return np.empty(0), np.empty(0), np.empty(0, dtype=bool), np.empty(0), skipped
+    strikes, prices, is_call, expiries = (np.array(column) for column in zip(*rows))
+    return strikes, prices, is_call.astype(bool), expiries, skipped
+
+
+def register_callbacks(app, background_manager=None):
+    """
+    Register all callbacks with the Dash app.
+
+    Parameters:
+    - app: Dash app.
+    - background_manager: Manager for background callbacks (see
+      create_background_manager); heavy callbacks run synchronously without one.
+    """
     
     @app.callback(Output('tabs-content', 'children'),
                   [Input('tabs', 'value')])
+    @instrument('callback')
     def render_content(tab):
-        if tab == 'tab-1':
-            return dc.create_trading_strategies_tab()
-        elif tab == 'tab-2':
-            return dc.create_single_option_analysis_tab()
-        elif tab == 'tab-3':
-            return dc.create_option_greeks_tab()
+        return dc.get_tab_layout(tab)
+
+    @app.callback(
+        Output('legs-container', 'children'),
+        [Input('add-leg', 'n_clicks'),
+         Input({'type': 'remove-leg', 'index': ALL}, 'n_clicks')],
+        [State({'type': 'leg', 'index': ALL}, 'id')],
+        prevent_initial_call=True
+    )
+    @instrument('callback')
+    def manage_legs(add_clicks, remove_clicks, leg_ids):
+        # Patch the children list in place, so existing legs keep their values
+        # and only the added or removed leg crosses the wire.
+        legs = Patch()
+        triggered = ctx.triggered_id
+        if triggered == 'add-leg':
+            next_index = max((leg_id['index'] for leg_id in leg_ids), default=-1) + 1
+            legs.append(dc.create_instrument_input(next_index))
+            return legs
+        if isinstance(triggered, dict):
+            position = [leg_id['index'] for leg_id in leg_ids].index(triggered['index'])
+            # Newly added legs also trigger this input, with n_clicks still 0
+            if remove_clicks[position]:
+                del legs[position]
+                return legs
+        return no_update
 
     @app.callback(
-        Output('strategy-graph', 'figure'),
+        [Output('strategy-graph', 'figure'),
+         Output('strategy-store', 'data'),
+         Output('strategy-graph-signature', 'data')],
         [Input('update-strategy', 'n_clicks')],
         [
-            State('instrument-1-type', 'value'),
-            State('instrument-1-strike', 'value'),
-            State('instrument-1-position', 'value'),
-            State('instrument-2-type', 'value'),
-            State('instrument-2-strike', 'value'),
-            State('instrument-2-position', 'value'),
-            State('instrument-3-type', 'value'),
-            State('instrument-3-strike', 'value'),
-            State('instrument-3-position', 'value'),
-            State('instrument-4-type', 'value'),
-            State('instrument-4-strike', 'value'),
-            State('instrument-4-position', 'value'),
-            State('instrument-5-type', 'value'),
-            State('instrument-5-strike', 'value'),
-            State('instrument-5-position', 'value'),
-            State('instrument-6-type', 'value'),
-            State('instrument-6-strike', 'value'),
-            State('instrument-6-position', 'value'),
+            State({'type': 'leg-type', 'index': ALL}, 'value'),
+            State({'type': 'leg-strike', 'index': ALL}, 'value'),
+            State({'type': 'leg-position', 'index': ALL}, 'value'),
+            State({'type': 'leg-quantity', 'index': ALL}, 'value'),
+            State({'type': 'leg-exercise', 'index': ALL}, 'value'),
             State('underlying-price', 'value'),
             State('time-maturity', 'value'),
             State('current-time', 'value'),
             State('volatility', 'value'),
-            State('risk-free-rate', 'value')
+            State('risk-free-rate', 'value'),
+            State('value-tolerance', 'value'),
+            State('animation-frames', 'value'),
+            State('strategy-graph-signature', 'data')
         ]
     )
-    def update_strategy(n_clicks, 
-                       instr1_type, instr1_strike, instr1_position,
-                       instr2_type, instr2_strike, instr2_position,
-                       instr3_type, instr3_strike, instr3_position,
-                       instr4_type, instr4_strike, instr4_position,
-                       instr5_type, instr5_strike, instr5_position,
-                       instr6_type, instr6_strike, instr6_position,
-                       S, T, t, sigma, r):
+    @instrument('callback')
+    def update_strategy(n_clicks, types, strikes, positions, quantities, exercises,
+                        S, T, t, sigma, r, tolerance, animation_frames, signature):
         if None in [S, T, t, sigma, r]:
-            return go.Figure()
-        
-        instruments = []
-        instrument_inputs = [
-            (instr1_type, instr1_strike, instr1_position),
-            (instr2_type, instr2_strike, instr2_position),
-            (instr3_type, instr3_strike, instr3_position),
-            (instr4_type, instr4_strike, instr4_position),
-            (instr5_type, instr5_strike, instr5_position),
-            (instr6_type, instr6_strike, instr6_position)
-        ]
-        
-        for inst_type, strike, position in instrument_inputs:
-            if strike is not None:
-                try:
-                    instruments.append(Instrument(inst_type, strike, position))
-                except ValueError as e:
-                    print(f"Error creating instrument: {e}")
-                    continue
-        
-        if not instruments:
-            return go.Figure()
-        
-        # Create plotter and generate figure
-        plotter = PortfolioPlotter(instruments)
-        S_min = max(0.1, S/2)
-        S_max = 2 * S
-        
-        # Plot both payoff and current value on the same figure
-        fig = go.Figure()
-        
-        # Add payoff at expiration
-        S_range = np.linspace(S_min, S_max, 200)
-        total_payoff = np.zeros_like(S_range)
-        for inst in instruments:
-            payoff = np.array([inst.get_payoff(s) for s in S_range])
-            total_payoff += payoff
-        
-        fig.add_trace(go.Scatter(
-            x=S_range,
-            y=total_payoff,
-            mode='lines',
-            name='Payoff at T'
-        ))
-        
-        # Add current portfolio value
-        total_value = np.zeros_like(S_range)
-        for inst in instruments:
-            values = np.array([inst.get_current_value(s, T, t, sigma, r) for s in S_range])
-            total_value += values
-        
-        fig.add_trace(go.Scatter(
-            x=S_range,
-            y=total_value,
-            mode='lines',
-            name='Current Value'
-        ))
-        
-        fig.update_layout(
-            title="Trading Strategy: Payoff at Expiration vs. Current Value",
-            xaxis_title="Underlying Price",
-            yaxis_title="Profit / Loss",
-            hovermode='x unified',
-            template="plotly_white"
+            return go.Figure(), no_update, None
+
+        # Legs without a strike (stock needs none), or with no quantity, are left out
+        legs = canonical_legs(
+            (inst_type, strike if inst_type != 'stock' else None, position,
+             1.0 if quantity is None else quantity, exercise == 'american')
+            for inst_type, strike, position, quantity, exercise in zip(types, strikes, positions, quantities, exercises)
+            if inst_type in ['call', 'put', 'stock'] and position in [1, -1]
+            and (strike is not None or inst_type == 'stock') and (quantity is None or quantity > 0)
         )
-        
-        return fig
+        if not legs:
+            return go.Figure(), no_update, None
+
+        animation_frames = int(min(max(animation_frames or 0, 0), MAX_ANIMATION_FRAMES))
+        signed, store = build_strategy_figure(legs, S, T, t, sigma, r, tolerance, animation_frames)
+        # Usually only the curves change, so only their arrays are sent
+        update, signature = figure_update(signed, signature)
+        return update, store, signature
+
+    # Number each slider state in the browser, so the server can tell which
+    # request of a burst is the latest one
+    app.clientside_callback(
+        """
+        function(live, S, t, sigma, r, previous) {
+            var session = previous ? previous.session :
+                (window.crypto && window.crypto.randomUUID ? window.crypto.randomUUID()
+                                                           : String(Math.random()).slice(2));
+            return {session: session, seq: previous ? previous.seq + 1 : 0,
+                    live: (live || []).length > 0, S: S, t: t, sigma: sigma, r: r};
+        }
+        """,
+        Output('live-request', 'data'),
+        [Input('live-mode', 'value'),
+         Input('live-underlying', 'value'),
+         Input('live-current-time', 'value'),
+         Input('live-volatility', 'value'),
+         Input('live-risk-free-rate', 'value')],
+        [State('live-request', 'data')]
+    )
+
+    @app.callback(
+        [Output('strategy-graph', 'figure', allow_duplicate=True),
+         Output('strategy-graph-signature', 'data', allow_duplicate=True)],
+        [Input('live-request', 'data')],
+        [State('strategy-store', 'data')],
+        prevent_initial_call=True
+    )
+    @instrument('callback')
+    def update_strategy_live(request, strategy):
+        if not request or not request['live'] or not strategy or 'spot_grid' not in strategy:
+            return no_update, no_update
+        market = [request[key] for key in ('S', 't', 'sigma', 'r')]
+        if None in market:
+            return no_update, no_update
+        try:
+            patch = live_requests.submit(request['session'], request['seq'],
+                                         lambda: build_live_patch(strategy, *market))
+        except StaleRequest:
+            return no_update, no_update
+        # The browser's figure no longer matches any signature
+        return patch, None
 
     @app.callback(
         [Output('graph-ncdf-diff', 'figure'),
-         Output('graph-ncdf-ratio', 'figure')],
+         Output('graph-ncdf-ratio', 'figure'),
+         Output('ncdf-signatures', 'data')],
         [Input('update-option', 'n_clicks')],
         [
             State('stk-ratio', 'value'),
             State('time-remaining', 'value'),
             State('sigma', 'value'),
-            State('r', 'value')
+            State('r', 'value'),
+            State('ncdf-signatures', 'data')
         ]
     )
-    def update_option_analysis(n_clicks, stk_ratio, tau, sigma, r):
+    @instrument('callback')
+    def update_option_analysis(n_clicks, stk_ratio, tau, sigma, r, signatures):
         if None in [stk_ratio, tau, sigma, r] or tau <= 0 or sigma <= 0:
-            return go.Figure(), go.Figure()
+            return go.Figure(), go.Figure(), None
         
         try:
-            plotter = PortfolioPlotter([])  # Empty list since we don't need instruments for this analysis
-            return plotter.plot_ncdf_analysis(stk_ratio, tau, sigma, r)
+            figures = build_ncdf_figures(stk_ratio, tau, sigma, r)
         except Exception as e:
             print(f"Error in option analysis: {e}")
-            return go.Figure(), go.Figure()
+            return go.Figure(), go.Figure(), None
 
-    @app.callback(
+        # Only the y values change unless the S/K range moves
+        (diff_update, diff_signature), (ratio_update, ratio_signature) = (
+            figure_update(signed, previous) for signed, previous in zip(figures, signatures or [None, None])
+        )
+        return diff_update, ratio_update, [diff_signature, ratio_signature]
+
+    @heavy_callback(
+        app, background_manager,
         Output('greeks-output', 'children'),
         [Input('compute-greeks', 'n_clicks')],
         [
@@ -159,10 +782,193 @@ def register_callbacks(app):
             State('greek-current-time', 'value'),
             State('greek-volatility', 'value'),
             State('greek-risk-free', 'value'),
-            State('greek-option-type', 'value')
-        ]
+            State('greek-option-type', 'value'),
+            State('greek-scope', 'value'),
+            State('greek-mode', 'value'),
+            State('greek-grid-size', 'value'),
+            State('strategy-store', 'data')
+        ],
+        button_id='compute-greeks',
+        progress_id='greeks-progress'
+    )
+    def update_greeks(progress, n_clicks, S, K, T, t, sigma, r, option_type, scope, mode, grid_size, strategy):
+        strategy_legs = None
+        if scope == 'strategy':
+            if not strategy:
+                return [html.P("Draw a strategy in the Trading Strategies tab first.")]
+            strategy_legs = canonical_legs(strategy['legs'])
+
+        num_points = int(min(max(grid_size or 100, 2), MAX_GREEK_GRID_SIZE))
+        progress(0, 1)
+        output = build_greeks_output(S, K, T, t, sigma, r, option_type, mode, num_points, strategy_legs)
+        progress(1, 1)
+        return output
+
+    @heavy_callback(
+        app, background_manager,
+        [Output('iv-smile-graph', 'figure'),
+         Output('iv-summary', 'children')],
+        [Input('compute-iv', 'n_clicks')],
+        [
+            State('iv-underlying', 'value'),
+            State('iv-time-remaining', 'value'),
+            State('iv-risk-free', 'value'),
+            State('iv-quotes', 'value'),
+            State('iv-chain-path', 'value')
+        ],
+        button_id='compute-iv',
+        progress_id='iv-progress'
     )
-    def update_greeks(n_clicks, S, K, T, t, sigma, r, option_type):
-        instrument = Instrument(option_type, K)
-        greeks = instrument.compute_greeks(S, T, t, sigma, r)
-        return [html.P(f"{key}: {value:.4f}") for key, value in greeks.items()]
+    def update_implied_volatility(progress, n_clicks, S, tau, r, quotes, chain_path):
+        if None in [S, tau, r]:
+            return go.Figure(), ""
+
+        progress(0, 3)
+        if chain_path:
+            # Use the expiry of the chain file closest to the requested time to expiry
+            try:
+                chain = open_chain(chain_path)
+            except (ValueError, ImportError) as e:
+                return go.Figure(), f"Could not load option chain: {e}"
+            expiries = chain.expiries()
+            if expiries.size == 0:
+                return go.Figure(), "The option chain is empty."
+            expiry = expiries[np.argmin(np.abs(expiries - tau))]
+            rows = chain.rows(expiry=expiry)
+            progress(1, 3)
+            start = time.perf_counter()
+            implied_vols, converged = chain.implied_vols(S, r, rows=rows)
+            elapsed = time.perf_counter() - start
+            strikes = np.asarray(chain['strike'][rows])
+            is_call = np.asarray(chain['type'][rows]) == CALL
+            note = f" (expiry {expiry:g} of {len(chain)} rows in {chain_path})"
+        else:
+            strikes, prices, is_call, expiries, skipped = parse_quotes(quotes, tau)
+            progress(1, 3)
+            start = time.perf_counter()
+            implied_vols, converged = implied_volatility(prices, S, strikes, expiries, r, is_call)
+            elapsed = time.perf_counter() - start
+            note = f"; {skipped} malformed lines skipped" if skipped else ""
+
+        progress(2, 3)
+        fig = PortfolioPlotter([]).plot_iv_smile(strikes, implied_vols, is_call, converged)
+        summary = f"{converged.sum()} of {strikes.size} quotes solved in {elapsed * 1000:.1f} ms" + note
+        return fig, summary
+
+    @heavy_callback(
+        app, background_manager,
+        [Output('scenario-cube-store', 'data'),
+         Output('scenario-summary', 'children')],
+        [Input('run-scenarios', 'n_clicks')],
+        [
+            State('strategy-store', 'data'),
+            State('scenario-underlying', 'value'),
+            State('scenario-current-time', 'value'),
+            State('scenario-volatility', 'value'),
+            State('scenario-risk-free', 'value'),
+            State('scenario-spot-range', 'value'),
+            State('scenario-spot-steps', 'value'),
+            State('scenario-vol-range', 'value'),
+            State('scenario-vol-steps', 'value'),
+            State('scenario-time-horizon', 'value'),
+            State('scenario-time-steps', 'value'),
+            State('scenario-rate-shocks', 'value')
+        ],
+        button_id='run-scenarios',
+        progress_id='scenario-progress'
+    )
+    def run_scenarios(progress, n_clicks, strategy, S, t, sigma, r,
+                      spot_range, spot_steps, vol_range, vol_steps, time_horizon, time_steps, rate_text):
+        if not strategy:
+            return None, "Draw a strategy in the Trading Strategies tab first."
+        if None in [S, t, sigma, r, spot_range, spot_steps, vol_range, vol_steps, time_horizon, time_steps]:
+            return None, ""
+
+        try:
+            rate_shocks = tuple(float(x) for x in (rate_text or '0').split(',') if x.strip()) or (0.0,)
+        except ValueError:
+            return None, f"Invalid rate shocks: {rate_text}"
+
+        steps = [max(int(n), 1) for n in (spot_steps, vol_steps, time_steps)]
+        if np.prod(steps) * len(rate_shocks) > MAX_SCENARIOS:
+            return None, f"Too many scenarios (limit {MAX_SCENARIOS:,})."
+
+        start = time.perf_counter()
+        key = build_scenario_cube(
+            canonical_legs(strategy['legs']), S, t, sigma, r,
+            spot_range / 100, steps[0], vol_range, steps[1], time_horizon, steps[2], rate_shocks,
+            progress=progress
+        )
+        elapsed = time.perf_counter() - start
+
+        cube = load_scenario_cube(key)
+        worst_pnl, worst_spot, worst_vol, worst_time, worst_rate = cube.worst()
+        summary = (f"{cube.pnl.size:,} scenarios in {elapsed * 1000:.1f} ms | "
+                   f"Worst P&L {worst_pnl:.2f} at spot {worst_spot * 100:+.1f}%, vol {worst_vol:+.3f}, "
+                   f"+{worst_time:.3f}y, rate {worst_rate:+.4f}")
+        return key, summary
+
+    @heavy_callback(
+        app, background_manager,
+        [Output('var-distribution', 'figure'),
+         Output('var-summary', 'children')],
+        [Input('run-var', 'n_clicks')],
+        [
+            State('strategy-store', 'data'),
+            State('var-returns-path', 'value'),
+            State('var-return-type', 'value'),
+            State('var-horizon', 'value'),
+            State('var-confidence', 'value'),
+            State('var-methods', 'value'),
+            State('var-underlying', 'value'),
+            State('var-current-time', 'value'),
+            State('var-volatility', 'value'),
+            State('var-risk-free', 'value')
+        ],
+        button_id='run-var',
+        progress_id='var-progress'
+    )
+    def update_var(progress, n_clicks, strategy, returns_path, return_type, horizon_days, confidence, methods,
+                   S, t, sigma, r):
+        if not strategy:
+            return go.Figure(), "Draw a strategy in the Trading Strategies tab first."
+        if not returns_path or not methods or None in [horizon_days, confidence, S, t, sigma, r]:
+            return go.Figure(), ""
+        if not 0 < confidence < 100:
+            return go.Figure(), "Confidence must be between 0 and 100%."
+
+        progress(0, 1)
+        try:
+            path = resolve_data_file(returns_path, RETURNS_DATA_DIR)
+            source = source_signature(path)
+            fig, summary = build_var_output(
+                canonical_legs(strategy['legs']), path, (source['size'], source['mtime_ns']),
+                S, t, sigma, r, confidence / 100, horizon_days, return_type == 'log',
+                tuple(method for method in METHODS if method in methods)
+            )
+        except (ValueError, ImportError) as e:
+            # Messages of resolve_data_file and risk never include file contents
+            return go.Figure(), f"Could not compute VaR: {e}"
+        except OSError:
+            return go.Figure(), "Could not compute VaR: the returns file could not be read."
+        progress(1, 1)
+        return fig, summary
+
+    @app.callback(
+        [Output('scenario-heatmap', 'figure'),
+         Output('scenario-slice', 'figure')],
+        [Input('scenario-cube-store', 'data'),
+         Input('scenario-time-slice', 'value'),
+         Input('scenario-vol-slice', 'value')]
+    )
+    @instrument('callback')
+    def update_scenario_slices(key, time_slice, vol_slice):
+        path = scenario_cube_path(key)
+        if path is None or not os.path.exists(path):
+            return go.Figure(), go.Figure()
+
+        cube = load_scenario_cube(key)
+        time_index = int(round((time_slice or 0) * (cube.time_shocks.size - 1)))
+        vol_index = int(round((vol_slice or 0) * (cube.vol_shocks.size - 1)))
+        plotter = PortfolioPlotter([])
+        return plotter.plot_scenario_heatmap(cube, time_index), plotter.plot_scenario_slice(cube, vol_index)
@@ -1,21 +1,31 @@
 import numpy as np
 import plotly.graph_objects as go
+from figures import line_trace
 from instruments import Instrument
-from scipy.stats import norm
+from lattice import DEFAULT_STEPS
+from portfolio import Portfolio
+from risk import METHOD_NAMES
+from sampling import adaptive_sample
+from scipy.special import ndtr
 
 class PortfolioPlotter:
     def __init__(self, instruments):
         """
-        Initialize the PortfolioPlotter with a list of instruments.
-        Each instrument should have a get_payoff(S_T) method that returns its payoff
-        at expiration given an underlying price S_T.
+        Initialize the PortfolioPlotter with a list of instruments or a Portfolio.
+        All legs are evaluated together through the Portfolio array engine.
 
         Parameters:
-        - instruments: List of instrument objects.
+        - instruments: List of instrument objects, or a Portfolio.
         """
         self.instruments = instruments
+
+    def _portfolio(self, T=np.nan):
+        """Return the legs as a Portfolio, using maturity T when built from instruments."""
+        if isinstance(self.instruments, Portfolio):
+            return self.instruments
+        return Portfolio.from_instruments(self.instruments, T)
     
-    def plot_portfolio_value(self, S_min, S_max, t, r, sigma, num_points=200):
+    def plot_portfolio_value(self, S_min, S_max, T, t, sigma, r, num_points=200, tolerance=None):
             """
             Plots the actual value of the portfolio at time t using Black-Scholes for options
             and intrinsic value for stocks over a range of underlying prices.
@@ -23,21 +33,33 @@ class PortfolioPlotter:
             Parameters:
             - S_min: Minimum underlying price.
             - S_max: Maximum underlying price.
+            - T: Time to maturity (expiration time); a Portfolio uses its own leg expiries.
             - t: Current time (in years, where T = maturity time).
-            - r: Risk-free interest rate.
             - sigma: Volatility of the underlying asset.
+            - r: Risk-free interest rate.
             - num_points: Number of points in the stock price range.
+            - tolerance: If set, sample the total value adaptively (see
+              sampling.adaptive_sample) to this accuracy instead of using
+              num_points uniform points.
+
+            Returns:
+            - Plotly figure with one trace per instrument plus the total.
             """
-            S_range = np.linspace(S_min, S_max, num_points)
+            portfolio = self._portfolio(T)
+            if tolerance:
+                S_range, _, _ = adaptive_sample(
+                    lambda S_grid: portfolio.value(S_grid, t, sigma, r),
+                    S_min, S_max, tolerance, seeds=portfolio.strikes
+                )
+            else:
+                S_range = np.linspace(S_min, S_max, num_points)
             fig = go.Figure()
 
-            total_value = np.zeros_like(S_range)
-
-            for idx, instrument in enumerate(self.instruments):
-                # Compute Black-Scholes value for options and intrinsic value for stocks
-                instrument_values = np.array([instrument.get_value(S, t, r, sigma) for S in S_range])
-                total_value += instrument_values
+            # Black-Scholes value for options and intrinsic value for stocks, all legs at once
+            leg_values = portfolio.value(S_range, t, sigma, r, per_leg=True)
+            total_value = leg_values.sum(axis=0)
 
+            for idx, instrument_values in enumerate(leg_values):
                 fig.add_trace(go.Scatter(
                     x=S_range,
                     y=instrument_values,
@@ -61,7 +83,7 @@ class PortfolioPlotter:
                 template="plotly_white"
             )
 
-            fig.show()
+            return fig
 
 
 
@@ -69,32 +91,30 @@ class PortfolioPlotter:
         """
         Plots the payoff for each individual instrument as well as the total
         portfolio payoff over a range of underlying prices at expiration.
+
+        Payoffs are piecewise linear with kinks only at strikes, so they are
+        drawn exactly through S_min, every strike in range and S_max;
+        num_points is kept for compatibility and no longer affects the plot.
         """
-        # Create an array of underlying prices from S_min to S_max.
-        S_range = np.linspace(float(S_min), float(S_max), num_points)
+        # The vertices of the total payoff are also vertices of every leg.
+        portfolio = self._portfolio()
+        S_range, _ = portfolio.payoff_profile().vertices(float(S_min), float(S_max))
         
         # Create a new Plotly figure.
         fig = go.Figure()
 
-        # Initialize an array to accumulate the total portfolio payoff.
-        total_payoff = np.zeros_like(S_range)
-
-        # Loop over each instrument, compute its payoff, and add it as a trace.
-        for idx, instrument in enumerate(self.instruments):
-            try:
-                # Compute the payoff at each price in S_range
-                instrument_payoff = np.array([instrument.get_payoff(S) for S in S_range])
-                total_payoff += instrument_payoff
+        # Compute the payoff of every leg at every vertex in one pass.
+        leg_payoffs = portfolio.payoff(S_range, per_leg=True)
+        total_payoff = leg_payoffs.sum(axis=0)
 
-                fig.add_trace(go.Scatter(
-                    x=S_range,
-                    y=instrument_payoff,
-                    mode='lines',
-                    name=f'Instrument {idx + 1} ({instrument.instrument_type.capitalize()}, K={instrument.strike})'
-                ))
-            except Exception as e:
-                print(f"Error plotting instrument {idx + 1}: {e}")
-                continue
+        # Add one trace per instrument.
+        for idx, instrument_payoff in enumerate(leg_payoffs):
+            fig.add_trace(go.Scatter(
+                x=S_range,
+                y=instrument_payoff,
+                mode='lines',
+                name=f'Instrument {idx + 1} ({portfolio.leg_label(idx)})'
+            ))
 
         # Add a trace for the total portfolio payoff.
         fig.add_trace(go.Scatter(
@@ -116,6 +136,191 @@ class PortfolioPlotter:
 
         return fig  # Return the figure instead of showing it
 
+    def plot_greek_surfaces(self, S_min, S_max, t, sigma, r, num_points=100, chart_type='heatmap',
+                            steps=DEFAULT_STEPS):
+        """
+        Plot every greek of the portfolio over a grid of underlying price and
+        remaining time to expiry.
+
+        The whole (time x price) grid is evaluated in one batched call to the
+        fused value-and-greeks kernel. The time axis runs from the current time t
+        up to (but excluding) the latest leg expiry.
+
+        Parameters:
+        - S_min: Minimum underlying price.
+        - S_max: Maximum underlying price.
+        - t: Current time.
+        - sigma: Volatility of the underlying asset.
+        - r: Risk-free interest rate.
+        - num_points: Grid resolution along each axis.
+        - chart_type: 'heatmap' or 'surface'.
+        - steps: Number of time steps of the trees of American legs, which cost
+          five trees per leg and grid row.
+
+        Returns:
+        - Dictionary of Plotly figures keyed by greek name.
+        """
+        portfolio = self._portfolio()
+        T_max = float(np.max(portfolio.expiries))
+        S_range = np.linspace(float(S_min), float(S_max), num_points)
+        time_to_expiry = np.linspace(T_max - t, 0.0, num_points, endpoint=False)[::-1]
+
+        results = portfolio.greeks(S_range[None, :], (T_max - time_to_expiry)[:, None], sigma, r, steps=steps)
+
+        figures = {}
+        for name, values in results.items():
+            if chart_type == 'surface':
+                trace = go.Surface(x=S_range, y=time_to_expiry, z=values, colorscale='RdBu', reversescale=True, cmid=0)
+            else:
+                trace = go.Heatmap(x=S_range, y=time_to_expiry, z=values, colorscale='RdBu', reversescale=True, zmid=0)
+            fig = go.Figure(trace)
+            fig.update_layout(
+                title=name,
+                xaxis_title="Underlying Price",
+                yaxis_title="Time to Expiry (T-t)",
+                template="plotly_white",
+                margin=dict(l=40, r=20, t=40, b=40)
+            )
+            if chart_type == 'surface':
+                fig.update_layout(scene=dict(
+                    xaxis_title="Underlying Price",
+                    yaxis_title="Time to Expiry (T-t)",
+                    zaxis_title=name
+                ))
+            figures[name] = fig
+
+        return figures
+
+    def plot_iv_smile(self, strikes, implied_vols, is_call, converged):
+        """
+        Plot implied volatility against strike, with calls and puts as separate series.
+
+        Parameters:
+        - strikes: Strike price per quote.
+        - implied_vols: Implied volatility per quote (NaN where not solved).
+        - is_call: Boolean array selecting calls over puts.
+        - converged: Boolean array of per-quote convergence flags.
+
+        Returns:
+        - Plotly figure
+        """
+        fig = go.Figure()
+        for name, mask in [('Calls', is_call & converged), ('Puts', ~is_call & converged)]:
+            order = np.argsort(strikes[mask])
+            fig.add_trace(go.Scatter(
+                x=strikes[mask][order],
+                y=implied_vols[mask][order],
+                mode='lines+markers',
+                name=name
+            ))
+        fig.update_layout(
+            title="Implied Volatility by Strike",
+            xaxis_title="Strike",
+            yaxis_title="Implied Volatility (σ)",
+            hovermode='x unified',
+            template="plotly_white"
+        )
+        return fig
+
+    def plot_scenario_heatmap(self, cube, time_index, rate_index=0):
+        """
+        Plot the P&L of a scenario cube over spot and volatility shocks at one time shock.
+
+        Parameters:
+        - cube: ScenarioCube from scenarios.pnl_cube.
+        - time_index: Index into cube.time_shocks.
+        - rate_index: Index into cube.rate_shocks.
+
+        Returns:
+        - Plotly figure
+        """
+        fig = go.Figure(go.Heatmap(
+            x=cube.spot_shocks * 100,
+            y=cube.vol_shocks,
+            z=cube.pnl[rate_index, time_index],
+            colorscale='RdBu',
+            zmid=0,
+            colorbar=dict(title='P&L')
+        ))
+        fig.update_layout(
+            title=(f"Scenario P&L after {cube.time_shocks[time_index]:.3f} years "
+                   f"(rate shock {cube.rate_shocks[rate_index]:+.4f})"),
+            xaxis_title="Spot Shock (%)",
+            yaxis_title="Volatility Shock",
+            template="plotly_white"
+        )
+        return fig
+
+    def plot_scenario_slice(self, cube, vol_index, rate_index=0):
+        """
+        Plot the P&L of a scenario cube against spot shocks at one volatility
+        shock, with one line per time shock (thinned to at most 10 lines).
+
+        Parameters:
+        - cube: ScenarioCube from scenarios.pnl_cube.
+        - vol_index: Index into cube.vol_shocks.
+        - rate_index: Index into cube.rate_shocks.
+
+        Returns:
+        - Plotly figure
+        """
+        fig = go.Figure()
+        time_indices = np.unique(np.linspace(0, cube.time_shocks.size - 1, min(cube.time_shocks.size, 10)).astype(int))
+        for time_index in time_indices:
+            fig.add_trace(go.Scatter(
+                x=cube.spot_shocks * 100,
+                y=cube.pnl[rate_index, time_index, vol_index],
+                mode='lines',
+                name=f"+{cube.time_shocks[time_index]:.3f}y"
+            ))
+        fig.update_layout(
+            title=f"Scenario P&L at volatility shock {cube.vol_shocks[vol_index]:+.3f}",
+            xaxis_title="Spot Shock (%)",
+            yaxis_title="Profit / Loss",
+            hovermode='x unified',
+            template="plotly_white"
+        )
+        return fig
+
+    def plot_var_distribution(self, results):
+        """
+        Plot the historical P&L distribution of each VaR method, with its VaR
+        and expected shortfall marked as vertical lines.
+
+        Parameters:
+        - results: Dictionary of method to risk.VaRResult.
+
+        Returns:
+        - Plotly figure
+        """
+        fig = go.Figure()
+        colors = ['#1f77b4', '#ff7f0e']
+        # Binned here on shared edges, so the figure stays small for any number of scenarios
+        edges = np.histogram_bin_edges(np.concatenate([result.pnl for result in results.values()]), bins=100)
+        centers = (edges[:-1] + edges[1:]) / 2
+        for (method, result), color in zip(results.items(), colors):
+            counts, _ = np.histogram(result.pnl, bins=edges)
+            fig.add_trace(go.Bar(
+                x=centers,
+                y=counts,
+                width=np.diff(edges),
+                name=METHOD_NAMES[method],
+                opacity=0.6,
+                marker_color=color
+            ))
+            for value, label, dash in [(result.var, 'VaR', 'dash'), (result.expected_shortfall, 'ES', 'dot')]:
+                fig.add_vline(x=-value, line=dict(color=color, dash=dash),
+                              annotation_text=f"{label} {value:.2f}", annotation_position='top left')
+        confidence = next(iter(results.values())).confidence
+        fig.update_layout(
+            title=f"Historical P&L Distribution ({confidence:.1%} VaR and Expected Shortfall)",
+            xaxis_title="Profit / Loss",
+            yaxis_title="Scenarios",
+            barmode='overlay',
+            template="plotly_white"
+        )
+        return fig
+
     def plot_ncdf_analysis(self, stk_ratio, tau, sigma, r):
         """
         Plot the N(d1)-N(d2) and N(d1)/N(d2) analysis charts.
@@ -132,17 +337,18 @@ class PortfolioPlotter:
         x = np.linspace(max(0.1, 0.5 * stk_ratio), 1.5 * stk_ratio, 200)
         d1 = (np.log(x) + (r + sigma**2 / 2) * tau) / (sigma * np.sqrt(tau))
         d2 = d1 - sigma * np.sqrt(tau)
-        y_diff = norm.cdf(d1) - norm.cdf(d2)
+        N_d1, N_d2 = ndtr(d1), ndtr(d2)
+        y_diff = N_d1 - N_d2
         
         # Avoid division by zero in ratio calculation
         y_ratio = np.where(
-            norm.cdf(d2) > 1e-10,
-            norm.cdf(d1) / norm.cdf(d2),
+            N_d2 > 1e-10,
+            N_d1 / np.where(N_d2 > 1e-10, N_d2, 1.0),
             np.nan
         )
         
         fig_diff = go.Figure()
-        fig_diff.add_trace(go.Scatter(x=x, y=y_diff, mode='lines', name='N(d1) - N(d2)'))
+        fig_diff.add_trace(line_trace(x, y_diff, mode='lines', name='N(d1) - N(d2)'))
         fig_diff.update_layout(
             title="N(d1) - N(d2)",
             xaxis_title="S/K",
@@ -152,7 +358,7 @@ class PortfolioPlotter:
         )
         
         fig_ratio = go.Figure()
-        fig_ratio.add_trace(go.Scatter(x=x, y=y_ratio, mode='lines', name='N(d1) / N(d2)'))
+        fig_ratio.add_trace(line_trace(x, y_ratio, mode='lines', name='N(d1) / N(d2)'))
         fig_ratio.update_layout(
             title="N(d1) / N(d2)",
             xaxis_title="S/K",